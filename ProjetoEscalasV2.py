@@ -1,81 +1,302 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+
+import os
 import sys
 import json
 import locale
 import datetime
 from datetime import timedelta
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import numbers
-import win32com.client  # Para interação com Outlook
+
+# pandas/numpy, a planilha e o envio de e-mails são importados só quando
+# usados (dentro das funções), para a janela inicial abrir rápido.
+from workers import run_with_progress, start_job, mail_pool
+from diagnostics import span
 
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QComboBox, QDateTimeEdit,
-    QPushButton, QLineEdit, QCompleter, QTableWidget, QTableWidgetItem, QHeaderView,
+    QPushButton, QLineEdit, QCompleter, QTableWidget, QTableWidgetItem, QTableView, QHeaderView,
     QSizePolicy, QFileDialog, QDialog, QDateEdit, QMessageBox,
     QAbstractItemView, QRadioButton, QButtonGroup, QScrollArea, QFormLayout, QCheckBox,
-    QMenu, QAction
+    QMenu, QAction, QShortcut, QTabWidget
 )
 from PyQt5.QtCore import (
     Qt, QDateTime, QDate, QTime, QStringListModel, QTimer, QSortFilterProxyModel,
-    QRegularExpression, QPoint, pyqtSignal, QEvent
+    QRegularExpression, QPoint, pyqtSignal, QEvent, QAbstractTableModel, QModelIndex,
+    QObject, QUrl
+)
+from PyQt5.QtGui import (
+    QFont, QIcon, QMouseEvent, QColor, QBrush, QStandardItemModel, QStandardItem, QKeySequence,
+    QDesktopServices
 )
-from PyQt5.QtGui import QFont, QIcon, QMouseEvent, QColor, QBrush, QStandardItemModel, QStandardItem
+
+_STARTUP_IMPORTS_DONE = time.perf_counter()
 
 # --------------------------------------------------
-#                DICIONÁRIOS DE E-MAIL
+#               FUNÇÃO PARA ENVIAR E-MAILS
 # --------------------------------------------------
-unit_manager_emails = {
-    "HM Benedicto": "gessica.neves@libertyti.com.br",
-    "HM Campo Limpo": "eduardo.lima@libertyti.com.br",
-    "HM Tatuape": "vinicius.santos@libertyti.com.br",
-    "HM Tide": "natalia.lima@libertyti.com.br",
-    # ... (se houver mais unidades, pode acrescentar aqui)
-}
+_mail_queue = None
+_mail_drainer = None
 
-technician_emails = {
-    "Allef Barbosa": "vinicius.santos@libertyti.com.br",
-    "Eduardo Lima": "vinicius.santos@libertyti.com.br",
-    "Kaue Rodrigues": "kaue.rodrigues@libertyti.com.br",
-    "Geovanna Oliveira": "vinicius.santos@libertyti.com.br",
-    "Gustavo Silva": "gustavo.silva@libertyti.com.br",
-    "Vitor Martins": "vitor.martins@libertyti.com.br",
-    "Mateus Marinho": "vinicius.santos@libertyti.com.br",
-    "Joao Marinho": "vinicius.santos@libertyti.com.br",
-    "Andre Assis": "vinicius.santos@libertyti.com.br",
-    "Valdemir Araujo": "vinicius.santos@libertyti.com.br"
-}
+
+def mail_queue():
+    """Fila persistente de e-mails (compartilhada pelo processo)."""
+    global _mail_queue
+    from mail_queue import MailQueue
+    if _mail_queue is None:
+        _mail_queue = MailQueue()
+    return _mail_queue
+
+
+def send_mails_job(job, mails):
+    """Põe as mensagens na fila (ignorando as já enviadas) e envia as pendentes."""
+    from email_dispatch import MailDispatcher
+    def progress(sent, total):
+        job.report(int(sent * 100 / total), f"Enviados {sent} de {total}...", check_cancel=False)
+    with span('enviar_emails', rows=len(mails)):
+        return mail_queue().send(mails, MailDispatcher(), progress=progress)
+
+
+def drain_mail_queue_job(job):
+    from email_dispatch import MailDispatcher
+    return mail_queue().drain(MailDispatcher())
+
+
+class MailQueueDrainer(QObject):
+    """Reenvia em segundo plano o que ficou pendente na fila (falhas e envios futuros)."""
+    def __init__(self):
+        super().__init__()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.drain)
+
+    def schedule(self):
+        from email_dispatch import transport_from_env
+        supports_deferred = getattr(transport_from_env(), "supports_deferred", True)
+        next_retry = mail_queue().next_retry_at(supports_deferred)
+        if next_retry is None:
+            return
+        delay_ms = int((next_retry - datetime.datetime.now()).total_seconds() * 1000)
+        self.timer.start(min(max(delay_ms, 0), 2 ** 31 - 1))
+
+    def drain(self):
+        start_job(drain_mail_queue_job, on_finished=self.schedule, pool=mail_pool())
+
+
+def mail_drainer():
+    global _mail_drainer
+    if _mail_drainer is None:
+        _mail_drainer = MailQueueDrainer()
+    return _mail_drainer
+
+
+def dispatch_emails(parent, mails, success_message):
+    """Envia `mails` em segundo plano e mostra um único resumo no final."""
+    if not mails:
+        QMessageBox.information(parent, "Aviso", "Nenhum e-mail para enviar.")
+        return
+
+    def show_summary(summary):
+        repeated_note = ""
+        if summary["repetidos"]:
+            repeated_note = f"\n{summary['repetidos']} e-mail(s) já enviados antes foram ignorados."
+        if summary["erros"]:
+            details = "\n".join(f"{to}: {error}" for to, error in summary["erros"])
+            QMessageBox.warning(
+                parent, "Erro",
+                f"Falha ao enviar {len(summary['erros'])} e-mail(s); "
+                f"{summary['reagendados']} serão reenviados automaticamente.\n{details}{repeated_note}"
+            )
+        else:
+            QMessageBox.information(parent, "Sucesso", success_message + repeated_note)
+
+    run_with_progress(
+        parent, "Enviando e-mails", send_mails_job, mails,
+        on_result=show_summary,
+        on_error=lambda msg: QMessageBox.warning(parent, "Erro", f"Falha ao enviar e-mails: {msg}"),
+        on_finished=lambda: mail_drainer().schedule(),
+        cancellable=False, pool=mail_pool()
+    )
+
+def send_schedule_emails(parent, planilha_path, typed_text, periodo_inicio, periodo_fim, modelo_gestor):
+    """
+    Envia a escala do período aos técnicos cujo nome contém `typed_text` e,
+    se o usuário confirmar, o aviso de visita aos gestores das unidades.
+    `modelo_gestor` escolhe o texto do aviso (ver email_templates.GESTOR_MODELOS).
+    """
+    from schedule_mail import periodo_texto
+    if not os.path.exists(planilha_path):
+        QMessageBox.warning(parent, "Erro", "A planilha selecionada não foi encontrada.")
+        return
+
+    start_date = QDateTime(periodo_inicio, QTime(0, 0)).toPyDateTime()
+    end_date = QDateTime(periodo_fim, QTime(23, 59, 59)).toPyDateTime()
+
+    try:
+        locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
+    except:
+        locale.setlocale(locale.LC_TIME, 'Portuguese_Brazil.1252')
+
+    def show_result(result):
+        if result is None:
+            QMessageBox.information(parent, "Aviso", "Não há registros para o técnico e período selecionados.")
+            return
+        confirm_and_dispatch_emails(parent, *result)
+
+    # Consulta e renderização (técnicos e gestores juntos, report_pipeline) fora da interface
+    run_with_progress(
+        parent, "Preparando e-mails", build_mails_job,
+        planilha_path, start_date, end_date, typed_text,
+        periodo_texto(periodo_inicio.toPyDate(), periodo_fim.toPyDate()), modelo_gestor,
+        on_result=show_result,
+        on_error=lambda msg: QMessageBox.warning(parent, "Erro", f"Falha ao montar os e-mails: {msg}")
+    )
+
+
+def build_mails_job(job, planilha_path, start_date, end_date, typed_text, periodo, modelo_gestor):
+    """
+    Consulta as linhas do período/técnico (do cache em memória, se a
+    planilha não mudou) e monta os e-mails. Retorna o resultado de
+    build_schedule_mails, ou None se não há registros.
+    """
+    import schedule_cache
+    from schedule_mail import build_schedule_mails
+    job.report(5, "Consultando escalas...")
+    df_filtered = schedule_cache.query(
+        planilha_path, start=start_date, end=end_date, tecnico_contains=typed_text
+    )
+    if df_filtered.empty:
+        return None
+    def progress(done, total):
+        job.report(int(done * 100 / total), f"Montando e-mails ({done} de {total})...")
+    return build_schedule_mails(df_filtered, periodo, modelo_gestor, progress=progress)
+
+
+def confirm_and_dispatch_emails(parent, mails, missing_tecnicos, manager_mails, missing_unidades):
+    for tecnico in missing_tecnicos:
+        QMessageBox.warning(parent, "Aviso", f"E-mail do técnico {tecnico} não encontrado.")
+
+    reply = QMessageBox.question(
+        parent,
+        'Enviar para Gestores',
+        'Deseja enviar e-mails para os gestores das unidades?',
+        QMessageBox.Yes | QMessageBox.No,
+        QMessageBox.No
+    )
+    if reply != QMessageBox.Yes:
+        dispatch_emails(parent, mails, "E-mails enviados apenas aos técnicos.")
+        return
+
+    for unidade in missing_unidades:
+        QMessageBox.warning(parent, "Aviso", f"E-mail do gestor da unidade {unidade} não encontrado.")
+    mails = mails + manager_mails
+
+    dispatch_emails(parent, mails, "E-mails enviados aos técnicos e gestores das unidades.")
 
 # --------------------------------------------------
-#               FUNÇÃO PARA ENVIAR E-MAIL
+#       TAREFAS DE PLANILHA EM SEGUNDO PLANO
+#   (executadas por workers.Job, fora da interface)
 # --------------------------------------------------
-def send_email(to_email, subject, html_body, send_time=None):
+def load_schedule_job(job, planilha_path):
+    """
+    Carrega todas as escalas (do cache em memória; relê a planilha só se
+    ela mudou). O DataFrame é compartilhado: as telas trabalham em cópias.
+    """
+    from schedule_cache import load_frame
+    job.report(10, "Carregando escalas...")
+    return load_frame(planilha_path)
+
+
+def conflict_index_job(job, planilha_path):
+    """
+    Aquece o cache da planilha e monta o ConflictIndex das escalas gravadas.
+    Retorna (stat da planilha, DataFrame, ConflictIndex), ou None se a
+    planilha não existe.
+    """
+    import schedule_cache
+    from conflict_index import ConflictIndex
+    stat = schedule_cache.planilha_stat(planilha_path)
+    if stat is None:
+        return None
+    frame = schedule_cache.load_frame(planilha_path)
+    return stat, frame, ConflictIndex(frame)
+
+
+def append_schedule_job(job, planilha_path, rows, labels):
+    """Grava as linhas pendentes do ScheduleForm; retorna os SEQ gerados."""
+    import schedule_cache
+    from schedule_store import open_store
+    job.report(10, "Gravando escala...")
+    stat_before = schedule_cache.planilha_stat(planilha_path)
+    with span('gravar_escala', rows=len(rows)):
+        seqs = open_store(planilha_path).append_rows(rows, labels)
+        schedule_cache.record_appended(planilha_path, stat_before, rows, labels, seqs)
+    return seqs
+
+
+def save_changes_job(job, planilha_path, df_changes, changed, deleted_seq):
+    """
+    Aplica exclusões e as células alteradas (`changed[i]`: colunas
+    alteradas da linha i de `df_changes`) no banco; a planilha fica para
+    export_planilha_job. Retorna (df_changes, SEQ excluídos).
+    """
+    import schedule_cache
+    from schedule_store import open_store
+    job.report(10, "Gravando alterações...")
+    stat_before = schedule_cache.planilha_stat(planilha_path)
+    store = open_store(planilha_path)
+    store.sync_from_excel()
+    job.report(30, "Gravando alterações...")
     try:
-        outlook = win32com.client.Dispatch('outlook.application')
-        mail = outlook.CreateItem(0)
-        mail.To = to_email
-        mail.Subject = subject
-        mail.HTMLBody = html_body
-
-        # Ajustar caminho da assinatura, se necessário
-        assinatura_path = r"C:\Users\LIBERTY\Documents\escalas versao\Escalas\assinatura_vinicius.png.png"
-        attachment = mail.Attachments.Add(assinatura_path)
-        attachment.PropertyAccessor.SetProperty(
-            "http://schemas.microsoft.com/mapi/proptag/0x3712001F",
-            "MinhaImagem"
-        )
+        with span('gravar_alteracoes', rows=len(df_changes), excluidas=len(deleted_seq)):
+            store.delete_seqs(deleted_seq)
+            store.update_cells(df_changes, changed)
+    except Exception:
+        # O banco pode ter sido alterado em parte: o cache é relido na próxima consulta
+        schedule_cache.invalidate(planilha_path)
+        raise
+    schedule_cache.record_saved(planilha_path, stat_before, df_changes, deleted_seq)
+    return df_changes, deleted_seq
+
+
+def export_planilha_job(job, planilha_path, only_pending=True):
+    """
+    Regrava a planilha a partir do banco: com `only_pending`, só se há
+    gravações ainda não exportadas. Retorna True se regravou.
+    """
+    import schedule_cache
+    from schedule_store import open_store, store_path
+    if not os.path.exists(store_path(planilha_path)):
+        return False
+    job.report(10, "Atualizando planilha...", check_cancel=False)
+    stat_before = schedule_cache.planilha_stat(planilha_path)
+    store = open_store(planilha_path)
+    with span('exportar_planilha'):
+        if only_pending:
+            exported = store.export_pending()
+        else:
+            store.export_excel()
+            exported = True
+    if exported:
+        schedule_cache.record_exported(planilha_path, stat_before)
+    return exported
 
-        if send_time:
-            if send_time <= datetime.datetime.now():
-                pass  # Envia imediatamente
-            else:
-                mail.DeferredDeliveryTime = send_time
 
-        mail.Send()
-        namespace = outlook.GetNamespace("MAPI")
-        namespace.SendAndReceive(False)
+def export_reports_job(job, df, directory):
+    """Relatórios HTML/XLSX/PDF de cada técnico de `df` (report_pipeline, em vários processos)."""
+    from report_pipeline import export_technician_reports
+    def progress(done, total):
+        job.report(int(done * 100 / total), f"Gerando relatórios ({done} de {total} técnicos)...")
+    return export_technician_reports(df, directory, progress=progress)
 
-    except Exception as e:
-        QMessageBox.warning(None, "Erro", f"Falha ao enviar e-mail para {to_email}: {e}")
+
+def export_split_job(job, df, column, directory):
+    """Uma planilha por valor de `column` (TÉCNICO/UNIDADE), numa passada pelas linhas de `df`."""
+    from planilha_io import frame_to_workbook_rows, write_split_workbooks
+    columns = list(df.columns)
+    def progress(done):
+        job.report(int(done * 100 / len(df)), f"Exportando ({done} de {len(df)} linhas)...")
+    return write_split_workbooks(directory, columns, frame_to_workbook_rows(df, columns), column, progress=progress)
 
 # --------------------------------------------------
 #               CLASSE LABEL CLICÁVEL
@@ -221,6 +442,138 @@ class MultiSelectComboBox(QComboBox):
         """Retorna a lista de itens selecionados."""
         return self.checked_items
 
+    def typedText(self):
+        """Texto digitado no campo ('' se for só a lista dos itens marcados)."""
+        text = self.currentText().strip()
+        return '' if text == ", ".join(self.checked_items) else text
+
+# --------------------------------------------------
+#   MODELO DA TABELA DE CONSULTA (SOBRE DATAFRAME)
+# --------------------------------------------------
+# Cor de fundo conforme LOCALIZAÇÃO
+LOCALIZACAO_CORES = {
+    'Unidade': '#17a2b8',
+    'Escritório': '#ffc107',
+    'Sobreaviso': '#fd7e14',
+    'Folga': '#6c757d',
+    'Home': '#20c997',
+    'Online': '#8fbc8f'
+}
+
+
+class ScheduleTableModel(QAbstractTableModel):
+    """
+    Modelo de tabela sobre um DataFrame.
+    Os textos de cada coluna (datas já formatadas) e as cores da
+    LOCALIZAÇÃO são calculados uma vez, de forma vetorizada, em set_frame();
+    data() só consulta esses arrays para as células que a view desenha.
+
+    A tabela mostra as linhas de `positions` (posições no DataFrame de
+    set_frame): filtrar é só trocar as posições com set_positions().
+    As células editadas ficam em `dirty` (posição -> colunas alteradas).
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._columns = []
+        self._display = []
+        self._backgrounds = None
+        self.positions = None
+        self.dirty = {}
+        self._brushes = {nome: QBrush(QColor(cor)) for nome, cor in LOCALIZACAO_CORES.items()}
+
+    def set_frame(self, df):
+        import numpy as np
+        from planilha_io import display_texts
+        self.beginResetModel()
+        self._columns = list(df.columns)
+        self._display = [display_texts(df[col]) for col in self._columns]
+        if 'LOCALIZAÇÃO' in df.columns:
+            self._backgrounds = df['LOCALIZAÇÃO'].map(self._brushes).to_numpy(dtype=object)
+        else:
+            self._backgrounds = None
+        self.positions = np.arange(len(df), dtype=np.intp)
+        self.dirty = {}
+        self.endResetModel()
+
+    def set_positions(self, positions):
+        self.beginResetModel()
+        self.positions = positions
+        self.endResetModel()
+
+    def reorder(self, positions):
+        """
+        Mostra as mesmas linhas em outra ordem (`positions` é uma permutação
+        das atuais). Sem reset do modelo: seleção e índices persistentes
+        acompanham as linhas.
+        """
+        import numpy as np
+        self.layoutAboutToBeChanged.emit()
+        new_row = np.empty(len(self._display[0]) if self._display else 0, dtype=np.intp)
+        new_row[positions] = np.arange(len(positions), dtype=np.intp)
+        old_positions = self.positions
+        for index in self.persistentIndexList():
+            row = int(new_row[old_positions[index.row()]])
+            self.changePersistentIndex(index, self.index(row, index.column()))
+        self.positions = positions
+        self.layoutChanged.emit()
+
+    def text(self, row, col):
+        return self._display[col][self.positions[row]]
+
+    def text_at(self, position, col):
+        """Texto da célula pela posição no DataFrame (não pela linha exibida)."""
+        return self._display[col][position]
+
+    def remove_row(self, row):
+        import numpy as np
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.positions = np.delete(self.positions, row)
+        self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.positions is None:
+            return 0
+        return len(self.positions)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._display[index.column()][self.positions[index.row()]]
+        if role == Qt.BackgroundRole and self._backgrounds is not None \
+                and self._columns[index.column()] == 'LOCALIZAÇÃO':
+            return self._backgrounds[self.positions[index.row()]]
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        position = int(self.positions[index.row()])
+        value = str(value)
+        if self._display[index.column()][position] == value:
+            return False
+        self._display[index.column()][position] = value
+        self.dirty.setdefault(position, set()).add(index.column())
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        # Bloqueia edição da coluna SEQ
+        if index.isValid() and self._columns[index.column()] != 'SEQ':
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._columns[section] if section < len(self._columns) else None
+        return str(section + 1)
+
 # --------------------------------------------------
 #  CLASSE DE SELEÇÃO DE PLANILHA E PERÍODO INICIAL
 # --------------------------------------------------
@@ -562,6 +915,126 @@ class EmailSelectionDialog(QDialog):
             }
         """
 
+# --------------------------------------------------
+#               TELA DE DIAGNÓSTICO (F12)
+#   tempos das etapas medidas por diagnostics.span
+# --------------------------------------------------
+class DiagnosticsDialog(QDialog):
+    SUMMARY_HEADERS = ['Etapa', 'Vezes', 'Total (ms)', 'Média (ms)', 'Máximo (ms)', 'Linhas', 'Bytes']
+    RECENT_HEADERS = ['Hora', 'Etapa', 'ms', 'Linhas', 'Bytes', 'Thread', 'Erro']
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowIcon(QIcon('JT.ico'))
+        self.init_ui()
+        self.refresh()
+
+    def init_ui(self):
+        import diagnostics
+        self.setWindowTitle("Diagnóstico de Desempenho")
+        self.resize(900, 500)
+        layout = QVBoxLayout()
+
+        tabs = QTabWidget()
+        self.summary_table = self._make_table(self.SUMMARY_HEADERS)
+        self.recent_table = self._make_table(self.RECENT_HEADERS)
+        tabs.addTab(self.summary_table, "Resumo por etapa")
+        tabs.addTab(self.recent_table, "Últimas etapas")
+        layout.addWidget(tabs)
+
+        self.profile_checkbox = QCheckBox(f"Gravar perfil (cProfile) das etapas na pasta '{diagnostics.PROFILE_DIR}'")
+        self.profile_checkbox.setChecked(diagnostics.profiling_mode() is not None)
+        self.profile_checkbox.toggled.connect(self.toggle_profiling)
+        layout.addWidget(self.profile_checkbox)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        for text, slot in (("Atualizar", self.refresh), ("Limpar", self.clear), ("Abrir Log", self.open_log)):
+            button = QPushButton(text)
+            button.setStyleSheet(self.get_button_style())
+            button.clicked.connect(slot)
+            buttons_layout.addWidget(button)
+        layout.addLayout(buttons_layout)
+        self.setLayout(layout)
+
+    @staticmethod
+    def _make_table(headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        return table
+
+    @staticmethod
+    def _fill(table, rows):
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                if isinstance(value, float):
+                    text = f"{value:.1f}"
+                else:
+                    text = '' if value is None else str(value)
+                item = QTableWidgetItem(text)
+                if isinstance(value, (int, float)):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, col, item)
+
+    def refresh(self):
+        import diagnostics
+        self._fill(self.summary_table, diagnostics.summary())
+        # Mais recentes primeiro
+        self._fill(self.recent_table, [
+            (r.inicio, r.name, r.ms, r.rows, r.bytes, r.thread, r.erro)
+            for r in reversed(diagnostics.recent_spans())
+        ])
+
+    def clear(self):
+        import diagnostics
+        diagnostics.reset()
+        self.refresh()
+
+    def toggle_profiling(self, checked):
+        import diagnostics
+        diagnostics.set_profiling('cprofile' if checked else None)
+
+    def open_log(self):
+        import diagnostics
+        path = diagnostics.log_path()
+        if not os.path.exists(path):
+            QMessageBox.information(self, "Aviso", "Nenhuma etapa foi registrada no log ainda.")
+            return
+        QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(path)))
+
+    def get_button_style(self):
+        return """
+            QPushButton {
+                background-color: #007bff;
+                color: white;
+                border-radius: 5px;
+                padding: 6px 12px;
+                font-size: 14px;
+            }
+            QPushButton:hover {
+                background-color: #0056b3;
+            }
+        """
+
+
+_diagnostics_dialog = None
+
+
+def show_diagnostics():
+    """Abre (ou traz para frente, atualizada) a tela de diagnóstico."""
+    global _diagnostics_dialog
+    if _diagnostics_dialog is None:
+        _diagnostics_dialog = DiagnosticsDialog()
+    else:
+        _diagnostics_dialog.refresh()
+    _diagnostics_dialog.show()
+    _diagnostics_dialog.raise_()
+    _diagnostics_dialog.activateWindow()
+
 # --------------------------------------------------
 #   TELA DE CONSULTA COM FILTRO (TÉCNICO, UNIDADE)
 #   E FILTRO DE DATA -- MULTI-SELEÇÃO DE TÉCNICOS
@@ -571,14 +1044,17 @@ class ConsultaEscalaDialog(QDialog):
     Carrega TODOS os dados (df_filtered) e permite
     filtrar por Técnico (agora múltiplos), Unidade e Período (data).
     """
+    FILTER_DEBOUNCE_MS = 150
+
     def __init__(self, df_filtered, planilha_path, df_existing, periodo_inicio, periodo_fim, labels):
         super().__init__()
         self.setWindowIcon(QIcon('JT.ico'))
         # Este df_filtered deve conter todos os dados da planilha.
-        self.original_df = df_filtered.copy()
-        self.df_filtered = df_filtered.copy()
+        # Os DataFrames são só lidos aqui (filtros e ordenação trabalham com
+        # posições de linha), então não é preciso copiá-los.
+        self.original_df = df_filtered
         self.planilha_path = planilha_path
-        self.df_existing = df_existing.copy()
+        self.df_existing = df_existing
         self.periodo_inicio = periodo_inicio
         self.periodo_fim = periodo_fim
         self.labels = labels
@@ -639,6 +1115,16 @@ class ConsultaEscalaDialog(QDialog):
         self.clear_filter_button.setFixedHeight(30)
         self.clear_filter_button.setEnabled(False)
 
+        # Filtro ao vivo: aplica FILTER_DEBOUNCE_MS depois da última alteração
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(lambda: self.run_filter(warn=False))
+        self.tecnico_combo.currentTextChanged.connect(self.filter_timer.start)
+        self.unidade_combo.currentTextChanged.connect(self.filter_timer.start)
+        self.data_inicio_filter.dateChanged.connect(self.filter_timer.start)
+        self.data_fim_filter.dateChanged.connect(self.filter_timer.start)
+
         filter_layout.addWidget(tecnico_label)
         filter_layout.addWidget(self.tecnico_combo)
         filter_layout.addWidget(unidade_label)
@@ -652,30 +1138,20 @@ class ConsultaEscalaDialog(QDialog):
 
         layout.addLayout(filter_layout)
 
-        # Ordena colunas
-        self.df_filtered = self.df_filtered[self.labels]
-
-        # Converte data/hora
-        for col in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-            self.df_filtered[col] = pd.to_datetime(
-                self.df_filtered[col], format="%d/%m/%Y %H:%M:%S", errors='coerce'
-            )
-
-        self.table_widget = QTableWidget()
-        self.table_widget.setRowCount(len(self.df_filtered))
-        self.table_widget.setColumnCount(len(self.df_filtered.columns))
-        self.table_widget.setHorizontalHeaderLabels(self.df_filtered.columns.tolist())
-        self.table_widget.horizontalHeader().setStretchLastSection(True)
-        self.table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-        self.table_widget.horizontalHeader().setMinimumSectionSize(100)
-        self.table_widget.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table_widget.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table_widget.setStyleSheet("""
-            QTableWidget {
+        self.table_model = ScheduleTableModel(self)
+        self.table_view = QTableView()
+        self.table_view.setModel(self.table_model)
+        self.table_view.horizontalHeader().setStretchLastSection(True)
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table_view.horizontalHeader().setMinimumSectionSize(100)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_view.setStyleSheet("""
+            QTableView {
                 font-size: 14px;
                 font-family: 'Segoe UI', sans-serif;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #007bff;
                 color: #fff;
             }
@@ -688,12 +1164,12 @@ class ConsultaEscalaDialog(QDialog):
             }
         """)
 
-        self.table_widget.horizontalHeader().setSectionsClickable(True)
-        self.table_widget.horizontalHeader().setSortIndicatorShown(True)
-        self.table_widget.horizontalHeader().sectionClicked.connect(self.handle_header_click)
+        self.table_view.horizontalHeader().setSectionsClickable(True)
+        self.table_view.horizontalHeader().setSortIndicatorShown(True)
+        self.table_view.horizontalHeader().sectionClicked.connect(self.handle_header_click)
 
-        self.populate_table()
-        layout.addWidget(self.table_widget)
+        self.set_source_frame(self.original_df)
+        layout.addWidget(self.table_view)
 
         # Botões: Editar, Excluir, Salvar, Enviar
         buttons_layout = QHBoxLayout()
@@ -727,61 +1203,85 @@ class ConsultaEscalaDialog(QDialog):
         self.send_email_button.clicked.connect(self.send_emails)
         buttons_layout.addWidget(self.send_email_button)
 
+        self.conflicts_button = QPushButton(" Conflitos")
+        self.conflicts_button.setFixedSize(140, 40)
+        self.conflicts_button.setIcon(QIcon("icons/warning.png"))
+        self.conflicts_button.setStyleSheet(self.get_warning_button_style())
+        self.conflicts_button.clicked.connect(self.show_conflicts)
+        buttons_layout.addWidget(self.conflicts_button)
+
+        self.reports_button = QPushButton(" Relatórios")
+        self.reports_button.setFixedSize(140, 40)
+        self.reports_button.setIcon(QIcon("icons/save.png"))
+        self.reports_button.setStyleSheet(self.get_primary_button_style())
+        reports_menu = QMenu(self.reports_button)
+        reports_menu.addAction("Relatório por técnico (HTML/XLSX/PDF)", self.export_reports)
+        reports_menu.addAction("Uma planilha por técnico", lambda: self.export_split('TÉCNICO'))
+        reports_menu.addAction("Uma planilha por unidade", lambda: self.export_split('UNIDADE'))
+        reports_menu.addSeparator()
+        reports_menu.addAction("Atualizar planilha Excel", self.export_planilha)
+        self.reports_button.setMenu(reports_menu)
+        buttons_layout.addWidget(self.reports_button)
+
         layout.addLayout(buttons_layout)
         self.setLayout(layout)
+        QShortcut(QKeySequence(Qt.Key_F12), self, activated=show_diagnostics)
+
+    def set_source_frame(self, df):
+        """
+        Nova carga dos dados: os textos da tabela e os índices de filtro
+        (filter_engine.FilterIndex) são montados uma única vez aqui.
+        """
+        import numpy as np
+        from filter_engine import FilterIndex, IncrementalFilter
+        self.base_df = df[self.labels].reset_index(drop=True)
+        self.filter_index = FilterIndex(self.base_df)
+        self.live_filter = IncrementalFilter(self.filter_index)
+        # Linhas excluídas na tela (ainda não salvas) não voltam com os filtros
+        self.deleted_rows = np.zeros(len(self.base_df), dtype=bool)
+        # Chaves de ordenação (filter_engine.SortKey), montadas por coluna
+        # no primeiro clique do cabeçalho e reaproveitadas até a próxima carga
+        self.sort_keys = {}
+        with span('montar_consulta', rows=len(self.base_df)):
+            self.table_model.set_frame(self.base_df)
+            self.table_view.resizeColumnsToContents()
 
     def apply_filter(self):
         """Filtrar por (múltiplos) Técnicos, Unidade e Data (início/fim)."""
-        selected_techs = self.tecnico_combo.checkedItems()  # lista de técnicos
-        unit_text = self.unidade_combo.currentText().strip()
-
-        df_temp = self.original_df.copy()
-
-        # Se houver técnicos marcados, filtra por esses nomes (OR).
-        if selected_techs:
-            df_temp = df_temp[df_temp['TÉCNICO'].isin(selected_techs)]
-
-        if unit_text and 'UNIDADE' in df_temp.columns:
-            df_temp = df_temp[df_temp['UNIDADE'].str.contains(unit_text, case=False, na=False)]
+        self.filter_timer.stop()
+        self.run_filter(warn=True)
 
+    def run_filter(self, warn):
+        """
+        Aplica os filtros atuais. Chamado pelo botão e, ao vivo, pelo
+        filter_timer; se a busca só estreitou, refina o resultado anterior.
+        """
         start_qdate = self.data_inicio_filter.date()
         end_qdate = self.data_fim_filter.date()
         if end_qdate < start_qdate:
-            QMessageBox.warning(self, "Aviso", "Data fim não pode ser antes da data início.")
+            if warn:
+                QMessageBox.warning(self, "Aviso", "Data fim não pode ser antes da data início.")
             return
 
         start_date = QDateTime(start_qdate, QTime(0, 0, 0)).toPyDateTime()
         end_date = QDateTime(end_qdate, QTime(23, 59, 59)).toPyDateTime()
 
-        df_temp['DATA/HORA INICIO'] = pd.to_datetime(df_temp['DATA/HORA INICIO'], errors='coerce')
-        df_temp = df_temp[
-            (df_temp['DATA/HORA INICIO'] >= start_date) &
-            (df_temp['DATA/HORA INICIO'] <= end_date)
-        ]
-
-        self.df_filtered = df_temp.copy()
-
-        for col in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-            self.df_filtered[col] = pd.to_datetime(
-                self.df_filtered[col], format="%d/%m/%Y %H:%M:%S", errors='coerce'
-            )
-        self.df_filtered = self.df_filtered[self.labels]
-        self.sort_columns.clear()
-        self.populate_table()
+        # Técnicos marcados (OR) ou parte do nome digitado, unidade por
+        # substring e período pela DATA/HORA INICIO
+        positions = self.live_filter.filter(
+            tecnicos=self.tecnico_combo.checkedItems(),
+            tecnico_contains=self.tecnico_combo.typedText(),
+            unidade_contains=self.unidade_combo.currentText().strip(),
+            start=start_date, end=end_date
+        )
+        positions = positions[~self.deleted_rows[positions]]
+        if self.sort_columns:
+            positions = self.sorted_positions(positions)
+        self.populate_table(positions)
         self.clear_filter_button.setEnabled(True)
 
     def clear_filter(self):
         """Remove o filtro e exibe todos os dados novamente."""
-        self.df_filtered = self.original_df.copy()
-
-        for col in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-            self.df_filtered[col] = pd.to_datetime(
-                self.df_filtered[col], format="%d/%m/%Y %H:%M:%S", errors='coerce'
-            )
-        self.df_filtered = self.df_filtered[self.labels]
-        self.sort_columns.clear()
-        self.populate_table()
-
         self.clear_filter_button.setEnabled(False)
         # "Limpar" a MultiSelectComboBox
         self.tecnico_combo.checked_items.clear()
@@ -790,44 +1290,21 @@ class ConsultaEscalaDialog(QDialog):
         self.data_inicio_filter.setDate(self.periodo_inicio)
         self.data_fim_filter.setDate(self.periodo_fim)
 
-    def populate_table(self):
-        self.table_widget.clearContents()
-        self.table_widget.setRowCount(len(self.df_filtered))
+        # As alterações acima não devem disparar o filtro ao vivo
+        self.filter_timer.stop()
+        self.live_filter.reset()
+        self.sort_columns.clear()
+        positions = self.filter_index.all_rows()
+        self.populate_table(positions[~self.deleted_rows])
 
-        for row in range(len(self.df_filtered)):
-            for col in range(len(self.df_filtered.columns)):
-                value = self.df_filtered.iloc[row, col]
-                if pd.isna(value):
-                    display_value = ''
-                else:
-                    if isinstance(value, pd.Timestamp):
-                        display_value = value.strftime("%d/%m/%Y %H:%M:%S")
-                    else:
-                        display_value = str(value)
-                item = QTableWidgetItem(display_value)
-
-                # Bloqueia edição da coluna SEQ
-                if self.df_filtered.columns[col] == 'SEQ':
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-
-                # Cor de fundo conforme LOCALIZAÇÃO (opcional)
-                if self.df_filtered.columns[col] == 'LOCALIZAÇÃO':
-                    color_map = {
-                        'Unidade': '#17a2b8',
-                        'Escritório': '#ffc107',
-                        'Sobreaviso': '#fd7e14',
-                        'Folga': '#6c757d',
-                        'Home': '#20c997',
-                        'Online': '#8fbc8f'
-                    }
-                    cor = color_map.get(display_value, None)
-                    if cor:
-                        item.setBackground(QColor(cor))
-
-                self.table_widget.setItem(row, col, item)
+    def populate_table(self, positions):
+        # Larguras das colunas são ajustadas só na carga (set_source_frame):
+        # medir o conteúdo a cada filtro custaria mais que o próprio filtro.
+        with span('populate_table', rows=len(positions)):
+            self.table_model.set_positions(positions)
 
     def handle_header_click(self, logicalIndex):
-        column_name = self.df_filtered.columns[logicalIndex]
+        column_name = self.labels[logicalIndex]
         existing = next((item for item in self.sort_columns if item[0] == column_name), None)
         if existing:
             self.sort_columns.remove(existing)
@@ -837,38 +1314,123 @@ class ConsultaEscalaDialog(QDialog):
 
         self.sort_columns.insert(0, (column_name, ascending))
         order = Qt.AscendingOrder if ascending else Qt.DescendingOrder
-        self.table_widget.horizontalHeader().setSortIndicator(logicalIndex, order)
+        self.table_view.horizontalHeader().setSortIndicator(logicalIndex, order)
         self.sort_table()
 
     def sort_table(self):
         if not self.sort_columns:
             return
-        sort_by = [col for col, asc in self.sort_columns]
+        self.table_model.reorder(self.sorted_positions(self.table_model.positions))
+
+    def sorted_positions(self, positions):
+        """
+        Posições em ordem de sort_columns (a primeira é a principal), por
+        uma permutação estável sobre as chaves pré-calculadas: o DataFrame
+        não é reordenado nem copiado.
+        """
+        from filter_engine import SortKey, sort_permutation
+        keys = []
+        for col, _ in self.sort_columns:
+            if col not in self.sort_keys:
+                self.sort_keys[col] = SortKey(self.base_df[col])
+            keys.append(self.sort_keys[col])
         ascending = [asc for col, asc in self.sort_columns]
-        self.df_filtered.sort_values(
-            by=sort_by, ascending=ascending, inplace=True,
-            key=lambda col: col.str.lower() if col.dtype == object else col
-        )
-        self.df_filtered.reset_index(drop=True, inplace=True)
-        self.populate_table()
+        return positions[sort_permutation(keys, ascending, rows=positions)]
 
     def enable_editing(self):
-        self.table_widget.setEditTriggers(QTableWidget.AllEditTriggers)
+        self.table_view.setEditTriggers(QAbstractItemView.AllEditTriggers)
+
+    def show_conflicts(self):
+        """Relatório de conflitos de horário entre as escalas exibidas (uma varredura)."""
+        from conflict_index import describe_entry, find_conflicts
+        positions = self.table_model.positions
+        visible = self.base_df.iloc[positions]
+        conflicts = find_conflicts(visible)
+        if not conflicts:
+            QMessageBox.information(self, "Conflitos", "Nenhum conflito de horário nas escalas exibidas.")
+            return
+
+        def describe(row):
+            entry = visible.iloc[row]
+            return f"SEQ {entry['SEQ']}: " + describe_entry(
+                entry['LOCALIZAÇÃO'], entry['UNIDADE'], entry['DATA/HORA INICIO'], entry['DATA/HORA FIM']
+            )
+
+        lines = [
+            f"{visible['TÉCNICO'].iat[c.position]} - {c.motivo}\n  {describe(c.position)}\n  {describe(c.other)}"
+            for c in conflicts
+        ]
+        box = QMessageBox(QMessageBox.Warning, "Conflitos",
+                          f"{len(conflicts)} conflito(s) de horário nas escalas exibidas.", QMessageBox.Ok, self)
+        box.setDetailedText("\n".join(lines))
+        box.exec_()
+
+    def export_reports(self):
+        """Grava, numa pasta escolhida, o relatório de cada técnico das linhas exibidas."""
+        positions = self.table_model.positions
+        if not len(positions):
+            QMessageBox.information(self, "Aviso", "Não há linhas exibidas para gerar relatórios.")
+            return
+        directory = QFileDialog.getExistingDirectory(self, "Pasta dos relatórios")
+        if not directory:
+            return
+        self.reports_button.setEnabled(False)
+        run_with_progress(
+            self, "Gerando relatórios", export_reports_job, self.base_df.iloc[positions], directory,
+            on_result=lambda paths: QMessageBox.information(
+                self, "Sucesso", f"{len(paths)} arquivo(s) de relatório gravados em {directory}."
+            ),
+            on_error=lambda msg: QMessageBox.warning(self, "Erro", f"Falha ao gerar os relatórios: {msg}"),
+            on_finished=lambda: self.reports_button.setEnabled(True)
+        )
+
+    def export_split(self, column):
+        """Uma planilha por valor de `column` (técnico/unidade) com as linhas exibidas."""
+        positions = self.table_model.positions
+        if not len(positions):
+            QMessageBox.information(self, "Aviso", "Não há linhas exibidas para exportar.")
+            return
+        directory = QFileDialog.getExistingDirectory(self, "Pasta das planilhas")
+        if not directory:
+            return
+        self.reports_button.setEnabled(False)
+        run_with_progress(
+            self, "Exportando planilhas", export_split_job, self.base_df.iloc[positions], column, directory,
+            on_result=lambda written: QMessageBox.information(
+                self, "Sucesso", f"{len(written)} planilha(s) gravadas em {directory}."
+            ),
+            on_error=lambda msg: QMessageBox.warning(self, "Erro", f"Falha ao exportar as planilhas: {msg}"),
+            on_finished=lambda: self.reports_button.setEnabled(True)
+        )
+
+    def export_planilha(self):
+        """Regrava agora a planilha Excel com tudo o que está no banco."""
+        self.reports_button.setEnabled(False)
+        run_with_progress(
+            self, "Atualizando planilha", export_planilha_job, self.planilha_path, False,
+            on_result=lambda _: QMessageBox.information(
+                self, "Sucesso", f"Planilha atualizada: {self.planilha_path}"
+            ),
+            on_error=lambda msg: QMessageBox.warning(self, "Erro", f"Falha ao atualizar a planilha: {msg}"),
+            on_finished=lambda: self.reports_button.setEnabled(True),
+            cancellable=False
+        )
 
     def delete_entry(self):
-        selected_rows = self.table_widget.selectionModel().selectedRows()
+        import pandas as pd
+        selected_rows = self.table_view.selectionModel().selectedRows()
         if selected_rows:
             selected_row = selected_rows[0].row()
 
             # Captura SEQ da linha que será removida, se existir
-            if 'SEQ' in self.df_filtered.columns:
-                seq_val = self.df_filtered.loc[self.df_filtered.index[selected_row], 'SEQ']
+            position = self.table_model.positions[selected_row]
+            self.deleted_rows[position] = True
+            if 'SEQ' in self.base_df.columns:
+                seq_val = self.base_df['SEQ'].iat[position]
             else:
                 seq_val = None
 
-            self.table_widget.removeRow(selected_row)
-            self.df_filtered.drop(self.df_filtered.index[selected_row], inplace=True)
-            self.df_filtered.reset_index(drop=True, inplace=True)
+            self.table_model.remove_row(selected_row)
 
             # Se SEQ for válido, guarda no set para exclusão definitiva
             if seq_val is not None and pd.notna(seq_val):
@@ -879,269 +1441,95 @@ class ConsultaEscalaDialog(QDialog):
             QMessageBox.warning(self, "Aviso", "Nenhuma linha selecionada para excluir.")
 
     def save_changes(self):
-        # Atualiza self.df_filtered com o que está na tabela
-        for row_index in range(self.table_widget.rowCount()):
-            for col_index in range(self.table_widget.columnCount()):
-                item = self.table_widget.item(row_index, col_index)
-                if item:
-                    column_name = self.df_filtered.columns[col_index]
-                    value = item.text()
-                    if value == '':
-                        if column_name in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-                            value = pd.NaT
-                        else:
-                            value = pd.NA
-                    else:
-                        if column_name in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-                            try:
-                                value = pd.to_datetime(value, dayfirst=True, errors='raise')
-                            except ValueError:
-                                QMessageBox.warning(
-                                    self,
-                                    "Data/Hora Inválida",
-                                    f"Formato de data/hora inválido para {column_name} na linha {row_index + 1}."
-                                )
-                                value = self.df_filtered.iloc[row_index, col_index]
-                        elif column_name == 'SEQ':
-                            try:
-                                value = int(value)
-                            except ValueError:
-                                QMessageBox.warning(
-                                    self, "Valor Inválido",
-                                    f"Valor inválido para SEQ na linha {row_index + 1}."
-                                )
-                                value = self.df_filtered.iloc[row_index, col_index]
-                        else:
-                            value = str(value)
-                    self.df_filtered.iloc[row_index, col_index] = value
-
-        # >>> Remove do df_existing as linhas de SEQ que foram excluídas
-        if 'SEQ' in self.df_existing.columns and len(self.deleted_seq) > 0:
-            self.df_existing = self.df_existing[~self.df_existing['SEQ'].isin(self.deleted_seq)]
-            # se quiser, pode limpar: self.deleted_seq.clear()
-
-        # Agora, apenas atualizamos/adicionamos
-        for idx in self.df_filtered.index:
-            seq = self.df_filtered.loc[idx, 'SEQ']
-            if pd.isna(seq):
-                if not self.df_existing.empty:
-                    max_seq = self.df_existing['SEQ'].max()
-                else:
-                    max_seq = 0
-                if pd.isna(max_seq):
-                    max_seq = 0
-                else:
-                    max_seq = int(max_seq)
-                seq = max_seq + 1
-                self.df_filtered.at[idx, 'SEQ'] = seq
-
-            # Atualiza se já existir:
-            if (self.df_existing['SEQ'] == seq).any():
-                for col in self.df_filtered.columns:
-                    if col != 'SEQ':
-                        self.df_existing.loc[self.df_existing['SEQ'] == seq, col] = self.df_filtered.loc[idx, col]
+        import numpy as np
+        import pandas as pd
+        from planilha_io import DATE_COLUMNS, parse_datetime_series
+        # Só as células editadas (ScheduleTableModel.dirty) são convertidas e gravadas
+        dirty = {
+            position: columns for position, columns in self.table_model.dirty.items()
+            if not self.deleted_rows[position]
+        }
+        if not dirty and not self.deleted_seq:
+            QMessageBox.information(self, "Aviso", "Não há alterações para salvar.")
+            return
+
+        positions = np.fromiter(sorted(dirty), dtype=np.intp, count=len(dirty))
+        df_changes = self.base_df.iloc[positions].reset_index(drop=True)
+        # Colunas alteradas de cada linha de df_changes (só elas vão para o UPDATE)
+        changed = [set() for _ in range(len(positions))]
+        invalid = []
+        for col_index, column_name in enumerate(self.labels):
+            rows = [row for row, position in enumerate(positions) if col_index in dirty[position]]
+            if not rows:
+                continue
+            texts = pd.Series(
+                [self.table_model.text_at(positions[row], col_index) for row in rows], index=rows, dtype=object
+            )
+            if column_name in DATE_COLUMNS:
+                with span('conversao_datas', rows=len(texts), coluna=column_name):
+                    parsed = parse_datetime_series(texts)
+                bad = parsed.isna() & (texts != '')
+                for row in texts.index[bad]:
+                    invalid.append(f"{column_name} (SEQ {df_changes.at[row, 'SEQ']}): {texts[row]}")
+                # Datas inválidas mantêm o valor anterior
+                rows = texts.index[~bad]
+                df_changes.loc[rows, column_name] = parsed[~bad]
             else:
-                # Se for linha nova
-                self.df_existing = pd.concat([self.df_existing, self.df_filtered.loc[[idx]]], ignore_index=True)
+                df_changes.loc[rows, column_name] = texts.where(texts != '', None)
+            for row in rows:
+                changed[row].add(column_name)
 
-        for col in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-            self.df_existing[col] = pd.to_datetime(self.df_existing[col], errors='coerce')
+        if invalid:
+            QMessageBox.warning(
+                self, "Data/Hora Inválida",
+                "Formato de data/hora inválido (valor anterior mantido):\n" + "\n".join(invalid)
+            )
 
-        try:
-            with pd.ExcelWriter(self.planilha_path, engine='openpyxl') as writer:
-                self.df_existing.to_excel(writer, index=False)
-
-            wb = load_workbook(self.planilha_path)
-            ws = wb.active
-            columns = {cell.value: idx+1 for idx, cell in enumerate(ws[1])}
-            inicio_col = columns.get('DATA/HORA INICIO')
-            fim_col = columns.get('DATA/HORA FIM')
-            date_format = 'dd/mm/yyyy hh:mm:ss'
-
-            if inicio_col:
-                for cell in ws.iter_cols(min_col=inicio_col, max_col=inicio_col, min_row=2):
-                    for c in cell:
-                        c.number_format = date_format
-            if fim_col:
-                for cell in ws.iter_cols(min_col=fim_col, max_col=fim_col, min_row=2):
-                    for c in cell:
-                        c.number_format = date_format
-
-            wb.save(self.planilha_path)
-            QMessageBox.information(self, "Sucesso", f"Alterações salvas com sucesso em {self.planilha_path}!")
-            self.table_widget.setEditTriggers(QTableWidget.NoEditTriggers)
-
-            # Agora recarrega a planilha para sincronizar tudo
-            self.reload_after_save()
-
-        except Exception as e:
-            QMessageBox.warning(self, "Erro", f"Falha ao salvar as alterações: {e}")
+        self.save_button.setEnabled(False)
+        self.table_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        run_with_progress(
+            self, "Salvando alterações", save_changes_job,
+            self.planilha_path, df_changes, changed, set(self.deleted_seq),
+            on_result=self.finish_save_changes,
+            on_error=lambda msg: QMessageBox.warning(self, "Erro", f"Falha ao salvar as alterações: {msg}"),
+            on_finished=lambda: self.save_button.setEnabled(True)
+        )
+
+    def finish_save_changes(self, result):
+        df_saved, deleted_seq = result
+        self.deleted_seq.difference_update(deleted_seq)
+        QMessageBox.information(self, "Sucesso", "Alterações salvas com sucesso!")
+
+        # Agora recarrega os dados para sincronizar tudo
+        self.reload_after_save()
 
     def reload_after_save(self):
         """
-        Recarrega a planilha atualizada, reflete em df_existing, df_filtered e original_df.
+        Recarrega os dados atualizados (em segundo plano) e reflete em
+        df_existing, original_df e na tabela.
         """
-        try:
-            updated_df = pd.read_excel(self.planilha_path)
-            updated_df.columns = updated_df.columns.str.upper()
-
-            # Converte colunas de data/hora
-            for c in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-                if c in updated_df.columns:
-                    updated_df[c] = pd.to_datetime(updated_df[c], format="%d/%m/%Y %H:%M:%S", errors='coerce')
-
-            self.df_existing = updated_df.copy()
-            self.original_df = updated_df.copy()
-            self.df_filtered = updated_df.copy()
-
-            # Mantém somente colunas necessárias
-            self.df_filtered = self.df_filtered[self.labels]
-
-            self.populate_table()
+        run_with_progress(
+            self, "Recarregando escalas", load_schedule_job, self.planilha_path,
+            on_result=self.apply_reloaded_frame,
+            on_error=lambda msg: QMessageBox.warning(
+                self, "Aviso", f"Falha ao recarregar planilha após salvar: {msg}"
+            )
+        )
 
-        except Exception as re_load_err:
-            QMessageBox.warning(self, "Aviso", f"Falha ao recarregar planilha após salvar: {re_load_err}")
+    def apply_reloaded_frame(self, updated_df):
+        self.df_existing = updated_df
+        self.original_df = updated_df
+        self.set_source_frame(updated_df)
 
     def send_emails(self):
         """Abre EmailSelectionDialog p/ substring + período e envia e-mail."""
-        tecnicos = list(self.df_filtered['TÉCNICO'].unique())
+        tecnicos = list(self.base_df['TÉCNICO'].iloc[self.table_model.positions].unique())
         dialog = EmailSelectionDialog(tecnicos, self.periodo_inicio, self.periodo_fim)
         if dialog.exec_() == QDialog.Accepted:
-            typed_text = dialog.selected_tecnicos[0]
-            periodo_inicio = dialog.periodo_inicio
-            periodo_fim = dialog.periodo_fim
-
-            try:
-                df_existing = pd.read_excel(self.planilha_path)
-                df_existing.columns = df_existing.columns.str.upper()
-            except FileNotFoundError:
-                QMessageBox.warning(self, "Erro", "A planilha selecionada não foi encontrada.")
-                return
-
-            if df_existing.empty:
-                QMessageBox.information(self, "Aviso", "Não há dados na planilha para enviar.")
-                return
-
-            df_existing['DATA/HORA INICIO'] = pd.to_datetime(
-                df_existing['DATA/HORA INICIO'], format="%d/%m/%Y %H:%M:%S", errors='coerce'
-            )
-            start_date = QDateTime(periodo_inicio, QTime(0, 0)).toPyDateTime()
-            end_date = QDateTime(periodo_fim, QTime(23, 59, 59)).toPyDateTime()
-
-            df_filtered = df_existing[
-                (df_existing['DATA/HORA INICIO'] >= start_date) &
-                (df_existing['DATA/HORA INICIO'] <= end_date) &
-                (df_existing['TÉCNICO'].str.contains(typed_text, case=False, na=False))
-            ]
-
-            if df_filtered.empty:
-                QMessageBox.information(self, "Aviso", "Não há registros para o técnico/período selecionados.")
-                return
-
-            try:
-                locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
-            except:
-                locale.setlocale(locale.LC_TIME, 'Portuguese_Brazil.1252')
-
-            grouped = df_filtered.groupby('TÉCNICO')
-            for tecnico, group in grouped:
-                email = technician_emails.get(tecnico)
-                if not email:
-                    QMessageBox.warning(self, "Aviso", f"E-mail do técnico {tecnico} não encontrado.")
-                    continue
-
-                message = f"""
-                <html>
-                    <body>
-                        <p>Prezado(a) <b>{tecnico}</b>,</p>
-                        <p>Segue sua escala:</p>
-                        <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse;">
-                            <tr>
-                                <th>DIA DA SEMANA</th>
-                                <th>DATA</th>
-                                <th>UNIDADE</th>
-                                <th>LOCALIZAÇÃO</th>
-                                <th>JUSTIFICATIVA</th>
-                                <th>CARD</th>
-                            </tr>
-                """
-                for idx, row in group.iterrows():
-                    dia_semana = row.get('DIA DA SEMANA', '')
-                    data_hora_inicio = row.get('DATA/HORA INICIO')
-                    data_str = data_hora_inicio.strftime('%d/%m/%Y') if pd.notnull(data_hora_inicio) else ''
-                    unidade = row.get('UNIDADE', '')
-                    localizacao = row.get('LOCALIZAÇÃO', '')
-                    justificativa = row.get('JUSTIFICATIVA', '')
-                    card = row.get('CARD', '')
-
-                    message += f"""
-                            <tr>
-                                <td>{dia_semana}</td>
-                                <td>{data_str}</td>
-                                <td>{unidade}</td>
-                                <td>{localizacao}</td>
-                                <td>{justificativa}</td>
-                                <td>{card}</td>
-                            </tr>
-                    """
-                message += """
-                        </table>
-                        <br>
-                        <img src="cid:MinhaImagem" alt="Assinatura" />
-                    </body>
-                </html>
-                """
-                send_email(email, "Escala Semanal", message)
-
-            reply = QMessageBox.question(
-                self,
-                'Enviar para Gestores',
-                'Deseja enviar e-mails para os gestores das unidades?',
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
+            send_schedule_emails(
+                self, self.planilha_path, dialog.selected_tecnicos[0],
+                dialog.periodo_inicio, dialog.periodo_fim, modelo_gestor='padrao'
             )
-            if reply == QMessageBox.Yes:
-                df_units = df_filtered.copy()
-                df_units['DATA'] = df_units['DATA/HORA INICIO'].dt.date
-                unit_grouped = df_units.groupby(['UNIDADE', 'DATA'])
-                for (unidade, data_visita), group in unit_grouped:
-                    gestor_email = unit_manager_emails.get(unidade)
-                    if not gestor_email:
-                        QMessageBox.warning(self, "Aviso", f"E-mail do gestor da unidade {unidade} não encontrado.")
-                        continue
-
-                    tecnicos_na_unidade = group['TÉCNICO'].unique()
-                    tecnicos_lista = ', '.join(tecnicos_na_unidade)
-                    data_inicio = group['DATA/HORA INICIO'].iloc[0]
-                    horario_visita = data_inicio.strftime('%H:%M')
-
-                    mensagem = f"""
-                    <html>
-                        <body>
-                            <p>Prezado(a) Gestor(a),<br><br>
-                            Informamos que o(s) técnico(s) <b>{tecnicos_lista}</b> estará(ão) presente(s) na unidade <b>{unidade}</b>
-                            no dia {data_visita.strftime('%d/%m/%Y')} às {horario_visita}.<br>
-                            <br>
-                            Atenciosamente,<br>Sua Equipe
-                            <br><br>
-                            <img src="cid:MinhaImagem" alt="Assinatura" />
-                        </body>
-                    </html>
-                    """
-                    data_envio = datetime.datetime.combine(data_visita, datetime.time(7, 0))
-                    try:
-                        send_email(
-                            gestor_email,
-                            f"Visita de Técnico - {data_visita.strftime('%d/%m/%Y')}",
-                            mensagem,
-                            send_time=data_envio
-                        )
-                    except Exception as e:
-                        QMessageBox.warning(self, "Erro", f"Falha ao agendar e-mail para {gestor_email}: {e}")
-
-                QMessageBox.information(self, "Sucesso", "E-mails enviados aos técnicos e gestores das unidades.")
-            else:
-                QMessageBox.information(self, "Sucesso", "E-mails enviados apenas aos técnicos.")
 
     def get_primary_button_style(self):
         return """
@@ -1188,6 +1576,10 @@ class ConsultaEscalaDialog(QDialog):
 # --------------------------------------------------
 #        FORM PRINCIPAL PARA INCLUIR ESCALAS
 # --------------------------------------------------
+# Conflitos listados na pergunta antes de incluir um lote de escalas
+MAX_LISTED_CONFLICTS = 10
+
+
 class ScheduleForm(QWidget):
     """
     Tela principal para Incluir Escala.
@@ -1206,8 +1598,17 @@ class ScheduleForm(QWidget):
         self.enter_timer.setInterval(500)
         self.enter_timer.timeout.connect(self.reset_enter)
         self.is_editing_entry = False
+        self.saving_pending = False
+        # Quantas linhas do início da tabela estão sendo gravadas (finalize_schedule)
+        self.saving_count = 0
+        # As gravações vão só para o banco; a planilha Excel é regravada ao fechar
+        self.closing_export = None
+        self.planilha_exported = False
         self.tecnicos_12x36_dias = {}
 
+        # Reenvia e-mails que ficaram pendentes em execuções anteriores
+        mail_drainer().schedule()
+
         # Carrega escalas_tecnicos.json
         try:
             with open('escalas_tecnicos.json', 'r', encoding='utf-8') as f:
@@ -1220,6 +1621,7 @@ class ScheduleForm(QWidget):
             sys.exit()
 
         self.init_ui()
+        self.warm_conflict_index()
 
     def init_ui(self):
         """
@@ -1227,6 +1629,7 @@ class ScheduleForm(QWidget):
         incluindo a tabela, combos de localização/unidade/tecnico,
         e localizacao_options com "Online".
         """
+        from planilha_io import LABELS
         main_layout = QVBoxLayout()
         main_layout.setAlignment(Qt.AlignTop)
         main_layout.setSpacing(0)
@@ -1251,10 +1654,7 @@ class ScheduleForm(QWidget):
         self.periodo_label.clicked.connect(self.change_period)
         main_layout.addWidget(self.periodo_label)
 
-        self.labels = [
-            'DIA DA SEMANA', 'LOCALIZAÇÃO', 'UNIDADE', 'TÉCNICO', 'ESCALA', 'TURNO',
-            'DATA/HORA INICIO', 'DATA/HORA FIM', 'JUSTIFICATIVA', 'CARD'
-        ]
+        self.labels = list(LABELS)
 
         localizacao_options = ["", "Folga", "Férias", "Sobreaviso", "Unidade", "Escritório", "Home", "Online"]
 
@@ -1658,7 +2058,13 @@ class ScheduleForm(QWidget):
         main_layout.addWidget(self.table_widget)
 
         self.sort_states = {2: False, 3: False, 6: False}
-        self.original_data = []
+        # Linhas ainda não gravadas, por coluna e tipadas, na ordem da tabela
+        from pending_rows import PendingSchedule
+        self.original_data = PendingSchedule(self.labels)
+        # (stat da planilha, DataFrame, ConflictIndex), montado em segundo plano
+        # por conflict_index_job; None enquanto não fica pronto
+        self.planilha_conflicts = None
+        self.conflicts_job = None
 
         buttons_layout = QHBoxLayout()
         left_buttons_layout = QHBoxLayout()
@@ -1678,6 +2084,13 @@ class ScheduleForm(QWidget):
         self.incluir_escala_button.clicked.connect(self.incluir_escala_semanal)
         left_buttons_layout.addWidget(self.incluir_escala_button)
 
+        self.otimizar_escala_button = QPushButton(" Escala Otimizada")
+        self.otimizar_escala_button.setFixedSize(180, 40)
+        self.otimizar_escala_button.setIcon(QIcon("icons/add_schedule.png"))
+        self.otimizar_escala_button.setStyleSheet(self.get_success_button_style())
+        self.otimizar_escala_button.clicked.connect(self.incluir_escala_otimizada)
+        left_buttons_layout.addWidget(self.otimizar_escala_button)
+
         self.send_email_button = QPushButton(" Enviar Escala")
         self.send_email_button.setFixedSize(180, 40)
         self.send_email_button.setIcon(QIcon("icons/email.png"))
@@ -1732,6 +2145,7 @@ class ScheduleForm(QWidget):
             }
         """)
         self.setLayout(main_layout)
+        QShortcut(QKeySequence(Qt.Key_F12), self, activated=show_diagnostics)
         self.setWindowTitle('GIRA TURNOS')
         self.resize(1200, 600)
         self.show()
@@ -1821,33 +2235,19 @@ class ScheduleForm(QWidget):
 
     def should_work(self, tecnico, date):
         """Verifica se técnico deve trabalhar numa data (5x2 ou 12x36)."""
-        tecnico_info = self.technician_schedules.get(tecnico, {})
-        if not tecnico_info:
-            return False
-        escala = tecnico_info.get('escala')
-        if escala == '5X2':
-            dia_semana = date.dayOfWeek()  # 1=Seg ... 7=Dom
-            return dia_semana in tecnico_info.get('dias_trabalho', [])
-        elif escala == '12X36':
-            dias_trabalho = self.tecnicos_12x36_dias.get(tecnico)
-            if dias_trabalho:
-                dia_mes = date.day()
-                if dias_trabalho == 'pares':
-                    return (dia_mes % 2 == 0)
-                elif dias_trabalho == 'impares':
-                    return (dia_mes % 2 != 0)
-        return False
+        from schedule_generator import should_work
+        return should_work(
+            self.technician_schedules.get(tecnico, {}), date.toPyDate(), self.tecnicos_12x36_dias.get(tecnico)
+        )
 
     def does_on_call(self, tecnico):
         """Verifica se técnico faz sobreaviso."""
-        tecnico_info = self.technician_schedules.get(tecnico)
-        if not tecnico_info:
-            return False
-        sobreaviso_info = tecnico_info.get('sobreaviso', {})
-        return sobreaviso_info.get('faz_sobreaviso', False)
+        from schedule_generator import does_on_call
+        return does_on_call(self.technician_schedules.get(tecnico))
 
     def incluir_escala_semanal(self):
         """Inclui escala pré-preenchida para o período selecionado."""
+        from schedule_generator import generate_schedule
         tecnicos = list(self.technician_schedules.keys())
         dialog = TechnicianSelectionDialog(tecnicos, self.technician_schedules)
         if dialog.exec_() == QDialog.Accepted:
@@ -1856,20 +2256,105 @@ class ScheduleForm(QWidget):
             for tecnico, dias_trabalho in selected_tecnicos.items():
                 if self.technician_schedules[tecnico]['escala'] == '12X36':
                     self.tecnicos_12x36_dias[tecnico] = dias_trabalho
-            for tecnico in selected_tecnicos:
-                current_date = self.periodo_inicio
-                while current_date <= self.periodo_fim:
-                    # Verifica apenas se precisa inserir (12x36 ou 5x2),
-                    # mas não impede se quiser criar manualmente no fim de semana
-                    if self.should_work(tecnico, current_date):
-                        self.combo_box_tecnico.setCurrentText(tecnico)
-                        self.date_time_edit_inicio.setDate(current_date)
-                        self.update_fields_based_on_tecnico()
-                        self.add_entry()
-                    current_date = current_date.addDays(1)
+            # Gera todo o período de uma vez (só os dias em que cada técnico trabalha)
+            df_escala = generate_schedule(
+                self.technician_schedules,
+                self.periodo_inicio.toPyDate(),
+                self.periodo_fim.toPyDate(),
+                selected_tecnicos
+            )
+            if self.confirm_new_entries(df_escala):
+                self.add_entries(df_escala)
+                self.clear_fields()
+
+    def incluir_escala_otimizada(self):
+        """
+        Inclui a escala do período com unidades e sobreavisos distribuídos
+        (schedule_optimizer) conforme as demandas de demandas_unidades.json.
+        """
+        from schedule_optimizer import UNIT_DEMANDS_PATH, load_unit_demands, optimize_schedule
+        try:
+            demands = load_unit_demands(UNIT_DEMANDS_PATH)
+        except FileNotFoundError:
+            QMessageBox.critical(self, "Erro", f"Arquivo '{UNIT_DEMANDS_PATH}' não encontrado.")
+            return
+        except ValueError as e:
+            QMessageBox.critical(self, "Erro", f"Demandas inválidas em '{UNIT_DEMANDS_PATH}': {e}")
+            return
+
+        tecnicos = list(self.technician_schedules.keys())
+        dialog = TechnicianSelectionDialog(tecnicos, self.technician_schedules)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        selected_tecnicos = dialog.selected_tecnicos
+        self.tecnicos_12x36_dias = {
+            tecnico: dias for tecnico, dias in selected_tecnicos.items()
+            if self.technician_schedules[tecnico]['escala'] == '12X36'
+        }
+        result = optimize_schedule(
+            self.technician_schedules,
+            self.periodo_inicio.toPyDate(),
+            self.periodo_fim.toPyDate(),
+            selected_tecnicos,
+            demands
+        )
+        if not self.confirm_new_entries(result.frame):
+            return
+        self.add_entries(result.frame)
+        self.clear_fields()
+
+        if result.faltas:
+            faltas = "\n".join(
+                f"{data.strftime('%d/%m/%Y')} - {unidade}: faltou {faltam} técnico(s)"
+                for data, unidade, faltam in result.faltas
+            )
+            QMessageBox.warning(
+                self, "Aviso",
+                f"Não há técnicos suficientes para todas as demandas:\n\n{faltas}"
+            )
+
+    def add_entries(self, rows):
+        """
+        Inclui várias linhas de uma vez: `rows` é uma lista de linhas de
+        texto (na ordem de self.labels) ou um DataFrame com essas colunas.
+        Repintura e sinais da tabela ficam suspensos até o fim da inclusão.
+        """
+        if isinstance(rows, list):
+            texts = rows
+        else:
+            from planilha_io import frame_to_display_rows
+            texts = frame_to_display_rows(rows, self.labels)
+        if not texts:
+            return
+
+        table = self.table_widget
+        start = table.rowCount()
+        table.setUpdatesEnabled(False)
+        signals_blocked = table.blockSignals(True)
+        try:
+            table.setRowCount(start + len(texts))
+            for offset, fields in enumerate(texts):
+                for column, value in enumerate(fields):
+                    table.setItem(start + offset, column, QTableWidgetItem(value))
+        finally:
+            table.blockSignals(signals_blocked)
+            table.setUpdatesEnabled(True)
+
+        if isinstance(rows, list):
+            self.original_data.append_rows(texts)
+        else:
+            self.original_data.append_frame(rows)
 
     def add_entry(self):
         """Adiciona uma entrada na tabela."""
+        if self.editing_row is not None and self.editing_row < self.saving_count:
+            # A linha já foi enviada para gravação: alterá-la agora não chegaria à planilha
+            QMessageBox.warning(
+                self, "Aviso",
+                "Esta linha está sendo gravada na planilha e não pode ser alterada agora. "
+                "Depois da gravação, altere-a pela consulta."
+            )
+            return
         dia_semana = self.dia_semana.text()
         localizacao = self.combo_box_localizacao.currentText()
         unidade = self.combo_box_unidade.currentText()
@@ -1913,18 +2398,26 @@ class ScheduleForm(QWidget):
         ]
 
         if self.editing_row is not None:
+            conflitos = self.schedule_conflicts(tecnico, localizacao, data_hora_inicio_dt, data_hora_fim_dt)
+            if conflitos:
+                reply = QMessageBox.question(
+                    self,
+                    "Conflito de horário",
+                    f"{tecnico} já tem escala neste horário:\n\n" + "\n".join(conflitos)
+                    + "\n\nDeseja incluir mesmo assim?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    return
             for column, value in enumerate(fields):
                 self.table_widget.setItem(self.editing_row, column, QTableWidgetItem(value))
-            self.original_data[self.editing_row] = fields
+            self.original_data.replace_row(self.editing_row, fields)
             self.editing_row = None
             self.add_button.setText(" Adicionar")
             self.add_button.setIcon(QIcon("icons/add.png"))
         else:
-            row_position = self.table_widget.rowCount()
-            self.table_widget.insertRow(row_position)
-            for column, value in enumerate(fields):
-                self.table_widget.setItem(row_position, column, QTableWidgetItem(value))
-            self.original_data.append(fields)
+            new_rows = [fields]
 
             # Exemplo de inserir uma folga automática após sobreaviso de domingo
             if localizacao == 'Sobreaviso':
@@ -1951,14 +2444,133 @@ class ScheduleForm(QWidget):
                             "Folga após sobreaviso",
                             ""
                         ]
-                        row_position = self.table_widget.rowCount()
-                        self.table_widget.insertRow(row_position)
-                        for column, value2 in enumerate(folga_fields):
-                            self.table_widget.setItem(row_position, column, QTableWidgetItem(value2))
-                        self.original_data.append(folga_fields)
+                        new_rows.append(folga_fields)
+            # A Folga automática também é checada: ela pode cair sobre uma
+            # escala já marcada para a segunda-feira
+            if not self.confirm_new_entries(new_rows):
+                return
+            self.add_entries(new_rows)
 
         self.clear_fields()
 
+    def warm_conflict_index(self):
+        """Monta, fora da interface, o índice de conflitos da planilha (se já não está montando)."""
+        if self.conflicts_job is not None or not os.path.exists(self.planilha_path):
+            return
+
+        def done():
+            self.conflicts_job = None
+
+        self.conflicts_job = start_job(
+            conflict_index_job, self.planilha_path,
+            on_result=lambda result: setattr(self, 'planilha_conflicts', result),
+            # Planilha ilegível agora: a checagem fica só com as linhas da tabela
+            on_error=lambda msg: setattr(self, 'planilha_conflicts', None),
+            on_finished=done
+        )
+
+    def ready_conflict_index(self):
+        """
+        (stat, DataFrame, ConflictIndex) da planilha se o índice está pronto
+        e a planilha não mudou desde então; senão dispara o aquecimento e
+        retorna None.
+        """
+        import schedule_cache
+        ready = self.planilha_conflicts
+        if ready is not None and ready[0] != schedule_cache.planilha_stat(self.planilha_path):
+            ready = None
+        if ready is None:
+            self.warm_conflict_index()
+        return ready
+
+    def schedule_conflicts(self, tecnico, localizacao, inicio, fim):
+        """
+        Conflitos (conflict_index) de uma escala nova ou editada com as
+        escalas da planilha e com as linhas ainda não gravadas da tabela.
+        A planilha nunca é lida aqui: vale o índice montado por
+        warm_conflict_index; enquanto ele não está pronto (ou se a planilha
+        mudou desde então), só as linhas da tabela são checadas.
+        """
+        from conflict_index import ConflictIndex, describe_entry
+        conflitos = []
+        ready = self.ready_conflict_index()
+        if ready is not None:
+            _, frame, index = ready
+            for position, motivo in index.check(tecnico, localizacao, inicio, fim):
+                entry = frame.iloc[position]
+                conflitos.append(f"SEQ {entry['SEQ']}: " + describe_entry(
+                    entry['LOCALIZAÇÃO'], entry['UNIDADE'], entry['DATA/HORA INICIO'], entry['DATA/HORA FIM']
+                ) + f" ({motivo})")
+
+        pending = self.original_data.to_frame()
+        ignore = {self.editing_row} if self.editing_row is not None else ()
+        for position, motivo in ConflictIndex(pending).check(tecnico, localizacao, inicio, fim, ignore=ignore):
+            entry = pending.iloc[position]
+            conflitos.append(f"Linha {position + 1} (não gravada): " + describe_entry(
+                entry['LOCALIZAÇÃO'], entry['UNIDADE'], entry['DATA/HORA INICIO'], entry['DATA/HORA FIM']
+            ) + f" ({motivo})")
+        return conflitos
+
+    def new_entries_conflicts(self, batch):
+        """
+        Conflitos de um lote de escalas novas (linhas de texto na ordem de
+        self.labels ou DataFrame) com a planilha, com as linhas ainda não
+        gravadas da tabela e entre as próprias escalas do lote. Como em
+        schedule_conflicts, a planilha só entra se o índice já está pronto.
+        """
+        import pandas as pd
+        from conflict_index import ConflictIndex, check_frame, describe_entry, find_conflicts
+        from planilha_io import ensure_typed_dates
+        if isinstance(batch, list):
+            batch = ensure_typed_dates(pd.DataFrame(batch, columns=self.labels))
+        else:
+            batch = ensure_typed_dates(batch.reset_index(drop=True).copy())
+
+        def describe(entry):
+            return describe_entry(
+                entry['LOCALIZAÇÃO'], entry['UNIDADE'], entry['DATA/HORA INICIO'], entry['DATA/HORA FIM']
+            )
+
+        def line(position, other, motivo):
+            entry = batch.iloc[position]
+            return f"{entry['TÉCNICO']}: {describe(entry)} x {other} ({motivo})"
+
+        conflitos = []
+        ready = self.ready_conflict_index()
+        if ready is not None:
+            _, frame, index = ready
+            for position, other, motivo in check_frame(index, batch):
+                conflitos.append(line(position, f"SEQ {frame.iloc[other]['SEQ']}: {describe(frame.iloc[other])}", motivo))
+
+        pending = self.original_data.to_frame()
+        for position, other, motivo in check_frame(ConflictIndex(pending), batch):
+            conflitos.append(line(position, f"Linha {other + 1} (não gravada): {describe(pending.iloc[other])}", motivo))
+
+        for position, other, motivo in find_conflicts(batch):
+            conflitos.append(line(position, f"nova: {describe(batch.iloc[other])}", motivo))
+        return conflitos
+
+    def confirm_new_entries(self, batch):
+        """
+        Checa o lote (new_entries_conflicts) antes da inclusão; com conflito,
+        pergunta se inclui mesmo assim. Retorna True se pode incluir.
+        """
+        conflitos = self.new_entries_conflicts(batch)
+        if not conflitos:
+            return True
+        listados = conflitos[:MAX_LISTED_CONFLICTS]
+        if len(conflitos) > len(listados):
+            listados.append(f"... e mais {len(conflitos) - len(listados)} conflito(s)")
+        reply = QMessageBox.question(
+            self,
+            "Conflito de horário",
+            "As escalas a incluir conflitam com escalas existentes:\n\n" + "\n".join(listados)
+            + "\n\nDeseja incluir mesmo assim?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        return reply == QMessageBox.Yes
+
     def clear_fields(self):
         self.combo_box_localizacao.setCurrentIndex(0)
         self.combo_box_unidade.setCurrentIndex(0)
@@ -1986,16 +2598,9 @@ class ScheduleForm(QWidget):
             except TypeError:
                 pass
 
-            dia_semana = self.table_widget.item(selected_row, 0).text()
-            localizacao = self.table_widget.item(selected_row, 1).text()
-            unidade = self.table_widget.item(selected_row, 2).text()
-            tecnico = self.table_widget.item(selected_row, 3).text()
-            escala = self.table_widget.item(selected_row, 4).text()
-            turno = self.table_widget.item(selected_row, 5).text()
-            data_hora_inicio = self.table_widget.item(selected_row, 6).text()
-            data_hora_fim = self.table_widget.item(selected_row, 7).text()
-            justificativa = self.table_widget.item(selected_row, 8).text()
-            card_value = self.table_widget.item(selected_row, 9).text()
+            # Valores tipados da linha: as datas já vêm como datetime (ou None)
+            (dia_semana, localizacao, unidade, tecnico, escala, turno,
+             data_hora_inicio, data_hora_fim, justificativa, card_value) = self.original_data.typed_row(selected_row)
 
             self.dia_semana.setText(dia_semana)
             index_localizacao = self.combo_box_localizacao.findText(localizacao)
@@ -2006,14 +2611,12 @@ class ScheduleForm(QWidget):
             self.escala_label.setText(escala)
             self.combo_box_turno.setCurrentText(turno)
 
-            dt_inicio = QDateTime.fromString(data_hora_inicio, "dd/MM/yyyy HH:mm:ss")
-            dt_fim = QDateTime.fromString(data_hora_fim, "dd/MM/yyyy HH:mm:ss")
-            if dt_inicio.isValid():
-                self.date_time_edit_inicio.setDateTime(dt_inicio)
+            if data_hora_inicio is not None:
+                self.date_time_edit_inicio.setDateTime(QDateTime(data_hora_inicio))
             else:
                 self.date_time_edit_inicio.setDateTime(QDateTime(self.periodo_inicio, QTime.currentTime()))
-            if dt_fim.isValid():
-                self.date_time_edit_fim.setDateTime(dt_fim)
+            if data_hora_fim is not None:
+                self.date_time_edit_fim.setDateTime(QDateTime(data_hora_fim))
             else:
                 self.date_time_edit_fim.setDateTime(QDateTime(self.periodo_inicio, QTime.currentTime()))
 
@@ -2034,12 +2637,14 @@ class ScheduleForm(QWidget):
         if selected_rows:
             selected_row = selected_rows[0].row()
             self.table_widget.removeRow(selected_row)
-            del self.original_data[selected_row]
+            self.original_data.delete_row(selected_row)
             self.clear_fields()
         else:
             QMessageBox.warning(self, "Aviso", "Nenhuma linha selecionada para excluir.")
 
     def handle_header_click(self, logicalIndex):
+        if self.saving_pending:
+            return
         if logicalIndex in self.sort_states:
             self.sort_states[logicalIndex] = not self.sort_states[logicalIndex]
             order = Qt.AscendingOrder if self.sort_states[logicalIndex] else Qt.DescendingOrder
@@ -2047,130 +2652,146 @@ class ScheduleForm(QWidget):
             self.sort_table(logicalIndex, order)
 
     def sort_table(self, column, order):
-        data = []
-        for row in range(self.table_widget.rowCount()):
-            row_data = []
-            for col in range(self.table_widget.columnCount()):
-                item = self.table_widget.item(row, col)
-                if item:
-                    row_data.append(item.text())
-                else:
-                    row_data.append('')
-            data.append(row_data)
-
-        reverse = (order == Qt.DescendingOrder)
-        if column == 6:
-            data.sort(key=lambda x: QDateTime.fromString(x[column], "dd/MM/yyyy HH:mm:ss").toPyDateTime(), reverse=reverse)
-        else:
-            data.sort(key=lambda x: x[column], reverse=reverse)
-
-        self.table_widget.setRowCount(0)
-        for row_data in data:
-            row_position = self.table_widget.rowCount()
-            self.table_widget.insertRow(row_position)
-            for column_index, value in enumerate(row_data):
-                self.table_widget.setItem(row_position, column_index, QTableWidgetItem(value))
-        self.original_data = data
+        """
+        Ordena por uma permutação estável (filter_engine.sort_permutation)
+        calculada sobre original_data; os itens da tabela só trocam de
+        linha, sem recriar a tabela linha a linha.
+        """
+        import pandas as pd
+        from filter_engine import SortKey, sort_permutation
+        values = pd.Series(self.original_data.column(self.labels[column]))
+        permutation = sort_permutation([SortKey(values)], [order == Qt.AscendingOrder])
+
+        table = self.table_widget
+        column_count = table.columnCount()
+        items = [[table.takeItem(row, col) for col in range(column_count)] for row in permutation]
+        table.setUpdatesEnabled(False)
+        try:
+            for row, row_items in enumerate(items):
+                for col, item in enumerate(row_items):
+                    if item is not None:
+                        table.setItem(row, col, item)
+        finally:
+            table.setUpdatesEnabled(True)
+        self.original_data.reorder(permutation)
 
     def finalize_schedule(self):
         if not self.original_data:
             QMessageBox.information(self, "Aviso", "Não há entradas para salvar.")
             return
 
-        try:
-            df_existing = pd.read_excel(self.planilha_path)
-            df_existing.columns = df_existing.columns.str.upper()
-        except FileNotFoundError:
-            df_existing = pd.DataFrame()
+        # Enquanto grava, novas linhas podem ser incluídas; só as
+        # linhas enviadas para gravação saem da tabela no final.
+        rows = self.original_data.typed_rows()
+        self.saving_count = len(rows)
+        self.set_saving_pending(True)
+        run_with_progress(
+            self, "Salvando escala", append_schedule_job, self.planilha_path, rows, self.labels,
+            on_result=lambda seqs: self.finish_finalize(len(rows)),
+            on_error=lambda msg: QMessageBox.warning(self, "Erro", f"Falha ao salvar a escala: {msg}"),
+            on_finished=lambda: self.set_saving_pending(False)
+        )
 
-        if not df_existing.empty and 'SEQ' in df_existing.columns:
-            try:
-                df_existing['SEQ'] = df_existing['SEQ'].astype(int)
-            except ValueError:
-                df_existing['SEQ'] = pd.to_numeric(df_existing['SEQ'], errors='coerce').fillna(0).astype(int)
-        elif not df_existing.empty and 'SEQ' not in df_existing.columns:
-            df_existing.insert(0, 'SEQ', range(1, len(df_existing) + 1))
-
-        df_new = pd.DataFrame(self.original_data, columns=self.labels)
-
-        if not df_existing.empty and 'SEQ' in df_existing.columns:
-            max_seq = df_existing['SEQ'].max()
-            if pd.isna(max_seq):
-                max_seq = 0
-            else:
-                max_seq = int(max_seq)
+    def set_saving_pending(self, saving):
+        """
+        Bloqueia editar/excluir/ordenar/finalizar enquanto as linhas são
+        gravadas; uma edição já aberta numa delas também não é aceita
+        (add_entry), então finish_finalize remove exatamente o que foi gravado.
+        """
+        self.saving_pending = saving
+        if not saving:
+            self.saving_count = 0
+        for button in (self.finalize_button, self.edit_button, self.delete_button):
+            button.setEnabled(not saving)
+
+    def finish_finalize(self, saved_count):
+        if saved_count >= self.table_widget.rowCount():
+            self.table_widget.setRowCount(0)
         else:
-            max_seq = 0
-
-        df_new.insert(0, 'SEQ', range(max_seq + 1, max_seq + len(df_new) + 1))
-
-        for col in ['DATA/HORA INICIO', 'DATA/HORA FIM']:
-            df_new[col] = pd.to_datetime(df_new[col], format="%d/%m/%Y %H:%M:%S", errors='coerce')
-
-        df_final = pd.concat([df_existing, df_new], ignore_index=True)
-        df_final.to_excel(self.planilha_path, index=False, engine='openpyxl')
-
-        wb = load_workbook(self.planilha_path)
-        ws = wb.active
-        columns = {cell.value: idx+1 for idx, cell in enumerate(ws[1])}
-        inicio_col = columns.get('DATA/HORA INICIO')
-        fim_col = columns.get('DATA/HORA FIM')
-        date_format = 'dd/mm/yyyy hh:mm:ss'
-
-        if inicio_col:
-            for cell in ws.iter_cols(min_col=inicio_col, max_col=inicio_col, min_row=2):
-                for c in cell:
-                    c.number_format = date_format
-
-        if fim_col:
-            for cell in ws.iter_cols(min_col=fim_col, max_col=fim_col, min_row=2):
-                for c in cell:
-                    c.number_format = date_format
+            for _ in range(saved_count):
+                self.table_widget.removeRow(0)
+        self.original_data.drop_head(saved_count)
+        if self.editing_row is not None:
+            if self.editing_row < saved_count:
+                self.clear_fields()
+            else:
+                self.editing_row -= saved_count
+        # As linhas gravadas agora fazem parte da planilha: refaz o índice de conflitos
+        self.warm_conflict_index()
+        QMessageBox.information(self, "Sucesso", "Escala finalizada e salva com sucesso!")
 
-        wb.save(self.planilha_path)
+    def closeEvent(self, event):
+        """
+        Antes de fechar, leva para a planilha Excel o que foi gravado só no
+        banco (export_planilha_job, em segundo plano); a janela fecha quando
+        a exportação termina.
+        """
+        if self.planilha_exported:
+            event.accept()
+            return
+        event.ignore()
+        if self.closing_export is not None:
+            return
+        self.setEnabled(False)
+        self.closing_export = run_with_progress(
+            self, "Atualizando planilha", export_planilha_job, self.planilha_path,
+            on_result=lambda _: self.close_after_export(),
+            on_error=self.close_export_failed,
+            cancellable=False
+        )
 
-        self.table_widget.setRowCount(0)
-        self.original_data.clear()
-        QMessageBox.information(self, "Sucesso", "Escala finalizada e salva com sucesso!")
+    def close_after_export(self):
+        self.planilha_exported = True
+        self.close()
+
+    def close_export_failed(self, msg):
+        self.closing_export = None
+        self.setEnabled(True)
+        reply = QMessageBox.question(
+            self, "Erro",
+            f"Falha ao atualizar a planilha: {msg}\n"
+            "As alterações estão salvas no banco local e vão para a planilha na próxima vez. "
+            "Fechar mesmo assim?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.close_after_export()
 
     def consultar_escala(self, periodo_inicio=None, periodo_fim=None):
         """
         Ignora o período e mostra TODOS os dados da planilha em ConsultaEscalaDialog.
         """
-        try:
-            df_existing = pd.read_excel(self.planilha_path)
-            df_existing.columns = df_existing.columns.str.upper()
-        except FileNotFoundError:
+        if not os.path.exists(self.planilha_path):
             QMessageBox.warning(self, "Erro", "A planilha selecionada não foi encontrada.")
             return
 
-        if df_existing.empty:
-            QMessageBox.information(self, "Aviso", "Não há dados na planilha para consultar.")
-            return
-
-        df_existing['DATA/HORA INICIO'] = pd.to_datetime(
-            df_existing['DATA/HORA INICIO'], format="%d/%m/%Y %H:%M:%S", errors='coerce'
+        self.consult_button.setEnabled(False)
+        run_with_progress(
+            self, "Carregando escalas", load_schedule_job, self.planilha_path,
+            on_result=self.open_consulta_dialog,
+            on_error=lambda msg: QMessageBox.warning(self, "Erro", f"Falha ao carregar a planilha: {msg}"),
+            on_finished=lambda: self.consult_button.setEnabled(True)
         )
 
-        # Carrega tudo (sem filtrar pelo período)
-        df_filtered = df_existing.copy()
-
-        if df_filtered.empty:
-            QMessageBox.information(self, "Aviso", "Não há registros na planilha.")
+    def open_consulta_dialog(self, df_existing):
+        if df_existing.empty:
+            QMessageBox.information(self, "Aviso", "Não há dados na planilha para consultar.")
             return
 
-        # Abre a nova tela de consulta com TUDO
-        self.consulta_dialog = ConsultaEscalaDialog(
-            df_filtered,
-            self.planilha_path,
-            df_existing,
-            self.periodo_inicio,
-            self.periodo_fim,
-            ['SEQ'] + self.labels
-        )
+        # Abre a nova tela de consulta com TUDO (sem filtrar pelo período)
+        with span('abrir_consulta', rows=len(df_existing)):
+            self.consulta_dialog = ConsultaEscalaDialog(
+                df_existing,
+                self.planilha_path,
+                df_existing,
+                self.periodo_inicio,
+                self.periodo_fim,
+                ['SEQ'] + self.labels
+            )
         self.consulta_dialog.show()
 
     def update_fields_based_on_tecnico(self):
+        from schedule_generator import horarios_tecnico, turno_para_hora
         if self.is_editing_entry:
             return
 
@@ -2187,18 +2808,8 @@ class ScheduleForm(QWidget):
         selected_datetime = self.date_time_edit_inicio.dateTime()
         selected_date = selected_datetime.date()
 
-        # Se estiver em sobreaviso
-        if selected_localizacao == 'Sobreaviso' and self.does_on_call(tecnico_nome):
-            sobreaviso_info = tecnico_info.get('sobreaviso', {})
-            if unidade_preenchida:
-                horario_inicio = sobreaviso_info.get('horario_com_unidade', {}).get('inicio', tecnico_info.get('horario_inicio', '00:00'))
-                horario_fim = sobreaviso_info.get('horario_com_unidade', {}).get('fim', tecnico_info.get('horario_fim', '00:00'))
-            else:
-                horario_inicio = sobreaviso_info.get('horario_sem_unidade', {}).get('inicio', tecnico_info.get('horario_inicio', '00:00'))
-                horario_fim = sobreaviso_info.get('horario_sem_unidade', {}).get('fim', tecnico_info.get('horario_fim', '00:00'))
-        else:
-            horario_inicio = tecnico_info.get('horario_inicio', '00:00')
-            horario_fim = tecnico_info.get('horario_fim', '00:00')
+        # Em sobreaviso, usa os horários com/sem unidade
+        horario_inicio, horario_fim = horarios_tecnico(tecnico_info, selected_localizacao, unidade_preenchida)
 
         datetime_inicio_str = f"{selected_date.toString('dd/MM/yyyy')} {horario_inicio}"
         datetime_fim_str = f"{selected_date.toString('dd/MM/yyyy')} {horario_fim}"
@@ -2212,24 +2823,16 @@ class ScheduleForm(QWidget):
         self.date_time_edit_fim.setDateTime(datetime_fim)
 
         self.update_dia_semana(datetime_inicio)
-        hour_inicio = datetime_inicio.time().hour()
-        if 6 <= hour_inicio < 18:
-            self.combo_box_turno.setCurrentText("Diurno")
-        else:
-            self.combo_box_turno.setCurrentText("Noturno")
+        self.combo_box_turno.setCurrentText(turno_para_hora(datetime_inicio.time().hour()))
 
     def update_dia_semana_from_datetime(self):
         selected_datetime = self.date_time_edit_inicio.dateTime()
         self.update_dia_semana(selected_datetime)
 
     def get_dia_semana_text(self, selected_datetime):
+        from schedule_generator import DIAS_SEMANA
         selected_date = selected_datetime.date()
-        dias_semana = [
-            "Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
-            "Sexta-feira", "Sábado", "Domingo"
-        ]
-        dia_semana_idx = selected_date.dayOfWeek() - 1
-        return dias_semana[dia_semana_idx]
+        return DIAS_SEMANA[selected_date.dayOfWeek() - 1]
 
     def update_dia_semana(self, selected_datetime):
         dia_semana_sem_data = self.get_dia_semana_text(selected_datetime)
@@ -2261,136 +2864,52 @@ class ScheduleForm(QWidget):
         tecnicos = list(self.technician_schedules.keys())
         dialog = EmailSelectionDialog(tecnicos, self.periodo_inicio, self.periodo_fim)
         if dialog.exec_() == QDialog.Accepted:
-            typed_text = dialog.selected_tecnicos[0]
-            periodo_inicio = dialog.periodo_inicio
-            periodo_fim = dialog.periodo_fim
+            send_schedule_emails(
+                self, self.planilha_path, dialog.selected_tecnicos[0],
+                dialog.periodo_inicio, dialog.periodo_fim, modelo_gestor='sghx'
+            )
 
-            try:
-                df_existing = pd.read_excel(self.planilha_path)
-                df_existing.columns = df_existing.columns.str.upper()
-            except FileNotFoundError:
-                QMessageBox.warning(self, "Erro", "A planilha selecionada não foi encontrada.")
-                return
+# --------------------------------------------------
+#        MEDIÇÃO DO TEMPO DE INICIALIZAÇÃO
+#   (ESCALAS_STARTUP_PROBE=<arquivo.json>, usada por
+#        benchmarks/bench_startup.py)
+# --------------------------------------------------
+STARTUP_PROBE_ENV = 'ESCALAS_STARTUP_PROBE'
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'win32com', 'schedule_store', 'email_dispatch']
 
-            if df_existing.empty:
-                QMessageBox.information(self, "Aviso", "Não há dados na planilha para enviar.")
-                return
 
-            df_existing['DATA/HORA INICIO'] = pd.to_datetime(
-                df_existing['DATA/HORA INICIO'], format="%d/%m/%Y %H:%M:%S", errors='coerce'
-            )
-            start_date = QDateTime(periodo_inicio, QTime(0, 0)).toPyDateTime()
-            end_date = QDateTime(periodo_fim, QTime(23, 59, 59)).toPyDateTime()
+class StartupProbe(QObject):
+    """
+    Grava em JSON os tempos até a primeira pintura da tela inicial e fecha
+    o programa. Também registra quais módulos pesados já estavam carregados
+    (devem continuar fora da inicialização).
+    """
+    def __init__(self, path, app_ready):
+        super().__init__()
+        self.path = path
+        self.app_ready = app_ready
+        self.done = False
 
-            df_filtered = df_existing[
-                (df_existing['DATA/HORA INICIO'] >= start_date) &
-                (df_existing['DATA/HORA INICIO'] <= end_date) &
-                (df_existing['TÉCNICO'].str.contains(typed_text, case=False, na=False))
-            ]
+    def eventFilter(self, source, event):
+        if event.type() == QEvent.Paint and not self.done:
+            self.done = True
+            painted = time.perf_counter()
+            QTimer.singleShot(0, lambda: self.finish(source, painted))
+        return False
 
-            if df_filtered.empty:
-                QMessageBox.information(self, "Aviso", "Não há registros para o técnico e período selecionados.")
-                return
+    def finish(self, dialog, painted):
+        result = {
+            'imports_ms': round((_STARTUP_IMPORTS_DONE - _STARTUP_T0) * 1000, 1),
+            'qapplication_ms': round((self.app_ready - _STARTUP_T0) * 1000, 1),
+            'first_paint_ms': round((painted - _STARTUP_T0) * 1000, 1),
+            'first_paint_epoch': time.time() - (time.perf_counter() - painted),
+            'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in sys.modules],
+            'frozen': bool(getattr(sys, 'frozen', False)),
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        dialog.reject()
 
-            try:
-                locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
-            except:
-                locale.setlocale(locale.LC_TIME, 'Portuguese_Brazil.1252')
-
-            grouped = df_filtered.groupby('TÉCNICO')
-            for tecnico, group in grouped:
-                email = technician_emails.get(tecnico)
-                if not email:
-                    QMessageBox.warning(self, "Aviso", f"E-mail do técnico {tecnico} não encontrado.")
-                    continue
-                message = f"""
-                <html>
-                    <body>
-                        <p>Prezado(a) <b>{tecnico}</b>,</p>
-                        <p>Segue sua escala:</p>
-                        <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse;">
-                            <tr>
-                                <th>DIA DA SEMANA</th>
-                                <th>DATA</th>
-                                <th>UNIDADE</th>
-                                <th>LOCALIZAÇÃO</th>
-                                <th>JUSTIFICATIVA</th>
-                                <th>CARD</th>
-                            </tr>
-                """
-                for idx, row in group.iterrows():
-                    dia_semana = row['DIA DA SEMANA'] if pd.notnull(row['DIA DA SEMANA']) else ''
-                    data_hora_inicio = row['DATA/HORA INICIO']
-                    data = data_hora_inicio.strftime('%d/%m/%Y') if pd.notnull(data_hora_inicio) else ''
-                    unidade = row['UNIDADE'] if pd.notnull(row['UNIDADE']) else ''
-                    localizacao = row['LOCALIZAÇÃO'] if pd.notnull(row['LOCALIZAÇÃO']) else ''
-                    justificativa = row['JUSTIFICATIVA'] if pd.notnull(row['JUSTIFICATIVA']) else ''
-                    card = row['CARD'] if pd.notnull(row['CARD']) else ''
-
-                    message += f"""
-                            <tr>
-                                <td>{dia_semana}</td>
-                                <td>{data}</td>
-                                <td>{unidade}</td>
-                                <td>{localizacao}</td>
-                                <td>{justificativa}</td>
-                                <td>{card}</td>
-                            </tr>
-                    """
-                message += """
-                        </table>
-                        <br>
-                        <img src="cid:MinhaImagem" alt="Assinatura" />
-                    </body>
-                </html>
-                """
-                send_email(email, "Escala Semanal", message)
-
-            reply = QMessageBox.question(
-                self,
-                'Enviar para Gestores',
-                'Deseja enviar e-mails para os gestores das unidades?',
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
-            )
-            if reply == QMessageBox.Yes:
-                df_units = df_filtered.copy()
-                df_units['DATA'] = df_units['DATA/HORA INICIO'].dt.date
-                unit_grouped = df_units.groupby(['UNIDADE', 'DATA'])
-                for (unidade, data_visita), group in unit_grouped:
-                    gestor_email = unit_manager_emails.get(unidade)
-                    if not gestor_email:
-                        QMessageBox.warning(self, "Aviso", f"E-mail do gestor da unidade {unidade} não encontrado.")
-                        continue
-
-                    tecnicos_na_unidade = group['TÉCNICO'].unique()
-                    tecnicos_lista = ', '.join(tecnicos_na_unidade)
-                    data_inicio = group['DATA/HORA INICIO'].iloc[0]
-                    horario_visita = data_inicio.strftime('%H:%M')
-
-                    mensagem = f"""
-                    <html>
-                        <body>
-                            <p>Prezado(a) Gestor(a)/PTA,<br><br>
-                            Hoje foi agendada a visita do técnico <b>{tecnicos_lista}</b> da Liberty Health
-                            para <b>apoio e acompanhamento na utilização do SGHX</b>
-                            na unidade <b>{unidade}</b> a partir das {horario_visita}
-                            do dia {data_visita.strftime('%d/%m/%Y')}.<br><br>
-                            <br><br>
-                            <img src="cid:MinhaImagem" alt="Assinatura" />
-                            </p>
-                        </body>
-                    </html>
-                    """
-                    data_envio = datetime.datetime.combine(data_visita, datetime.time(4, 0))
-                    try:
-                        send_email(gestor_email, f"Visita Técnica - {data_visita.strftime('%d/%m/%Y')}", mensagem, send_time=data_envio)
-                    except Exception as e:
-                        QMessageBox.warning(self, "Erro", f"Falha ao agendar e-mail para {gestor_email}: {e}")
-
-                QMessageBox.information(self, "Sucesso", "E-mails enviados aos técnicos e gestores das unidades.")
-            else:
-                QMessageBox.information(self, "Sucesso", "E-mails enviados apenas aos técnicos.")
 
 # --------------------------------------------------
 #               FUNÇÃO MAIN
@@ -2400,6 +2919,10 @@ def main():
     app.setWindowIcon(QIcon('JT.ico'))
 
     selection_dialog = SelectionDialog()
+    probe_path = os.environ.get(STARTUP_PROBE_ENV)
+    if probe_path:
+        probe = StartupProbe(probe_path, time.perf_counter())
+        selection_dialog.installEventFilter(probe)
     if selection_dialog.exec_() == QDialog.Accepted:
         planilha_path = selection_dialog.planilha_path
         periodo_inicio = selection_dialog.periodo_inicio
@@ -2418,4 +2941,7 @@ def main():
         sys.exit()
 
 if __name__ == '__main__':
+    # Executável do PyInstaller: os processos do report_pipeline reentram por aqui
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -5,12 +5,13 @@ a = Analysis(
     ['ProjetoEscalasV2.py'],
     pathex=[],
     binaries=[],
-    datas=[('escalas_tecnicos.json', '.')],
+    datas=[('escalas_tecnicos.json', '.'), ('demandas_unidades.json', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Módulos que o programa não usa; deixam o executável menor e a extração mais rápida
+    excludes=['tkinter', 'matplotlib', 'IPython', 'jupyter_client', 'notebook', 'scipy', 'pytest'],
     noarchive=False,
     optimize=0,
 )
@@ -26,7 +27,8 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # UPX deixa o arquivo menor, mas descomprimir as DLLs a cada abertura atrasa o início
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -0,0 +1,332 @@
+"""
+Tempos dos caminhos mais usados, com planilhas sintéticas de vários tamanhos.
+
+Para cada tamanho gera uma planilha com as colunas ['SEQ'] + LABELS
+(técnicos de escalas_tecnicos.json com distribuição desigual, unidades e
+localizações nas proporções do dia a dia) e mede, em ms (mediana das
+repetições):
+  - leitura_planilha: importação da .xlsx para o banco + carga (consultar_escala a frio);
+  - leitura_cache: carga com o cache em memória (consultar_escala de novo);
+  - abrir_consulta: criação da ConsultaEscalaDialog (textos e índices);
+  - filtro: apply_filter por técnico, unidade e período;
+  - ordenacao: clique no cabeçalho (TÉCNICO, depois DATA/HORA INICIO);
+  - populate_table: troca das linhas exibidas + pintura da tabela;
+  - save_changes: 100 células editadas, gravação e recarga;
+  - finalize_schedule: 200 linhas novas gravadas pelo ScheduleForm;
+  - emails: montagem dos e-mails de técnicos e gestores de uma semana.
+
+Roda com QT_QPA_PLATFORM=offscreen; as caixas de mensagem são
+respondidas automaticamente. O resultado sai em JSON, para comparar
+versões.
+
+Uso:
+    python benchmarks/bench_hot_paths.py [--tamanhos 1000 10000 100000 1000000] [--repeticoes 3]
+                                         [--seed 42] [--saida resultado.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_FILES = ['escalas_tecnicos.json', 'demandas_unidades.json']
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+EDITED_CELLS = 100
+FINALIZED_ROWS = 200
+
+UNIDADES = [
+    "HM Benedicto", "HM Campo Limpo", "HM Tatuape", "HM Tide", "UPA Santo Amaro",
+    "UPA Pedreira", "UPA Parelheiros", "UPA Jabaquara", "UPA Mooca", "UPA Perus",
+    "UPA Pirituba", "UPA Vergueiro", "UPA Vila Mariana", "UPA Tatuape", "UPA Tiradentes",
+    "CRST Santo Amaro", "UPA Rio Pequeno", "UPA Vera Cruz", "UPA Peri", "UPA Barra Funda",
+]
+LOCALIZACOES = {
+    'Unidade': 0.60, 'Escritório': 0.10, 'Folga': 0.10, 'Home': 0.07,
+    'Sobreaviso': 0.07, 'Férias': 0.04, 'Online': 0.02,
+}
+# Locais em que a linha leva UNIDADE
+COM_UNIDADE = {'Unidade', 'Sobreaviso'}
+
+
+def _median(values):
+    return round(statistics.median(values), 2) if values else None
+
+
+def _elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+# --------------------------------------------------
+#              PLANILHA SINTÉTICA
+# --------------------------------------------------
+def synthetic_frame(size, seed, technician_schedules):
+    """DataFrame com ['SEQ'] + LABELS e `size` linhas, ~20 escalas por dia."""
+    import numpy as np
+    import pandas as pd
+    from planilha_io import LABELS
+    from schedule_generator import DIAS_SEMANA, turno_para_hora
+
+    rng = np.random.default_rng(seed)
+    tecnicos = list(technician_schedules)
+    # Poucos técnicos concentram a maior parte das escalas (Zipf)
+    pesos_tecnicos = 1 / np.arange(1, len(tecnicos) + 1)
+    pesos_unidades = 1 / np.arange(1, len(UNIDADES) + 1) ** 0.7
+    tecnico = rng.choice(tecnicos, size, p=pesos_tecnicos / pesos_tecnicos.sum())
+    localizacao = rng.choice(list(LOCALIZACOES), size, p=list(LOCALIZACOES.values()))
+    unidade = rng.choice(UNIDADES, size, p=pesos_unidades / pesos_unidades.sum())
+    unidade = np.where(np.isin(localizacao, list(COM_UNIDADE)), unidade, '')
+
+    dias = np.sort(rng.integers(0, max(30, size // 20), size))
+    hora = rng.choice([7, 8, 19], size, p=[0.45, 0.45, 0.10])
+    inicio = pd.Timestamp('2020-01-01') + pd.to_timedelta(dias, unit='D') + pd.to_timedelta(hora, unit='h')
+    fim = inicio + pd.Timedelta(hours=9)
+
+    df = pd.DataFrame({
+        'SEQ': np.arange(1, size + 1),
+        'DIA DA SEMANA': np.asarray(DIAS_SEMANA, dtype=object)[inicio.dayofweek],
+        'LOCALIZAÇÃO': localizacao,
+        'UNIDADE': unidade,
+        'TÉCNICO': tecnico,
+        'ESCALA': [technician_schedules[t].get('escala', '-') for t in tecnico],
+        'TURNO': [turno_para_hora(h) for h in hora],
+        'DATA/HORA INICIO': inicio,
+        'DATA/HORA FIM': fim,
+        'JUSTIFICATIVA': np.where(rng.random(size) < 0.3, 'Visita de rotina', ''),
+        'CARD': np.where(rng.random(size) < 0.1, rng.integers(1000, 99999, size).astype(str), ''),
+    })
+    return df[['SEQ'] + LABELS]
+
+
+def write_planilha(df, path):
+    from planilha_io import frame_to_workbook_rows, write_schedule_workbook
+    columns = list(df.columns)
+    # '' vira célula vazia, como nas planilhas gravadas pelo sistema
+    write_schedule_workbook(path, columns, frame_to_workbook_rows(df.replace('', None), columns))
+
+
+# --------------------------------------------------
+#                   MEDIÇÕES
+# --------------------------------------------------
+class HotPathBench:
+    def __init__(self, app, planilha_path, technician_schedules, seed):
+        self.app = app
+        self.planilha_path = planilha_path
+        self.technician_schedules = technician_schedules
+        self.seed = seed
+        self.dialog = None
+
+    def wait_jobs(self):
+        """Processa eventos até terminarem as tarefas em segundo plano (e as encadeadas)."""
+        import workers
+        while workers._running:
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.app.processEvents()
+
+    def leitura_planilha(self):
+        import schedule_cache
+        from schedule_store import open_store
+        schedule_cache.invalidate(self.planilha_path)
+        start = time.perf_counter()
+        open_store(self.planilha_path).sync_from_excel(force=True)
+        schedule_cache.load_frame(self.planilha_path)
+        return _elapsed_ms(start)
+
+    def leitura_cache(self):
+        import schedule_cache
+        start = time.perf_counter()
+        schedule_cache.load_frame(self.planilha_path)
+        return _elapsed_ms(start)
+
+    def _period(self, df):
+        from PyQt5.QtCore import QDate
+        inicio = df['DATA/HORA INICIO'].min()
+        fim = df['DATA/HORA INICIO'].max()
+        return QDate(inicio.year, inicio.month, inicio.day), QDate(fim.year, fim.month, fim.day)
+
+    def abrir_consulta(self):
+        import schedule_cache
+        from ProjetoEscalasV2 import ConsultaEscalaDialog
+        from planilha_io import LABELS
+        df = schedule_cache.load_frame(self.planilha_path)
+        periodo_inicio, periodo_fim = self._period(df)
+        if self.dialog is not None:
+            self.dialog.close()
+            self.dialog.deleteLater()
+        start = time.perf_counter()
+        self.dialog = ConsultaEscalaDialog(df, self.planilha_path, df, periodo_inicio, periodo_fim, ['SEQ'] + LABELS)
+        self.dialog.show()
+        self.app.processEvents()
+        return _elapsed_ms(start)
+
+    def filtro(self):
+        dialog = self.dialog
+        tecnico = str(dialog.base_df['TÉCNICO'].mode().iat[0])
+        times = []
+        for tecnico_text, unidade_text in ((tecnico, ''), ('', 'UPA'), (tecnico[:3], 'HM')):
+            dialog.clear_filter()
+            dialog.tecnico_combo.setCurrentText(tecnico_text)
+            dialog.unidade_combo.setCurrentText(unidade_text)
+            dialog.live_filter.reset()
+            start = time.perf_counter()
+            dialog.apply_filter()
+            self.app.processEvents()
+            times.append(_elapsed_ms(start))
+        dialog.clear_filter()
+        return sum(times) / len(times)
+
+    def ordenacao(self):
+        dialog = self.dialog
+        dialog.sort_columns.clear()
+        dialog.sort_keys.clear()
+        start = time.perf_counter()
+        dialog.handle_header_click(dialog.labels.index('TÉCNICO'))
+        dialog.handle_header_click(dialog.labels.index('DATA/HORA INICIO'))
+        self.app.processEvents()
+        return _elapsed_ms(start)
+
+    def populate_table(self):
+        dialog = self.dialog
+        positions = dialog.filter_index.all_rows()
+        start = time.perf_counter()
+        dialog.populate_table(positions)
+        self.app.processEvents()
+        return _elapsed_ms(start)
+
+    def save_changes(self):
+        import numpy as np
+        dialog = self.dialog
+        model = dialog.table_model
+        column = dialog.labels.index('JUSTIFICATIVA')
+        rng = np.random.default_rng(self.seed)
+        rows = rng.choice(model.rowCount(), min(EDITED_CELLS, model.rowCount()), replace=False)
+        for row in rows:
+            model.setData(model.index(int(row), column), f"Editado {time.time_ns()}")
+        start = time.perf_counter()
+        dialog.save_changes()
+        self.wait_jobs()
+        return _elapsed_ms(start)
+
+    def finalize_schedule(self):
+        import pandas as pd
+        from PyQt5.QtCore import QDate
+        from ProjetoEscalasV2 import ScheduleForm
+        novas = synthetic_frame(FINALIZED_ROWS, self.seed, self.technician_schedules).drop(columns='SEQ')
+        novas['DATA/HORA INICIO'] += pd.Timedelta(days=5000)
+        novas['DATA/HORA FIM'] += pd.Timedelta(days=5000)
+        form = ScheduleForm(self.planilha_path, QDate.currentDate(), QDate.currentDate().addDays(6))
+        form.add_entries(novas)
+        start = time.perf_counter()
+        form.finalize_schedule()
+        self.wait_jobs()
+        elapsed = _elapsed_ms(start)
+        form.close()
+        form.deleteLater()
+        return elapsed
+
+    def emails(self):
+        import pandas as pd
+        import schedule_cache
+        from schedule_mail import build_schedule_mails, periodo_texto
+        df = schedule_cache.load_frame(self.planilha_path)
+        inicio = df['DATA/HORA INICIO'].min().normalize()
+        fim = inicio + pd.Timedelta(days=7)
+        start = time.perf_counter()
+        semana = schedule_cache.query(self.planilha_path, start=inicio, end=fim)
+        # Mesmo caminho da tela e da linha de comando (técnicos + gestores numa rodada)
+        build_schedule_mails(semana, periodo_texto(inicio, fim), 'padrao')
+        return _elapsed_ms(start)
+
+    STEPS = [
+        'leitura_planilha', 'leitura_cache', 'abrir_consulta', 'filtro', 'ordenacao',
+        'populate_table', 'save_changes', 'finalize_schedule', 'emails',
+    ]
+
+
+def _silence_message_boxes():
+    """Responde as caixas de mensagem sem abrir janela (o benchmark não tem quem clique)."""
+    from PyQt5.QtWidgets import QMessageBox
+    for name in ('information', 'warning', 'critical'):
+        setattr(QMessageBox, name, staticmethod(lambda *args, **kwargs: QMessageBox.Ok))
+    QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.No)
+
+
+def run_size(app, size, repeticoes, seed, workdir, technician_schedules):
+    path = os.path.join(workdir, f'escalas_{size}.xlsx')
+    start = time.perf_counter()
+    write_planilha(synthetic_frame(size, seed, technician_schedules), path)
+    generation_ms = _elapsed_ms(start)
+
+    bench = HotPathBench(app, path, technician_schedules, seed)
+    samples = {step: [] for step in HotPathBench.STEPS}
+    for _ in range(repeticoes):
+        for step in HotPathBench.STEPS:
+            samples[step].append(getattr(bench, step)())
+    if bench.dialog is not None:
+        bench.dialog.close()
+    result = {f'{step}_ms': _median(values) for step, values in samples.items()}
+    result['geracao_planilha_ms'] = round(generation_ms, 1)
+    result['tamanho_arquivo_kb'] = round(os.path.getsize(path) / 1024, 1)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=DEFAULT_SIZES, help="linhas de cada planilha")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--saida', help="arquivo JSON de saída (padrão: imprime na tela)")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from PyQt5.QtWidgets import QApplication
+    from schedule_generator import load_technician_schedules
+
+    # Uma QApplication para todos os tamanhos (sem ela o pool de tarefas é destruído)
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    saida = os.path.abspath(args.saida) if args.saida else None
+    _silence_message_boxes()
+
+    # Roda numa pasta temporária: o ScheduleForm lê os JSON do diretório atual
+    # e cria lá a fila de e-mails e os logs, que não devem sujar o repositório
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='bench_escalas_') as workdir:
+        for name in CONFIG_FILES:
+            shutil.copy(os.path.join(ROOT, name), workdir)
+        os.chdir(workdir)
+        try:
+            technician_schedules = load_technician_schedules()
+            resultados = {
+                str(size): run_size(app, size, args.repeticoes, args.seed, workdir, technician_schedules)
+                for size in args.tamanhos
+            }
+        finally:
+            os.chdir(cwd)
+
+    result = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'seed': args.seed,
+        'repeticoes': args.repeticoes,
+        'resultados': resultados,
+    }
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
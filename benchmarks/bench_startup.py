@@ -0,0 +1,118 @@
+"""
+Tempo de inicialização do programa (até a tela inicial aparecer).
+
+Mede, em várias execuções:
+  - importação de ProjetoEscalasV2 (python -X importtime), com os
+    módulos mais caros;
+  - tempo até a primeira pintura do SelectionDialog, pelo próprio
+    programa (variável ESCALAS_STARTUP_PROBE), e o tempo total desde a
+    criação do processo - que, no executável one-file, inclui a extração.
+
+Uso:
+    python benchmarks/bench_startup.py [--runs 5] [--exe dist/ProjetoEscalasV2.exe] [--saida resultado.json]
+
+Sem --exe roda o script com o Python atual. O resultado sai em JSON.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE_ENV = 'ESCALAS_STARTUP_PROBE'
+TIMEOUT_SECONDS = 120
+
+
+def _median(values):
+    return round(statistics.median(values), 1) if values else None
+
+
+def measure_imports(runs, top=10):
+    """Tempo de 'import ProjetoEscalasV2' e os módulos mais caros (cumulativo, ms)."""
+    totals = []
+    per_module = {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ProjetoEscalasV2'],
+            cwd=ROOT, capture_output=True, text=True, timeout=TIMEOUT_SECONDS
+        )
+        for line in proc.stderr.splitlines():
+            # "import time:  self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+            if name == 'ProjetoEscalasV2':
+                totals.append(int(cumulative) / 1000)
+            elif not name.startswith(' ') and '.' not in name:
+                per_module.setdefault(name, []).append(int(cumulative) / 1000)
+    slowest = sorted(((_median(v), k) for k, v in per_module.items()), reverse=True)[:top]
+    return {
+        'import_ms': _median(totals),
+        'slowest_modules_ms': {name: ms for ms, name in slowest},
+    }
+
+
+def measure_first_paint(runs, exe=None, offscreen=False):
+    """Executa o programa com a sonda ligada e coleta os tempos gravados por ele."""
+    command = [exe] if exe else [sys.executable, os.path.join(ROOT, 'ProjetoEscalasV2.py')]
+    env = dict(os.environ)
+    if offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+
+    samples = []
+    for _ in range(runs):
+        fd, probe_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(probe_path)
+        env[PROBE_ENV] = probe_path
+        started = time.time()
+        subprocess.run(command, cwd=ROOT, env=env, timeout=TIMEOUT_SECONDS,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not os.path.exists(probe_path):
+            raise RuntimeError("O programa terminou sem gravar a medição (a tela inicial não abriu?).")
+        with open(probe_path, encoding='utf-8') as f:
+            sample = json.load(f)
+        os.remove(probe_path)
+        sample['process_to_paint_ms'] = round((sample['first_paint_epoch'] - started) * 1000, 1)
+        samples.append(sample)
+
+    heavy = sorted({name for sample in samples for name in sample['heavy_modules_loaded']})
+    return {
+        'command': command,
+        'imports_ms': _median([s['imports_ms'] for s in samples]),
+        'qapplication_ms': _median([s['qapplication_ms'] for s in samples]),
+        'first_paint_ms': _median([s['first_paint_ms'] for s in samples]),
+        'process_to_paint_ms': _median([s['process_to_paint_ms'] for s in samples]),
+        'heavy_modules_loaded': heavy,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--exe', help="executável gerado pelo PyInstaller (padrão: script com o Python atual)")
+    parser.add_argument('--saida', help="arquivo JSON de saída (padrão: imprime na tela)")
+    parser.add_argument('--offscreen', action='store_true', default=os.name != 'nt',
+                        help="usa QT_QPA_PLATFORM=offscreen (padrão fora do Windows)")
+    args = parser.parse_args(argv)
+
+    result = {'runs': args.runs, 'python': sys.version.split()[0]}
+    if not args.exe:
+        result['imports'] = measure_imports(args.runs)
+    result['startup'] = measure_first_paint(args.runs, args.exe, args.offscreen)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+    # Falha (código 1) se algum módulo pesado voltou para a inicialização
+    return 1 if result['startup']['heavy_modules_loaded'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
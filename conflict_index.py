@@ -0,0 +1,159 @@
+"""
+Conflitos de horário entre escalas do mesmo técnico.
+
+Duas escalas do mesmo TÉCNICO conflitam quando os períodos
+DATA/HORA INICIO–FIM se sobrepõem (encostar não conta) e:
+  - as duas são de trabalho (Unidade, Escritório, Home, ...), ou
+  - uma é Folga/Férias e a outra não é (inclusive Sobreaviso).
+Sobreaviso junto com trabalho e Folga junto com Férias são permitidos.
+
+ConflictIndex guarda, por técnico, os intervalos ordenados pelo início
+e o maior fim acumulado; check() acha os intervalos que cruzam um
+período por busca binária. find_conflicts() varre o DataFrame inteiro
+uma vez (por técnico, em ordem de início) e devolve todos os pares.
+Um lote de escalas novas é checado com find_conflicts (entre si) e
+check_frame (contra o índice das já existentes) antes de ser incluído.
+"""
+import heapq
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from planilha_io import date_values
+
+ABSENCES = ('Folga', 'Férias')
+ON_CALL = 'Sobreaviso'
+
+# Posições (no DataFrame de origem) das duas escalas e o motivo
+Conflict = namedtuple('Conflict', ['position', 'other', 'motivo'])
+
+
+def conflict_reason(localizacao_a, localizacao_b):
+    """Motivo do conflito entre duas escalas sobrepostas, ou None se é permitido."""
+    a_absent = localizacao_a in ABSENCES
+    b_absent = localizacao_b in ABSENCES
+    if a_absent and b_absent:
+        return None
+    if a_absent or b_absent:
+        absence, other = (localizacao_a, localizacao_b) if a_absent else (localizacao_b, localizacao_a)
+        return f"{other or 'Escala'} durante {absence}"
+    if (localizacao_a == ON_CALL) != (localizacao_b == ON_CALL):
+        return None
+    return "Horários sobrepostos"
+
+
+def _intervals(df):
+    """(técnico, localização, início, fim) como arrays; fim antes do início vira período vazio."""
+    starts = date_values(df, 'DATA/HORA INICIO')
+    ends = date_values(df, 'DATA/HORA FIM')
+    valid = ~(np.isnat(starts) | np.isnat(ends))
+    starts = starts.astype(np.int64)
+    ends = np.maximum(ends.astype(np.int64), starts)
+    tecnicos = df['TÉCNICO'].fillna('').astype(str).to_numpy(dtype=object)
+    localizacoes = df['LOCALIZAÇÃO'].fillna('').astype(str).to_numpy(dtype=object)
+    return tecnicos, localizacoes, starts, ends, valid
+
+
+def _timestamp(value):
+    return pd.Timestamp(value).to_datetime64().astype('datetime64[ns]').astype(np.int64)
+
+
+class ConflictIndex:
+    """Intervalos de cada técnico, ordenados pelo início, para consultas por período."""
+
+    def __init__(self, df):
+        tecnicos, self._localizacoes, starts, ends, valid = _intervals(df)
+        self._groups = {}
+        positions = np.flatnonzero(valid)
+        if not len(positions):
+            return
+        codes, _ = pd.factorize(tecnicos[positions])
+        by_start = np.lexsort((starts[positions], codes))
+        order = positions[by_start]
+        bounds = np.flatnonzero(np.diff(codes[by_start])) + 1
+        for group in np.split(order, bounds):
+            group_starts = starts[group]
+            group_ends = ends[group]
+            # Maior fim até cada posição: cresce junto com a ordem, então
+            # também aceita busca binária
+            self._groups[tecnicos[group[0]]] = (group, group_starts, np.maximum.accumulate(group_ends), group_ends)
+
+    def overlapping(self, tecnico, start, end):
+        """Posições das escalas do técnico que cruzam [start, end) (início < end e fim > start)."""
+        entry = self._groups.get(tecnico)
+        if entry is None:
+            return np.empty(0, dtype=np.intp)
+        positions, starts, max_ends, ends = entry
+        start, end = _timestamp(start), _timestamp(end)
+        hi = np.searchsorted(starts, end, 'left')
+        lo = np.searchsorted(max_ends[:hi], start, 'right')
+        candidates = slice(lo, hi)
+        hits = ends[candidates] > start
+        if end == start:
+            # Período vazio só conflita com quem o contém
+            hits &= starts[candidates] < start
+        return positions[candidates][hits]
+
+    def check(self, tecnico, localizacao, start, end, ignore=()):
+        """Conflitos de uma escala nova (ou editada) com as do índice: [(posição, motivo)]."""
+        found = []
+        for position in self.overlapping(tecnico, start, end).tolist():
+            if position in ignore:
+                continue
+            motivo = conflict_reason(localizacao, self._localizacoes[position])
+            if motivo:
+                found.append((position, motivo))
+        return found
+
+
+def find_conflicts(df):
+    """
+    Todos os pares conflitantes de `df`, numa varredura: por técnico, em
+    ordem de início, mantendo os intervalos ainda abertos num heap pelo fim.
+    """
+    tecnicos, localizacoes, starts, ends, valid = _intervals(df)
+    positions = np.flatnonzero(valid)
+    if not len(positions):
+        return []
+    codes, _ = pd.factorize(tecnicos[positions])
+    order = positions[np.lexsort((starts[positions], codes))]
+
+    conflicts = []
+    active = []
+    current = None
+    for position in order.tolist():
+        tecnico = tecnicos[position]
+        start = starts[position]
+        if tecnico != current:
+            current, active = tecnico, []
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, other in active:
+            motivo = conflict_reason(localizacoes[other], localizacoes[position])
+            if motivo:
+                conflicts.append(Conflict(other, position, motivo))
+        heapq.heappush(active, (ends[position], position))
+    return conflicts
+
+
+def check_frame(index, df):
+    """
+    Conflitos de cada escala de `df` (um lote novo) com as do `index`:
+    [Conflict(posição em df, posição no índice, motivo)].
+    """
+    tecnicos, localizacoes, starts, ends, valid = _intervals(df)
+    conflicts = []
+    for position in np.flatnonzero(valid).tolist():
+        start, end = np.datetime64(int(starts[position]), 'ns'), np.datetime64(int(ends[position]), 'ns')
+        for other, motivo in index.check(tecnicos[position], localizacoes[position], start, end):
+            conflicts.append(Conflict(position, other, motivo))
+    return conflicts
+
+
+def describe_entry(localizacao, unidade, inicio, fim):
+    """Texto curto de uma escala para as mensagens de conflito."""
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    local = ' - '.join(part for part in (localizacao, unidade) if isinstance(part, str) and part) or 'Escala'
+    fim_texto = fim.strftime('%H:%M') if fim.date() == inicio.date() else fim.strftime('%d/%m/%Y %H:%M')
+    return f"{local} em {inicio.strftime('%d/%m/%Y %H:%M')} até {fim_texto}"
@@ -0,0 +1,253 @@
+"""
+Medição de tempo das etapas pesadas (leitura da planilha, conversão de
+datas, montagem da tabela, gravação e envio de e-mails).
+
+Uso:
+    with span('leitura_planilha', planilha=path) as s:
+        ...
+        s.set(rows=len(df))
+
+Cada etapa vai para o log rotativo (diagnostico.log, na pasta de logs)
+com a duração, o número de linhas e os bytes gravados, e fica num resumo
+em memória que a tela de diagnóstico (F12) mostra.
+
+Os logs do programa ficam na pasta `logs` (ou em ESCALAS_LOG_DIR); os
+outros módulos gravam lá via log_path().
+
+Perfil opcional (ESCALAS_PROFILE=cprofile ou pyinstrument, ou ligado na
+tela de diagnóstico): a etapa mais externa de cada thread é perfilada e o
+resultado vai para a pasta `perfis` (.prof para o cProfile, que abre no
+snakeviz/pstats; .html para o pyinstrument). Só uma etapa é perfilada por
+vez; as demais, enquanto isso, são só cronometradas.
+"""
+import os
+import time
+import logging
+import threading
+import collections
+from logging.handlers import RotatingFileHandler
+
+LOG_FILE = "diagnostico.log"
+LOG_DIR = 'logs'
+LOG_DIR_ENV = 'ESCALAS_LOG_DIR'
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+PROFILE_ENV = 'ESCALAS_PROFILE'
+PROFILE_DIR = 'perfis'
+PROFILE_MODES = ('cprofile', 'pyinstrument')
+RECENT_SPANS = 200
+
+logger = logging.getLogger("diagnostico")
+
+_lock = threading.Lock()
+_local = threading.local()
+_profile_lock = threading.Lock()
+_recent = collections.deque(maxlen=RECENT_SPANS)
+_totals = {}
+_profile_mode = None
+
+
+def log_path(name=LOG_FILE):
+    """Caminho do arquivo de log `name` na pasta de logs (criada se preciso)."""
+    folder = os.environ.get(LOG_DIR_ENV) or LOG_DIR
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+
+def _setup_logger():
+    # O arquivo só é criado na primeira etapa medida (não na abertura do programa)
+    if logger.handlers:
+        return
+    handler = RotatingFileHandler(log_path(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# --------------------------------------------------
+#                  PERFIL
+# --------------------------------------------------
+def profiling_mode():
+    """'cprofile', 'pyinstrument' ou None (desligado)."""
+    return _profile_mode
+
+
+def set_profiling(mode):
+    """Liga ('cprofile' / 'pyinstrument') ou desliga (None) o perfil das etapas."""
+    global _profile_mode
+    if mode in ('1', 'on', 'sim'):
+        mode = 'cprofile'
+    if mode is not None and mode not in PROFILE_MODES:
+        raise ValueError(f"Perfil desconhecido: {mode} (use {', '.join(PROFILE_MODES)}).")
+    _profile_mode = mode
+
+
+def _mode_from_env():
+    # Qualquer valor diferente de cprofile/pyinstrument (ex.: 1) liga o cProfile
+    value = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if not value or value in ('0', 'off', 'nao', 'não'):
+        return None
+    return value if value in PROFILE_MODES else 'cprofile'
+
+
+_profile_mode = _mode_from_env()
+
+
+class _Profiler:
+    """cProfile ou pyinstrument em volta de uma etapa; grava o resultado em PROFILE_DIR."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        if mode == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument não está instalado; usando cProfile.")
+                self.mode = 'cprofile'
+            else:
+                self.profiler = Profiler()
+        if self.mode == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self, name):
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+            path = os.path.join(PROFILE_DIR, f"{name}_{stamp}.prof")
+            self.profiler.dump_stats(path)
+        else:
+            self.profiler.stop()
+            path = os.path.join(PROFILE_DIR, f"{name}_{stamp}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+        return path
+
+
+def _start_profiler():
+    """Perfilador já iniciado, ou None se o perfil está desligado ou já há outro rodando."""
+    mode = _profile_mode
+    if mode is None or not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = _Profiler(mode)
+        profiler.start()
+    except Exception as e:
+        # Outro perfilador ativo no processo (ex.: depurador), etc.
+        _profile_lock.release()
+        logger.warning(f"Perfil não iniciado: {e}")
+        return None
+    return profiler
+
+
+# --------------------------------------------------
+#                  ETAPAS
+# --------------------------------------------------
+SpanRecord = collections.namedtuple('SpanRecord', ['name', 'inicio', 'ms', 'rows', 'bytes', 'thread', 'erro'])
+
+
+class Span:
+    """Uma etapa em andamento; `set(rows=..., bytes=...)` completa os números."""
+    __slots__ = ('name', 'fields', 'started', 'ms', '_profiler')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.started = None
+        self.ms = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        _setup_logger()
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        self._profiler = _start_profiler() if depth == 0 else None
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ms = (time.perf_counter() - self.started) * 1000
+        _local.depth -= 1
+        profile_path = None
+        if self._profiler is not None:
+            try:
+                profile_path = self._profiler.stop(self.name)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar o perfil de {self.name}: {e}")
+            finally:
+                _profile_lock.release()
+        _record(self, exc, profile_path)
+        return False
+
+
+def span(name, **fields):
+    """Context manager que mede a etapa `name` (ver o docstring do módulo)."""
+    return Span(name, dict(fields))
+
+
+def _record(s, exc, profile_path):
+    fields = dict(s.fields)
+    rows = fields.pop('rows', None)
+    written = fields.pop('bytes', None)
+    erro = f"{type(exc).__name__}: {exc}" if exc is not None else None
+    record = SpanRecord(
+        s.name, time.strftime('%H:%M:%S'), s.ms, rows, written, threading.current_thread().name, erro
+    )
+    with _lock:
+        _recent.append(record)
+        total = _totals.setdefault(s.name, [0, 0.0, 0.0, 0, 0])
+        total[0] += 1
+        total[1] += s.ms
+        total[2] = max(total[2], s.ms)
+        total[3] += rows or 0
+        total[4] += written or 0
+
+    parts = [f"{s.name} {s.ms:.1f} ms"]
+    if rows is not None:
+        parts.append(f"linhas={rows}")
+    if written is not None:
+        parts.append(f"bytes={written}")
+    parts.extend(f"{key}={value}" for key, value in fields.items())
+    if profile_path:
+        parts.append(f"perfil={profile_path}")
+    if erro:
+        parts.append(f"erro={erro}")
+        logger.warning(' '.join(parts))
+    else:
+        logger.info(' '.join(parts))
+
+
+# --------------------------------------------------
+#                  RESUMO
+# --------------------------------------------------
+def recent_spans():
+    """Últimas etapas medidas (SpanRecord), da mais antiga para a mais nova."""
+    with _lock:
+        return list(_recent)
+
+
+def summary():
+    """[(etapa, vezes, total ms, média ms, máximo ms, linhas, bytes)], da mais demorada para a mais rápida."""
+    with _lock:
+        items = [(name, *values) for name, values in _totals.items()]
+    return sorted(
+        ((name, count, total, total / count, longest, rows, written)
+         for name, count, total, longest, rows, written in items),
+        key=lambda item: item[2], reverse=True
+    )
+
+
+def reset():
+    with _lock:
+        _recent.clear()
+        _totals.clear()
@@ -0,0 +1,307 @@
+"""
+Envio dos e-mails de escala com transporte plugável.
+
+Transportes disponíveis:
+    outlook  - Outlook via COM (padrão no Windows)
+    smtp     - servidor SMTP (ESCALAS_SMTP_*)
+    file     - grava cada mensagem como .eml numa pasta (testes/Linux)
+
+O MailDispatcher abre o transporte uma vez, carrega a assinatura uma vez
+e envia as mensagens em lotes (cada lote em uma thread), com concorrência
+limitada pelo transporte. Cada transporte implementa open/send/close.
+"""
+import os
+import logging
+import datetime
+import functools
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from diagnostics import log_path
+
+SIGNATURE_CID = "MinhaImagem"
+DEFAULT_SIGNATURE_PATH = r"C:\Users\LIBERTY\Documents\escalas versao\Escalas\assinatura_vinicius.png.png"
+LOCAL_SIGNATURE_PATH = "assinatura_vinicius.png.png"
+DEFAULT_MAIL_DIR = "emails_enviados"
+LOG_FILE = "email_sender.log"
+
+logger = logging.getLogger("email_sender")
+
+
+def _setup_logger():
+    # Configurado pelo MailDispatcher (não na importação): só quem envia grava o log
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(log_path(LOG_FILE), encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+class OutgoingMail:
+    """
+    Uma mensagem a enviar (HTML com alternativa em texto opcional).
+    `period` identifica a escala (ex.: '03/03/2025-09/03/2025') para a fila
+    de envio não repetir a mesma mensagem.
+    """
+    __slots__ = ("to", "subject", "html_body", "text_body", "send_time", "period")
+
+    def __init__(self, to, subject, html_body, text_body=None, send_time=None, period=None):
+        self.to = to
+        self.subject = subject
+        self.html_body = html_body
+        self.text_body = text_body
+        self.send_time = send_time
+        self.period = period
+
+    def is_deferred(self):
+        return self.send_time is not None and self.send_time > datetime.datetime.now()
+
+
+def _log_dispatch(mail):
+    if mail.is_deferred():
+        logger.info(f"Agendando e-mail para {mail.to} em {mail.send_time}")
+    else:
+        logger.info(f"Enviando e-mail imediatamente para {mail.to}")
+
+
+# --------------------------------------------------
+#                  TRANSPORTES
+# --------------------------------------------------
+class OutlookTransport:
+    """Outlook via COM. Uma sessão por envio; um único SendAndReceive no final."""
+    max_workers = 1  # objetos COM do Outlook não são compartilháveis entre threads
+    supports_deferred = True
+
+    def __init__(self, signature_path=DEFAULT_SIGNATURE_PATH):
+        self.signature_path = signature_path if signature_path and os.path.exists(signature_path) else None
+        self.outlook = None
+        self._com_initialized = False
+
+    def open(self):
+        import win32com.client  # Para interação com Outlook
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()
+            self._com_initialized = True
+        except ImportError:
+            pass
+        self.outlook = win32com.client.Dispatch('outlook.application')
+
+    def send(self, mail):
+        item = self.outlook.CreateItem(0)
+        item.To = mail.to
+        item.Subject = mail.subject
+        item.HTMLBody = mail.html_body
+        if self.signature_path:
+            attachment = item.Attachments.Add(self.signature_path)
+            attachment.PropertyAccessor.SetProperty(
+                "http://schemas.microsoft.com/mapi/proptag/0x3712001F",
+                SIGNATURE_CID
+            )
+        if mail.is_deferred():
+            item.DeferredDeliveryTime = mail.send_time
+        item.Send()
+
+    def close(self):
+        if self.outlook is not None:
+            self.outlook.GetNamespace("MAPI").SendAndReceive(False)
+            self.outlook = None
+        if self._com_initialized:
+            import pythoncom
+            pythoncom.CoUninitialize()
+            self._com_initialized = False
+
+
+def _build_mime(mail, sender, signature_bytes):
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = mail.to
+    message["Subject"] = mail.subject
+    if mail.is_deferred():
+        message["X-Deferred-Delivery"] = mail.send_time.strftime("%d/%m/%Y %H:%M:%S")
+    message.set_content(mail.text_body or "")
+    message.add_alternative(mail.html_body, subtype="html")
+    if signature_bytes:
+        message.get_payload()[1].add_related(
+            signature_bytes, maintype="image", subtype="png", cid=f"<{SIGNATURE_CID}>"
+        )
+    return message
+
+
+def _read_signature(signature_path):
+    if signature_path and os.path.exists(signature_path):
+        with open(signature_path, "rb") as f:
+            return f.read()
+    return None
+
+
+class SmtpTransport:
+    """SMTP com uma conexão reaproveitada por thread de envio."""
+    supports_deferred = False
+
+    def __init__(self, host, port=587, user=None, password=None, sender=None,
+                 use_tls=True, max_workers=4, signature_path=DEFAULT_SIGNATURE_PATH):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender or user
+        self.use_tls = use_tls
+        self.max_workers = max_workers
+        self.signature_bytes = _read_signature(signature_path)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def open(self):
+        pass
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.use_tls:
+                conn.starttls()
+            if self.user:
+                conn.login(self.user, self.password)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def send(self, mail):
+        self._connection().send_message(_build_mime(mail, self.sender, self.signature_bytes))
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.quit()
+                except smtplib.SMTPException:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class FileTransport:
+    """Grava cada mensagem como .eml (para testar o envio sem Outlook/SMTP)."""
+    max_workers = 4
+    supports_deferred = True
+
+    def __init__(self, directory=DEFAULT_MAIL_DIR, sender="escalas@localhost",
+                 signature_path=DEFAULT_SIGNATURE_PATH):
+        self.directory = directory
+        self.sender = sender
+        self.signature_bytes = _read_signature(signature_path)
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def send(self, mail):
+        with self._counter_lock:
+            self._counter += 1
+            number = self._counter
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_to = "".join(c if c.isalnum() or c in "@._-" else "_" for c in mail.to)
+        path = os.path.join(self.directory, f"{stamp}_{number:04d}_{safe_to}.eml")
+        with open(path, "wb") as f:
+            f.write(bytes(_build_mime(mail, self.sender, self.signature_bytes)))
+
+    def close(self):
+        pass
+
+
+def transport_from_env():
+    """
+    Escolhe o transporte pela variável ESCALAS_MAIL_TRANSPORT
+    (outlook | smtp | file); o padrão é outlook no Windows e file nos demais.
+    """
+    signature_path = os.environ.get("ESCALAS_SIGNATURE")
+    if not signature_path:
+        signature_path = DEFAULT_SIGNATURE_PATH if os.path.exists(DEFAULT_SIGNATURE_PATH) else LOCAL_SIGNATURE_PATH
+    default = "outlook" if os.name == "nt" else "file"
+    kind = os.environ.get("ESCALAS_MAIL_TRANSPORT", default).strip().lower()
+    if kind == "smtp":
+        return SmtpTransport(
+            host=os.environ.get("ESCALAS_SMTP_HOST", "localhost"),
+            port=int(os.environ.get("ESCALAS_SMTP_PORT", "587")),
+            user=os.environ.get("ESCALAS_SMTP_USER"),
+            password=os.environ.get("ESCALAS_SMTP_PASSWORD"),
+            sender=os.environ.get("ESCALAS_SMTP_FROM"),
+            use_tls=os.environ.get("ESCALAS_SMTP_TLS", "1") != "0",
+            max_workers=int(os.environ.get("ESCALAS_SMTP_WORKERS", "4")),
+            signature_path=signature_path,
+        )
+    if kind == "file":
+        return FileTransport(
+            directory=os.environ.get("ESCALAS_MAIL_DIR", DEFAULT_MAIL_DIR),
+            signature_path=signature_path,
+        )
+    return OutlookTransport(signature_path=signature_path)
+
+
+# --------------------------------------------------
+#                  DESPACHANTE
+# --------------------------------------------------
+class MailDispatcher:
+    """Envia listas de OutgoingMail em lotes pelo transporte informado."""
+
+    def __init__(self, transport=None, batch_size=20):
+        _setup_logger()
+        self.transport = transport or transport_from_env()
+        self.batch_size = batch_size
+
+    def _send_batch(self, batch, on_result=None):
+        """Envia um lote; o erro de uma mensagem não interrompe as demais."""
+        results = []
+        for mail in batch:
+            _log_dispatch(mail)
+            try:
+                self.transport.send(mail)
+            except Exception as e:
+                logger.error(f"Falha ao enviar e-mail para {mail.to}: {e}")
+                error = str(e)
+            else:
+                logger.info(f"E-mail enviado para {mail.to}")
+                error = None
+            results.append((mail, error))
+            if on_result:
+                on_result(mail, error)
+        return results
+
+    def send_all(self, mails, progress=None, on_result=None):
+        """
+        Envia todas as mensagens. Retorna [(mail, erro ou None)], na ordem.
+        `progress(enviados, total)` é chamado após cada lote.
+        `on_result(mail, erro ou None)` é chamado logo após cada mensagem
+        (na thread do lote), antes do close() do transporte: quem registra o
+        resultado por ali não o perde se o close() falhar.
+        """
+        mails = list(mails)
+        if not mails:
+            return []
+        batches = [mails[i:i + self.batch_size] for i in range(0, len(mails), self.batch_size)]
+        results = []
+        self.transport.open()
+        try:
+            workers = max(1, min(getattr(self.transport, "max_workers", 1), len(batches)))
+            if workers == 1:
+                for batch in batches:
+                    results.extend(self._send_batch(batch, on_result))
+                    if progress:
+                        progress(len(results), len(mails))
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    send_batch = functools.partial(self._send_batch, on_result=on_result)
+                    for batch_results in executor.map(send_batch, batches):
+                        results.extend(batch_results)
+                        if progress:
+                            progress(len(results), len(mails))
+        finally:
+            self.transport.close()
+        return results
@@ -0,0 +1,147 @@
+"""
+Modelos dos e-mails de escala (HTML + texto simples).
+
+Os modelos são montados uma vez na importação do módulo; cada render
+só junta strings. As linhas da tabela de escala são geradas a partir das
+colunas do DataFrame (já convertidas e escapadas de forma vetorizada),
+sem iterrows e sem concatenação repetida de strings.
+"""
+import html
+
+import pandas as pd
+
+# Colunas da tabela enviada ao técnico (DATA vem de DATA/HORA INICIO)
+TABELA_COLUNAS = ['DIA DA SEMANA', 'DATA', 'UNIDADE', 'LOCALIZAÇÃO', 'JUSTIFICATIVA', 'CARD']
+
+_TABELA_HTML_INICIO = """        <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse;">
+            <tr>""" + "".join(f"<th>{col}</th>" for col in TABELA_COLUNAS) + """</tr>
+"""
+_TABELA_HTML_LINHA = "            <tr>" + "<td>%s</td>" * len(TABELA_COLUNAS) + "</tr>\n"
+_TABELA_HTML_FIM = "        </table>\n"
+
+_TECNICO_HTML_INICIO = """
+<html>
+    <body>
+        <p>Prezado(a) <b>%(tecnico)s</b>,</p>
+        <p>Segue sua escala:</p>
+""" + _TABELA_HTML_INICIO
+_TECNICO_HTML_FIM = _TABELA_HTML_FIM + """        <br>
+        <img src="cid:MinhaImagem" alt="Assinatura" />
+    </body>
+</html>
+"""
+_TECNICO_TEXTO_INICIO = "Prezado(a) %(tecnico)s,\n\nSegue sua escala:\n\n" + " | ".join(TABELA_COLUNAS) + "\n"
+_TECNICO_TEXTO_LINHA = " | ".join(["%s"] * len(TABELA_COLUNAS)) + "\n"
+
+# Modelos do aviso de visita ao gestor da unidade.
+# 'padrao' é usado na tela de consulta; 'sghx' na tela de inclusão.
+GESTOR_MODELOS = {
+    'padrao': {
+        'assunto': "Visita de Técnico - %(data)s",
+        'hora_envio': 7,
+        'html': """
+<html>
+    <body>
+        <p>Prezado(a) Gestor(a),<br><br>
+        Informamos que o(s) técnico(s) <b>%(tecnicos)s</b> estará(ão) presente(s) na unidade <b>%(unidade)s</b>
+        no dia %(data)s às %(horario)s.<br>
+        <br>
+        Atenciosamente,<br>Sua Equipe
+        <br><br>
+        <img src="cid:MinhaImagem" alt="Assinatura" />
+    </body>
+</html>
+""",
+        'texto': (
+            "Prezado(a) Gestor(a),\n\n"
+            "Informamos que o(s) técnico(s) %(tecnicos)s estará(ão) presente(s) na unidade %(unidade)s "
+            "no dia %(data)s às %(horario)s.\n\n"
+            "Atenciosamente,\nSua Equipe\n"
+        ),
+    },
+    'sghx': {
+        'assunto': "Visita Técnica - %(data)s",
+        'hora_envio': 4,
+        'html': """
+<html>
+    <body>
+        <p>Prezado(a) Gestor(a)/PTA,<br><br>
+        Hoje foi agendada a visita do técnico <b>%(tecnicos)s</b> da Liberty Health
+        para <b>apoio e acompanhamento na utilização do SGHX</b>
+        na unidade <b>%(unidade)s</b> a partir das %(horario)s
+        do dia %(data)s.<br><br>
+        <br><br>
+        <img src="cid:MinhaImagem" alt="Assinatura" />
+        </p>
+    </body>
+</html>
+""",
+        'texto': (
+            "Prezado(a) Gestor(a)/PTA,\n\n"
+            "Hoje foi agendada a visita do técnico %(tecnicos)s da Liberty Health "
+            "para apoio e acompanhamento na utilização do SGHX "
+            "na unidade %(unidade)s a partir das %(horario)s do dia %(data)s.\n"
+        ),
+    },
+}
+
+
+def _text_column(series):
+    """Coluna como lista de textos ('' para vazios)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        texts = series.dt.strftime('%d/%m/%Y')
+    else:
+        texts = series.astype(object).map(str)
+    return texts.where(series.notna(), '').tolist()
+
+
+def _table_columns(group):
+    columns = []
+    for col in TABELA_COLUNAS:
+        if col == 'DATA':
+            columns.append(_text_column(group['DATA/HORA INICIO']))
+        elif col in group.columns:
+            columns.append(_text_column(group[col]))
+        else:
+            columns.append([''] * len(group))
+    return columns
+
+
+def _html_rows(columns):
+    escaped_rows = zip(*[[html.escape(value) for value in col] for col in columns])
+    return "".join([_TABELA_HTML_LINHA % row for row in escaped_rows])
+
+
+def render_tabela_html(group):
+    """Só a tabela HTML da escala (relatórios exportados por report_pipeline)."""
+    return _TABELA_HTML_INICIO + _html_rows(_table_columns(group)) + _TABELA_HTML_FIM
+
+
+def render_escala_tecnico(tecnico, group):
+    """Retorna (html, texto) da escala de um técnico; `group` são as linhas dele."""
+    columns = _table_columns(group)
+    rows = list(zip(*columns))
+
+    html_body = "".join([
+        _TECNICO_HTML_INICIO % {'tecnico': html.escape(str(tecnico))},
+        _html_rows(columns),
+        _TECNICO_HTML_FIM,
+    ])
+    text_body = "".join([
+        _TECNICO_TEXTO_INICIO % {'tecnico': tecnico},
+        "".join([_TECNICO_TEXTO_LINHA % row for row in rows]),
+    ])
+    return html_body, text_body
+
+
+def render_visita_gestor(modelo, tecnicos, unidade, data_visita, horario):
+    """Retorna (assunto, html, texto) do aviso de visita para o gestor."""
+    template = GESTOR_MODELOS[modelo]
+    data = data_visita.strftime('%d/%m/%Y')
+    values = {'tecnicos': ', '.join(tecnicos), 'unidade': unidade, 'data': data, 'horario': horario}
+    escaped = {key: html.escape(str(value)) for key, value in values.items()}
+    return (
+        template['assunto'] % {'data': data},
+        template['html'] % escaped,
+        template['texto'] % values,
+    )
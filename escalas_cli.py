@@ -0,0 +1,369 @@
+"""
+Linha de comando das escalas (sem PyQt e sem cliques).
+
+    python escalas_cli.py generate --planilha P.xlsx --inicio 03/03/2025 --fim 09/03/2025 \
+        [--tecnico "Nome" --tecnico "Nome 12x36=pares"] [--localizacao X] [--unidade Y] [--gravar [--ignorar-conflitos]]
+    python escalas_cli.py optimize --inicio D --fim D [--tecnico ...] [--demandas demandas_unidades.json]
+        [--gravar [--ignorar-conflitos]]
+    python escalas_cli.py query  --planilha P.xlsx [--inicio D] [--fim D] [--tecnico T] [--unidade U] [--saida arq.csv]
+    python escalas_cli.py export --planilha P.xlsx --saida copia.xlsx [filtros como em query]
+    python escalas_cli.py export --planilha P.xlsx --por unidade|tecnico --saida pasta [filtros]
+    python escalas_cli.py report --planilha P.xlsx --pasta relatorios [--formatos html,xlsx,pdf] [--processos N] [filtros]
+    (query/export/report aceitam --somente-leitura para planilhas de histórico sem o banco)
+    python escalas_cli.py send   --planilha P.xlsx --inicio D --fim D [--tecnico T] [--gestores padrao|sghx]
+    python escalas_cli.py send   --somente-fila
+
+Usa as mesmas regras de escala (schedule_generator), o mesmo banco
+(schedule_store) e a mesma fila de e-mails (mail_queue) das telas, então
+pode rodar pelo cron / Agendador de Tarefas. Datas em dd/mm/aaaa.
+"""
+import sys
+import csv
+import argparse
+import datetime
+
+from planilha_io import (
+    LABELS, frame_to_display_rows, frame_to_workbook_rows, iter_schedule_rows, read_schedule_frame,
+    write_schedule_workbook, write_split_workbooks
+)
+from schedule_store import COLUMNS, open_store
+from schedule_generator import TECHNICIAN_SCHEDULES_PATH, generate_schedule, load_technician_schedules
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+# export --por: coluna que separa as planilhas
+SPLIT_COLUMNS = {'tecnico': 'TÉCNICO', 'unidade': 'UNIDADE'}
+
+
+def parse_date(text):
+    try:
+        return datetime.datetime.strptime(text, '%d/%m/%Y').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: {text!r} (use dd/mm/aaaa)")
+
+
+def _period_bounds(args):
+    start = datetime.datetime.combine(args.inicio, datetime.time(0, 0)) if args.inicio else None
+    end = datetime.datetime.combine(args.fim, datetime.time(23, 59, 59)) if args.fim else None
+    return start, end
+
+
+def _query(args):
+    start, end = _period_bounds(args)
+    if getattr(args, 'somente_leitura', False):
+        return _read_planilha(args, start, end)
+    return open_store(args.planilha).query(
+        start=start, end=end, tecnico_contains=args.tecnico, unidade_contains=args.unidade
+    )
+
+
+def _read_planilha(args, start, end):
+    """
+    Lê direto da planilha, em partes, sem criar nem atualizar o banco ao
+    lado dela (planilhas de histórico só para consulta). O período é
+    filtrado durante a leitura; técnico/unidade, nas linhas que sobraram.
+    """
+    df = read_schedule_frame(args.planilha, start=start, end=end)
+    for column, text in (('TÉCNICO', args.tecnico), ('UNIDADE', args.unidade)):
+        if text:
+            values = df[column].fillna('').astype(str).str.casefold()
+            df = df[values.str.contains(text.casefold(), regex=False).to_numpy()]
+    return df.reset_index(drop=True)
+
+
+def _planilha_rows(args):
+    """
+    Como _read_planilha, mas linha a linha (['SEQ'] + LABELS), sem montar
+    DataFrame: as linhas vão direto para quem grava.
+    """
+    start, end = _period_bounds(args)
+    filters = [
+        (COLUMNS.index(column), text.casefold())
+        for column, text in (('TÉCNICO', args.tecnico), ('UNIDADE', args.unidade)) if text
+    ]
+    for chunk in iter_schedule_rows(args.planilha, start=start, end=end):
+        for record in chunk:
+            if all(text in str(record[pos] or '').casefold() for pos, text in filters):
+                yield record
+
+
+def _write_frame(df, saida, columns):
+    """Grava em .xlsx/.csv, ou imprime separado por tabulação se `saida` for None."""
+    if saida and saida.lower().endswith('.xlsx'):
+        write_schedule_workbook(saida, columns, frame_to_workbook_rows(df, columns))
+        return
+    rows = frame_to_display_rows(df, columns)
+    if saida:
+        with open(saida, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(columns)
+            writer.writerows(rows)
+    else:
+        writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def _selected_tecnicos(args, technician_schedules):
+    """
+    --tecnico "Nome" ou "Nome=pares|impares" (12X36). Sem --tecnico,
+    todos os técnicos 5X2 do escalas_tecnicos.json.
+    """
+    if not args.tecnico:
+        return {nome: None for nome, info in technician_schedules.items() if info.get('escala') == '5X2'}
+    selected = {}
+    for item in args.tecnico:
+        nome, _, dias = item.partition('=')
+        nome = nome.strip()
+        if nome not in technician_schedules:
+            raise SystemExit(f"Técnico não encontrado em {args.tecnicos_json}: {nome}")
+        if technician_schedules[nome].get('escala') == '12X36' and dias not in ('pares', 'impares'):
+            raise SystemExit(f"Informe os dias do técnico 12X36: --tecnico \"{nome}=pares\" ou \"{nome}=impares\"")
+        selected[nome] = dias or None
+    return selected
+
+
+def _conflicts(store, df):
+    """
+    Conflitos (conflict_index) das linhas novas com as já gravadas dos
+    mesmos técnicos (até o fim do lote) e entre elas, como textos.
+    """
+    from conflict_index import ConflictIndex, check_frame, describe_entry, find_conflicts
+
+    def describe(entry):
+        return describe_entry(
+            entry['LOCALIZAÇÃO'], entry['UNIDADE'], entry['DATA/HORA INICIO'], entry['DATA/HORA FIM']
+        )
+
+    if df.empty:
+        return []
+    existing = store.query(
+        end=df['DATA/HORA FIM'].max().to_pydatetime(), tecnicos=df['TÉCNICO'].dropna().unique().tolist()
+    )
+    found = [(position, f"SEQ {existing.iloc[other]['SEQ']}: {describe(existing.iloc[other])}", motivo)
+             for position, other, motivo in check_frame(ConflictIndex(existing), df)]
+    found += [(position, f"nova: {describe(df.iloc[other])}", motivo)
+              for position, other, motivo in find_conflicts(df)]
+    return [f"{df.iloc[position]['TÉCNICO']}: {describe(df.iloc[position])} x {other} ({motivo})"
+            for position, other, motivo in found]
+
+
+def _append(args, df):
+    """
+    Grava as linhas no banco e, como o comando termina aqui, já regrava a
+    planilha (nas telas isso fica para o fechamento do programa). Com
+    conflito de horário nada é gravado, a menos que --ignorar-conflitos.
+    """
+    df = df.reset_index(drop=True)
+    store = open_store(args.planilha)
+    conflicts = _conflicts(store, df)
+    for line in conflicts:
+        print(f"Conflito: {line}", file=sys.stderr)
+    if conflicts and not args.ignorar_conflitos:
+        print(f"{len(conflicts)} conflito(s) de horário; nada foi gravado "
+              "(use --ignorar-conflitos para gravar mesmo assim).", file=sys.stderr)
+        return EXIT_ERROR
+    seqs = store.append_rows(frame_to_display_rows(df, LABELS), LABELS)
+    store.export_pending()
+    print(f"{len(seqs)} linha(s) gravadas em {args.planilha}.")
+    return EXIT_OK
+
+
+# --------------------------------------------------
+#                  SUBCOMANDOS
+# --------------------------------------------------
+def cmd_generate(args):
+    technician_schedules = load_technician_schedules(args.tecnicos_json)
+    df = generate_schedule(
+        technician_schedules, args.inicio, args.fim, _selected_tecnicos(args, technician_schedules),
+        localizacao=args.localizacao, unidade=args.unidade
+    )
+    if args.gravar:
+        return _append(args, df)
+    _write_frame(df, args.saida, LABELS)
+    return EXIT_OK
+
+
+def cmd_optimize(args):
+    from schedule_optimizer import load_unit_demands, optimize_schedule
+    technician_schedules = load_technician_schedules(args.tecnicos_json)
+    try:
+        demands = load_unit_demands(args.demandas)
+    except ValueError as e:
+        raise SystemExit(f"Demandas inválidas em {args.demandas}: {e}")
+    result = optimize_schedule(
+        technician_schedules, args.inicio, args.fim, _selected_tecnicos(args, technician_schedules), demands
+    )
+    for data, unidade, faltam in result.faltas:
+        print(f"Aviso: {data.strftime('%d/%m/%Y')} {unidade}: faltou {faltam} técnico(s).", file=sys.stderr)
+    for tecnico, (visitas, sobreavisos) in result.carga.items():
+        print(f"{tecnico}: {visitas} visita(s), {sobreavisos} sobreaviso(s)", file=sys.stderr)
+    if args.gravar:
+        return _append(args, result.frame)
+    _write_frame(result.frame, args.saida, LABELS)
+    return EXIT_OK
+
+
+def cmd_query(args):
+    _write_frame(_query(args), args.saida, COLUMNS)
+    return EXIT_OK
+
+
+def cmd_export(args):
+    if args.por:
+        return _export_split(args)
+    df = _query(args)
+    write_schedule_workbook(args.saida, COLUMNS, frame_to_workbook_rows(df, COLUMNS))
+    print(f"{len(df)} linha(s) exportadas para {args.saida}.")
+    return EXIT_OK
+
+
+def _export_split(args):
+    """Uma planilha por técnico/unidade na pasta --saida, numa passada pelas linhas."""
+    if args.somente_leitura:
+        rows = _planilha_rows(args)
+    else:
+        rows = frame_to_workbook_rows(_query(args), COLUMNS)
+    written = write_split_workbooks(args.saida, COLUMNS, rows, SPLIT_COLUMNS[args.por])
+    total = sum(count for _, _, count in written)
+    print(f"{total} linha(s) exportadas em {len(written)} planilha(s) na pasta {args.saida}.")
+    return EXIT_OK
+
+
+def cmd_report(args):
+    from report_pipeline import export_technician_reports
+    formats = [fmt.strip().lower() for fmt in args.formatos.split(',') if fmt.strip()]
+    df = _query(args)
+    try:
+        paths = export_technician_reports(df, args.pasta, formats, workers=args.processos)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"{len(paths)} arquivo(s) de relatório gravados em {args.pasta}.")
+    return EXIT_OK
+
+
+def cmd_send(args):
+    from email_dispatch import MailDispatcher
+    from mail_queue import MailQueue
+    from schedule_mail import build_schedule_mails, periodo_texto
+
+    queue = MailQueue(args.fila)
+    if args.somente_fila:
+        summary = queue.drain(MailDispatcher())
+        summary["repetidos"] = 0
+    else:
+        if not (args.planilha and args.inicio and args.fim):
+            raise SystemExit("send precisa de --planilha, --inicio e --fim (ou --somente-fila).")
+        df = _query(args)
+        if df.empty:
+            print("Não há registros para o técnico e período selecionados.")
+            return EXIT_OK
+        mails, missing, manager_mails, missing_unidades = build_schedule_mails(
+            df, periodo_texto(args.inicio, args.fim), args.gestores
+        )
+        for tecnico in missing:
+            print(f"Aviso: e-mail do técnico {tecnico} não encontrado.", file=sys.stderr)
+        for unidade in sorted(set(missing_unidades)):
+            print(f"Aviso: e-mail do gestor da unidade {unidade} não encontrado.", file=sys.stderr)
+        mails.extend(manager_mails)
+        summary = queue.send(mails, MailDispatcher())
+
+    print(
+        f"Enviados: {summary['enviados']}  Reagendados: {summary['reagendados']}  "
+        f"Desistidos: {summary['desistidos']}  Já enviados antes: {summary['repetidos']}"
+    )
+    for to, error in summary["erros"]:
+        print(f"Erro: {to}: {error}", file=sys.stderr)
+    return EXIT_ERROR if summary["erros"] else EXIT_OK
+
+
+# --------------------------------------------------
+#                  ARGUMENTOS
+# --------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog='escalas', description="Escalas sem interface gráfica.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_filters(p):
+        p.add_argument('--planilha', required=True, help="planilha de escalas (.xlsx)")
+        p.add_argument('--inicio', type=parse_date, help="início do período (dd/mm/aaaa)")
+        p.add_argument('--fim', type=parse_date, help="fim do período (dd/mm/aaaa)")
+        p.add_argument('--tecnico', help="parte do nome do técnico")
+        p.add_argument('--unidade', help="parte do nome da unidade")
+        p.add_argument('--somente-leitura', action='store_true',
+                       help="lê direto da planilha, sem criar/atualizar o banco ao lado dela")
+
+    p = sub.add_parser('generate', help="gera a escala pré-preenchida (5X2 / 12X36) do período")
+    p.add_argument('--planilha', help="planilha onde gravar (com --gravar)")
+    p.add_argument('--inicio', type=parse_date, required=True)
+    p.add_argument('--fim', type=parse_date, required=True)
+    p.add_argument('--tecnico', action='append',
+                   help="técnico a incluir; para 12X36 use \"Nome=pares\" ou \"Nome=impares\" (repetível)")
+    p.add_argument('--localizacao', default='')
+    p.add_argument('--unidade', default='')
+    p.add_argument('--tecnicos-json', default=TECHNICIAN_SCHEDULES_PATH)
+    p.add_argument('--saida', help="arquivo .csv ou .xlsx (padrão: imprime na tela)")
+    p.add_argument('--gravar', action='store_true', help="acrescenta as linhas à planilha")
+    p.add_argument('--ignorar-conflitos', action='store_true',
+                   help="com --gravar, grava mesmo com conflito de horário")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser('optimize', help="gera a escala distribuindo unidades e sobreavisos pelas demandas")
+    p.add_argument('--planilha', help="planilha onde gravar (com --gravar)")
+    p.add_argument('--inicio', type=parse_date, required=True)
+    p.add_argument('--fim', type=parse_date, required=True)
+    p.add_argument('--tecnico', action='append',
+                   help="técnico a incluir; para 12X36 use \"Nome=pares\" ou \"Nome=impares\" (repetível)")
+    p.add_argument('--demandas', default='demandas_unidades.json', help="demandas por unidade (JSON)")
+    p.add_argument('--tecnicos-json', default=TECHNICIAN_SCHEDULES_PATH)
+    p.add_argument('--saida', help="arquivo .csv ou .xlsx (padrão: imprime na tela)")
+    p.add_argument('--gravar', action='store_true', help="acrescenta as linhas à planilha")
+    p.add_argument('--ignorar-conflitos', action='store_true',
+                   help="com --gravar, grava mesmo com conflito de horário")
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser('query', help="consulta as escalas gravadas")
+    add_filters(p)
+    p.add_argument('--saida', help="arquivo .csv ou .xlsx (padrão: imprime na tela)")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser('export', help="exporta as escalas (filtradas) para outra planilha")
+    add_filters(p)
+    p.add_argument('--saida', required=True, help="planilha .xlsx de destino (com --por, a pasta)")
+    p.add_argument('--por', choices=sorted(SPLIT_COLUMNS),
+                   help="uma planilha por técnico ou por unidade, na pasta --saida")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('report', help="grava o relatório (HTML/XLSX/PDF) de cada técnico numa pasta")
+    add_filters(p)
+    p.add_argument('--pasta', required=True, help="pasta de destino dos relatórios")
+    p.add_argument('--formatos', default='html,xlsx,pdf', help="formatos separados por vírgula (html, xlsx, pdf)")
+    p.add_argument('--processos', type=int, help="processos em paralelo (padrão: número de CPUs)")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser('send', help="envia a escala do período por e-mail (pela fila)")
+    p.add_argument('--planilha')
+    p.add_argument('--inicio', type=parse_date)
+    p.add_argument('--fim', type=parse_date)
+    p.add_argument('--tecnico', help="parte do nome do técnico")
+    p.add_argument('--unidade', help="parte do nome da unidade")
+    p.add_argument('--gestores', choices=['padrao', 'sghx'],
+                   help="também avisa os gestores das unidades com este modelo")
+    p.add_argument('--somente-fila', action='store_true', help="só reenvia o que está pendente na fila")
+    p.add_argument('--fila', default='fila_emails.sqlite', help="banco da fila de e-mails")
+    p.set_defaults(func=cmd_send)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ('generate', 'optimize') and args.gravar and not args.planilha:
+        raise SystemExit("--gravar precisa de --planilha.")
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
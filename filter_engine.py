@@ -0,0 +1,207 @@
+"""
+Índices para filtrar as escalas sem copiar nem reconverter o DataFrame.
+
+FilterIndex é montado uma vez por carga da tela de consulta:
+  - TÉCNICO / UNIDADE / LOCALIZAÇÃO viram códigos (pd.Categorical), com
+    os nomes das categorias em minúsculas para busca por substring;
+  - DATA/HORA INICIO vira um array datetime64 ordenado, e o período é
+    achado por busca binária (searchsorted).
+
+filter() devolve posições de linha (np.ndarray, em ordem crescente) do
+DataFrame original; quem exibe usa as posições direto, sem .copy().
+"""
+import numpy as np
+import pandas as pd
+
+from planilha_io import date_values
+
+CATEGORY_COLUMNS = ['TÉCNICO', 'UNIDADE', 'LOCALIZAÇÃO']
+DATE_COLUMN = 'DATA/HORA INICIO'
+
+
+class CategoryIndex:
+    """Códigos inteiros de uma coluna de texto e suas categorias em minúsculas."""
+    __slots__ = ('codes', 'categories', 'lower_categories', '_code_of')
+
+    def __init__(self, series):
+        categorical = pd.Categorical(series.astype(object).where(series.notna(), None))
+        self.codes = np.asarray(categorical.codes)
+        self.categories = list(categorical.categories)
+        self.lower_categories = [str(c).casefold() for c in self.categories]
+        self._code_of = {name: code for code, name in enumerate(self.categories)}
+
+    def _table(self, codes):
+        """Tabela código -> aceito; a última posição atende o código -1 (vazio)."""
+        table = np.zeros(len(self.categories) + 1, dtype=bool)
+        table[list(codes)] = True
+        return table
+
+    def equals_any(self, names):
+        return self._table(self._code_of[name] for name in names if name in self._code_of)
+
+    def contains(self, text):
+        """Substring sem diferenciar maiúsculas; compara só as categorias, não as linhas."""
+        text = text.casefold()
+        return self._table(code for code, name in enumerate(self.lower_categories) if text in name)
+
+    def select(self, table, rows):
+        """Das posições `rows`, as que têm código aceito por `table`."""
+        return rows[table[self.codes[rows]]]
+
+
+class FilterIndex:
+    def __init__(self, df):
+        self.size = len(df)
+        self.columns = {
+            col: CategoryIndex(df[col]) for col in CATEGORY_COLUMNS if col in df.columns
+        }
+        if DATE_COLUMN in df.columns:
+            starts = date_values(df, DATE_COLUMN)
+            self._starts = starts
+            # NaT vai para o fim na ordenação do numpy; fica fora de qualquer período
+            self._date_order = np.argsort(starts, kind='stable')
+            self._sorted_starts = starts[self._date_order]
+            self._valid_dates = int(np.count_nonzero(~np.isnat(starts)))
+        else:
+            self._date_order = None
+
+    def all_rows(self):
+        return np.arange(self.size, dtype=np.intp)
+
+    def date_range_rows(self, start=None, end=None):
+        """Posições com DATA/HORA INICIO em [start, end], por busca binária."""
+        if self._date_order is None:
+            return self.all_rows()
+        sorted_starts = self._sorted_starts[:self._valid_dates]
+        lo = 0 if start is None else np.searchsorted(sorted_starts, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+        hi = len(sorted_starts) if end is None else np.searchsorted(
+            sorted_starts, np.datetime64(pd.Timestamp(end), 'ns'), 'right'
+        )
+        return np.sort(self._date_order[lo:hi])
+
+    def filter(self, tecnicos=None, unidade_contains=None, tecnico_contains=None,
+               localizacoes=None, start=None, end=None, within=None):
+        """
+        Posições (crescentes) das linhas que atendem a todos os filtros.
+        `within` restringe a busca a posições já filtradas antes (refinamento).
+        """
+        if within is None:
+            rows = self.date_range_rows(start, end) if start is not None or end is not None else self.all_rows()
+        else:
+            rows = np.asarray(within, dtype=np.intp)
+            if self._date_order is not None and (start is not None or end is not None):
+                # Poucas linhas: comparar direto sai mais barato que a busca binária
+                starts = self._starts[rows]
+                keep = ~np.isnat(starts)
+                if start is not None:
+                    keep &= starts >= np.datetime64(pd.Timestamp(start), 'ns')
+                if end is not None:
+                    keep &= starts <= np.datetime64(pd.Timestamp(end), 'ns')
+                rows = rows[keep]
+
+        checks = []
+        if tecnicos and 'TÉCNICO' in self.columns:
+            checks.append(('TÉCNICO', self.columns['TÉCNICO'].equals_any(tecnicos)))
+        if tecnico_contains and 'TÉCNICO' in self.columns:
+            checks.append(('TÉCNICO', self.columns['TÉCNICO'].contains(tecnico_contains)))
+        if unidade_contains and 'UNIDADE' in self.columns:
+            checks.append(('UNIDADE', self.columns['UNIDADE'].contains(unidade_contains)))
+        if localizacoes and 'LOCALIZAÇÃO' in self.columns:
+            checks.append(('LOCALIZAÇÃO', self.columns['LOCALIZAÇÃO'].equals_any(localizacoes)))
+        for col, table in checks:
+            rows = self.columns[col].select(table, rows)
+        return rows
+
+
+def _text_narrows(new, old):
+    return not old or (bool(new) and old.casefold() in new.casefold())
+
+
+def is_narrower(new, old):
+    """
+    True se todo resultado de `new` também atende `old` (critérios como
+    os argumentos de FilterIndex.filter), ou seja, dá para refinar o
+    resultado anterior em vez de varrer tudo de novo.
+    """
+    if old['tecnicos'] and not (new['tecnicos'] and set(new['tecnicos']) <= set(old['tecnicos'])):
+        return False
+    if not _text_narrows(new['tecnico_contains'], old['tecnico_contains']):
+        return False
+    if not _text_narrows(new['unidade_contains'], old['unidade_contains']):
+        return False
+    if old['start'] is not None and (new['start'] is None or new['start'] < old['start']):
+        return False
+    if old['end'] is not None and (new['end'] is None or new['end'] > old['end']):
+        return False
+    return True
+
+
+class IncrementalFilter:
+    """
+    Filtro para digitação ao vivo: se a nova busca só estreita a anterior
+    (mais letras digitadas, menos técnicos, período menor), refina as
+    posições do resultado anterior; senão busca no índice inteiro.
+    """
+    def __init__(self, index):
+        self.index = index
+        self._last = None
+        self._last_rows = None
+
+    def reset(self):
+        self._last = None
+        self._last_rows = None
+
+    def filter(self, tecnicos=None, tecnico_contains='', unidade_contains='', start=None, end=None):
+        criteria = {
+            'tecnicos': list(tecnicos or []), 'tecnico_contains': tecnico_contains or '',
+            'unidade_contains': unidade_contains or '', 'start': start, 'end': end,
+        }
+        within = self._last_rows if self._last is not None and is_narrower(criteria, self._last) else None
+        rows = self.index.filter(within=within, **criteria)
+        self._last, self._last_rows = criteria, rows
+        return rows
+
+
+# --------------------------------------------------
+#                  ORDENAÇÃO
+# --------------------------------------------------
+class SortKey:
+    """
+    Posto (rank) inteiro de cada linha numa coluna, calculado uma vez.
+    Texto é comparado em minúsculas; datas e números pelo valor. Vazios
+    ficam sempre por último, em ordem crescente ou decrescente.
+    """
+    __slots__ = ('ranks', 'missing', 'size')
+
+    def __init__(self, values):
+        series = pd.Series(values)
+        missing = series.isna().to_numpy() | (series.astype(object) == '').to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            comparable = series
+        else:
+            comparable = series.astype(object).where(~missing, None).map(
+                lambda value: None if value is None else str(value).lower()
+            )
+        codes, uniques = pd.factorize(comparable)
+        rank_of_code = np.empty(len(uniques), dtype=np.int64)
+        rank_of_code[np.argsort(np.asarray(uniques), kind='stable')] = np.arange(len(uniques))
+        ranks = np.where(codes >= 0, rank_of_code[np.maximum(codes, 0)], 0)
+        self.missing = missing | (codes < 0)
+        self.size = len(uniques)
+        self.ranks = ranks
+
+    def key(self, ascending, rows=None):
+        ranks = self.ranks if rows is None else self.ranks[rows]
+        missing = self.missing if rows is None else self.missing[rows]
+        key = ranks if ascending else (self.size - 1 - ranks)
+        return np.where(missing, self.size, key)
+
+
+def sort_permutation(sort_keys, ascending, rows=None):
+    """
+    Permutação estável que ordena `rows` (ou todas as linhas) pelas
+    colunas de `sort_keys` (a primeira é a principal), via np.lexsort.
+    """
+    keys = [key.key(asc, rows) for key, asc in zip(sort_keys, ascending)]
+    # np.lexsort usa a ÚLTIMA chave como principal
+    return np.lexsort(keys[::-1])
@@ -0,0 +1,264 @@
+"""
+Fila persistente (SQLite) dos e-mails de escala.
+
+Cada mensagem entra na fila com uma chave de idempotência
+(destinatário + período + hash do conteúdo). Reenviar a mesma escala não
+duplica nada: só o que ainda não saiu é enviado. Falhas são tentadas de
+novo com espera exponencial até MAX_ATTEMPTS.
+
+A tela e a linha de comando podem esvaziar a mesma fila ao mesmo tempo:
+antes de enviar, cada mensagem é reservada (status "enviando", com dono e
+prazo) por um UPDATE condicional, e só quem conseguiu a reserva a envia.
+Se o processo cair no meio do envio, a reserva vence após LEASE_SECONDS
+e a mensagem volta a ser enviada.
+"""
+import uuid
+import hashlib
+import sqlite3
+import datetime
+import threading
+
+from email_dispatch import OutgoingMail, logger
+
+DEFAULT_QUEUE_PATH = "fila_emails.sqlite"
+MAX_ATTEMPTS = 6
+BASE_RETRY_SECONDS = 60
+MAX_RETRY_SECONDS = 60 * 60
+# Prazo da reserva de uma mensagem em envio (cobre um lote inteiro)
+LEASE_SECONDS = 15 * 60
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+STATUS_PENDING = "pendente"
+STATUS_SENDING = "enviando"
+STATUS_SENT = "enviado"
+STATUS_FAILED = "falhou"
+
+
+def _now():
+    return datetime.datetime.now().replace(microsecond=0)
+
+
+def _fmt(value):
+    return value.strftime(DATE_FORMAT) if value is not None else None
+
+
+def _parse(value):
+    return datetime.datetime.strptime(value, DATE_FORMAT) if value else None
+
+
+def idempotency_key(mail):
+    """Destinatário + período + hash do conteúdo (assunto e corpo)."""
+    content = hashlib.sha256(
+        "\x1f".join([mail.subject or "", mail.html_body or "", mail.text_body or ""]).encode("utf-8")
+    ).hexdigest()
+    raw = "\x1f".join([mail.to.strip().lower(), mail.period or "", content])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def retry_delay(attempts):
+    """Espera antes da próxima tentativa: 1 min, 2 min, 4 min... até 1 h."""
+    return datetime.timedelta(seconds=min(BASE_RETRY_SECONDS * 2 ** max(attempts - 1, 0), MAX_RETRY_SECONDS))
+
+
+class MailQueue:
+    def __init__(self, db_path=DEFAULT_QUEUE_PATH):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS mensagens (
+                    chave TEXT PRIMARY KEY,
+                    destinatario TEXT NOT NULL,
+                    assunto TEXT,
+                    html TEXT,
+                    texto TEXT,
+                    periodo TEXT,
+                    envio_em TEXT,
+                    status TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    proxima_tentativa TEXT,
+                    ultimo_erro TEXT,
+                    criado_em TEXT,
+                    enviado_em TEXT,
+                    reservado_por TEXT,
+                    reservado_ate TEXT
+                )
+            """)
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(mensagens)")}
+            for column in ("reservado_por", "reservado_ate"):
+                if column not in existing:
+                    # Fila criada antes da reserva de envio
+                    self.conn.execute(f"ALTER TABLE mensagens ADD COLUMN {column} TEXT")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_mensagens_status ON mensagens (status, proxima_tentativa)"
+            )
+
+    def enqueue(self, mails):
+        """Inclui as mensagens que ainda não estão na fila. Retorna (novas, repetidas)."""
+        now = _fmt(_now())
+        added = 0
+        with self._lock, self.conn:
+            for mail in mails:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO mensagens "
+                    "(chave, destinatario, assunto, html, texto, periodo, envio_em, status, "
+                    " tentativas, proxima_tentativa, criado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                    (idempotency_key(mail), mail.to, mail.subject, mail.html_body, mail.text_body,
+                     mail.period, _fmt(mail.send_time), STATUS_PENDING, now, now)
+                )
+                added += cursor.rowcount
+        return added, len(mails) - added
+
+    def due(self, supports_deferred=True, limit=500):
+        """
+        Mensagens pendentes cuja próxima tentativa já venceu (e as em envio
+        com a reserva vencida). Se o transporte não agenda entregas, as
+        mensagens com envio futuro esperam na fila.
+        """
+        now = _fmt(_now())
+        sql = (
+            "SELECT chave, destinatario, assunto, html, texto, periodo, envio_em FROM mensagens "
+            "WHERE ((status = ? AND proxima_tentativa <= ?) OR (status = ? AND reservado_ate <= ?))"
+        )
+        params = [STATUS_PENDING, now, STATUS_SENDING, now]
+        if not supports_deferred:
+            sql += " AND (envio_em IS NULL OR envio_em <= ?)"
+            params.append(now)
+        sql += " ORDER BY criado_em LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            (key, OutgoingMail(to, subject, html, text_body=text, send_time=_parse(send_at), period=period))
+            for key, to, subject, html, text, period, send_at in rows
+        ]
+
+    def claim(self, keys, owner):
+        """
+        Reserva para `owner` as mensagens de `keys` que ainda estão livres
+        (pendentes e vencidas, ou com a reserva vencida). Cada UPDATE só
+        altera a linha se ela continua livre, então duas filas abertas no
+        mesmo arquivo nunca reservam a mesma mensagem. Retorna as chaves
+        reservadas.
+        """
+        now = _now()
+        claimed = set()
+        with self._lock, self.conn:
+            for key in keys:
+                cursor = self.conn.execute(
+                    "UPDATE mensagens SET status = ?, reservado_por = ?, reservado_ate = ? "
+                    "WHERE chave = ? AND ((status = ? AND proxima_tentativa <= ?) "
+                    "OR (status = ? AND reservado_ate <= ?))",
+                    (STATUS_SENDING, owner, _fmt(now + datetime.timedelta(seconds=LEASE_SECONDS)), key,
+                     STATUS_PENDING, _fmt(now), STATUS_SENDING, _fmt(now))
+                )
+                if cursor.rowcount == 1:
+                    claimed.add(key)
+        return claimed
+
+    def release(self, keys, owner):
+        """Devolve à fila (pendentes) as mensagens de `keys` ainda reservadas por `owner`."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE mensagens SET status = ?, reservado_por = NULL, reservado_ate = NULL "
+                "WHERE chave = ? AND status = ? AND reservado_por = ?",
+                [(STATUS_PENDING, key, STATUS_SENDING, owner) for key in keys]
+            )
+
+    def mark_sent(self, key):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE mensagens SET status = ?, enviado_em = ?, ultimo_erro = NULL, "
+                "reservado_por = NULL, reservado_ate = NULL, tentativas = tentativas + 1 WHERE chave = ?",
+                (STATUS_SENT, _fmt(_now()), key)
+            )
+
+    def mark_failed(self, key, error):
+        """Agenda nova tentativa com espera exponencial ou desiste após MAX_ATTEMPTS."""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT tentativas FROM mensagens WHERE chave = ?", (key,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            status = STATUS_FAILED if attempts >= MAX_ATTEMPTS else STATUS_PENDING
+            self.conn.execute(
+                "UPDATE mensagens SET status = ?, tentativas = ?, ultimo_erro = ?, proxima_tentativa = ?, "
+                "reservado_por = NULL, reservado_ate = NULL WHERE chave = ?",
+                (status, attempts, error, _fmt(_now() + retry_delay(attempts)), key)
+            )
+        return status
+
+    def next_retry_at(self, supports_deferred=True):
+        """
+        Quando vence a próxima mensagem pendente ou reserva de envio
+        (None se a fila estiver vazia).
+        """
+        sql = "SELECT MIN(proxima_tentativa) FROM mensagens WHERE status = ?"
+        params = [STATUS_PENDING]
+        if not supports_deferred:
+            sql = (
+                "SELECT MIN(MAX(proxima_tentativa, COALESCE(envio_em, proxima_tentativa))) "
+                "FROM mensagens WHERE status = ?"
+            )
+        with self._lock:
+            values = [
+                self.conn.execute(sql, params).fetchone()[0],
+                self.conn.execute(
+                    "SELECT MIN(reservado_ate) FROM mensagens WHERE status = ?", (STATUS_SENDING,)
+                ).fetchone()[0],
+            ]
+        values = [value for value in values if value]
+        return _parse(min(values)) if values else None
+
+    def send(self, mails, dispatcher, progress=None):
+        """
+        Põe `mails` na fila (ignorando os já enfileirados) e envia os pendentes.
+        Retorna o resumo de drain com a contagem de "repetidos".
+        """
+        added, repeated = self.enqueue(mails)
+        summary = self.drain(dispatcher, progress=progress)
+        summary["repetidos"] = repeated
+        return summary
+
+    def drain(self, dispatcher, progress=None):
+        """
+        Reserva (claim) e envia as mensagens vencidas pelo `dispatcher`;
+        as que outro processo reservou antes ficam com ele.
+        Retorna um dicionário com as contagens de enviados/reagendados/desistidos.
+        """
+        supports_deferred = getattr(dispatcher.transport, "supports_deferred", True)
+        pending = self.due(supports_deferred)
+        summary = {"enviados": 0, "reagendados": 0, "desistidos": 0, "erros": []}
+        owner = uuid.uuid4().hex
+        if pending:
+            claimed = self.claim([key for key, _ in pending], owner)
+            pending = [(key, mail) for key, mail in pending if key in claimed]
+        if not pending:
+            return summary
+        keys = {id(mail): key for key, mail in pending}
+        attempted = set()
+
+        def record(mail, error):
+            # Gravado assim que a mensagem sai, antes do close() do transporte
+            # (o Outlook faz o SendAndReceive ali e pode falhar depois de enviar)
+            key = keys[id(mail)]
+            with self._lock:
+                attempted.add(key)
+                if error is None:
+                    self.mark_sent(key)
+                    summary["enviados"] += 1
+                    return
+                status = self.mark_failed(key, error)
+                summary["reagendados" if status == STATUS_PENDING else "desistidos"] += 1
+                summary["erros"].append((mail.to, error))
+            if status == STATUS_FAILED:
+                logger.error(f"Desistindo do e-mail para {mail.to} após {MAX_ATTEMPTS} tentativas")
+
+        try:
+            dispatcher.send_all([mail for _, mail in pending], progress=progress, on_result=record)
+        except BaseException:
+            # Transporte nem abriu, envio interrompido ou close() falhou: só as
+            # reservas das mensagens que nem foram tentadas voltam para a fila
+            self.release([key for key in keys.values() if key not in attempted], owner)
+            raise
+        return summary
@@ -0,0 +1,178 @@
+"""
+Linhas da escala ainda não gravadas (tabela do ScheduleForm).
+
+PendingSchedule guarda as linhas por coluna, em arrays NumPy compactos:
+  - DATA/HORA INICIO / FIM como datetime64[s] (NaT se vazia);
+  - DIA DA SEMANA, LOCALIZAÇÃO, TURNO e ESCALA como códigos int8 num
+    vocabulário pequeno;
+  - TÉCNICO e UNIDADE como ids int32 de nomes internados (cada nome
+    fica uma vez só na memória, compartilhado entre as planilhas);
+  - JUSTIFICATIVA, CARD e colunas desconhecidas como texto livre.
+Ordenar, editar e gravar usam os valores tipados; o texto
+'dd/mm/aaaa hh:mm:ss' só é gerado na tabela da tela.
+
+A ordem das linhas é sempre a mesma da tabela da tela.
+"""
+import sys
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from planilha_io import DATE_COLUMNS, LABELS, parse_datetime_series
+from schedule_generator import DIAS_SEMANA
+
+DATE_DTYPE = 'datetime64[s]'
+
+# Valores esperados de cada coluna codificada; outros entram no fim do vocabulário
+SMALL_CODE_COLUMNS = {
+    'DIA DA SEMANA': ['', *DIAS_SEMANA],
+    'LOCALIZAÇÃO': ["", "Folga", "Férias", "Sobreaviso", "Unidade", "Escritório", "Home", "Online"],
+    'TURNO': ['', 'Diurno', 'Noturno'],
+    'ESCALA': ['', '5X2', '12X36'],
+}
+INTERNED_COLUMNS = ['TÉCNICO', 'UNIDADE']
+
+
+class Vocabulary:
+    """Texto <-> código inteiro; os códigos só crescem (nunca são reaproveitados)."""
+    __slots__ = ('values', '_code_of', 'dtype')
+
+    def __init__(self, values=(), dtype=np.int8):
+        self.values = []
+        self._code_of = {}
+        self.dtype = np.dtype(dtype)
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self._code_of.get(value)
+        if code is None:
+            code = len(self.values)
+            if code > np.iinfo(self.dtype).max:
+                # Vocabulário passou do tipo (texto livre numa coluna "pequena")
+                self.dtype = np.dtype(np.int32)
+            self.values.append(sys.intern(value))
+            self._code_of[value] = code
+        return code
+
+    def encode(self, values):
+        # Interna tudo antes: se o vocabulário crescer além do tipo, o array
+        # já é criado com o tipo promovido (nada estoura no meio da conversão)
+        codes = [self.code(v) for v in values]
+        return np.asarray(codes, dtype=self.dtype)
+
+    def decode(self, codes):
+        return np.asarray(self.values, dtype=object)[codes]
+
+
+# Nomes de técnicos e unidades: um vocabulário só, para o processo inteiro
+_NAMES = Vocabulary([''], dtype=np.int32)
+
+
+def _to_text(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    return str(value)
+
+
+class PendingSchedule:
+    def __init__(self, labels=LABELS):
+        self.labels = list(labels)
+        self._vocabularies = {}
+        self._columns = {}
+        for col in self.labels:
+            if col in DATE_COLUMNS:
+                self._columns[col] = np.empty(0, dtype=DATE_DTYPE)
+            elif col in SMALL_CODE_COLUMNS:
+                self._vocabularies[col] = Vocabulary(SMALL_CODE_COLUMNS[col])
+                self._columns[col] = np.empty(0, dtype=np.int8)
+            elif col in INTERNED_COLUMNS:
+                self._vocabularies[col] = _NAMES
+                self._columns[col] = np.empty(0, dtype=np.int32)
+            else:
+                self._columns[col] = np.empty(0, dtype=object)
+
+    def __len__(self):
+        return len(self._columns[self.labels[0]])
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _encode(self, col, values):
+        """Valores de uma coluna (texto, datetime ou Timestamp) -> array compacto."""
+        if col in DATE_COLUMNS:
+            return parse_datetime_series(list(values)).to_numpy(dtype=DATE_DTYPE)
+        texts = [_to_text(v) for v in values]
+        if col in self._vocabularies:
+            return self._vocabularies[col].encode(texts)
+        return np.asarray(texts, dtype=object)
+
+    def _append_column(self, col, encoded):
+        current = self._columns[col]
+        self._columns[col] = np.concatenate([current, encoded.astype(np.result_type(current, encoded))])
+
+    # ---- INCLUSÃO / ALTERAÇÃO ----
+    def append_rows(self, rows):
+        """Acrescenta linhas (texto como na tabela, ou datas já datetime), na ordem de labels."""
+        rows = list(rows)
+        for index, col in enumerate(self.labels):
+            self._append_column(col, self._encode(col, [fields[index] for fields in rows]))
+
+    def append_frame(self, df):
+        """Acrescenta as linhas de um DataFrame com as colunas de labels (datas datetime64)."""
+        for col in self.labels:
+            series = df[col]
+            if col in DATE_COLUMNS:
+                encoded = parse_datetime_series(series).to_numpy(dtype=DATE_DTYPE)
+            else:
+                encoded = self._encode(col, series.tolist())
+            self._append_column(col, encoded)
+
+    def replace_row(self, row, fields):
+        for index, col in enumerate(self.labels):
+            encoded = self._encode(col, [fields[index]])
+            if encoded.dtype != self._columns[col].dtype:
+                self._columns[col] = self._columns[col].astype(np.result_type(self._columns[col], encoded))
+            self._columns[col][row] = encoded[0]
+
+    def delete_row(self, row):
+        for col, values in self._columns.items():
+            self._columns[col] = np.delete(values, row)
+
+    def drop_head(self, count):
+        """Remove as `count` primeiras linhas (as que acabaram de ser gravadas)."""
+        for col, values in self._columns.items():
+            self._columns[col] = values[count:].copy()
+
+    def reorder(self, permutation):
+        """Reordena as linhas: a linha i passa a ser a antiga permutation[i]."""
+        permutation = np.asarray(permutation, dtype=np.intp)
+        for col, values in self._columns.items():
+            self._columns[col] = values[permutation]
+
+    # ---- LEITURA ----
+    def column(self, col):
+        """Valores de uma coluna: datetime64 nas datas, texto (array object) nas demais."""
+        values = self._columns[col]
+        if col in self._vocabularies:
+            return self._vocabularies[col].decode(values)
+        return values
+
+    def typed_row(self, row):
+        """Uma linha na ordem de labels, com datas como datetime (None se vazia)."""
+        return self.typed_rows(row, row + 1)[0]
+
+    def typed_rows(self, start=0, stop=None):
+        """Linhas na ordem de labels, com datas como datetime (None se vazias)."""
+        columns = []
+        for col in self.labels:
+            values = self.column(col)[start:stop]
+            if col in DATE_COLUMNS:
+                values = [None if np.isnat(v) else v.astype(datetime.datetime) for v in values]
+            columns.append(values)
+        return [list(fields) for fields in zip(*columns)]
+
+    def to_frame(self):
+        """DataFrame com as colunas de labels (datas como datetime64)."""
+        return pd.DataFrame({col: self.column(col) for col in self.labels}, columns=self.labels)
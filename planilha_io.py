@@ -0,0 +1,362 @@
+"""
+Leitura e escrita da planilha de escalas (.xlsx).
+
+Centraliza as colunas da planilha e as rotinas de gravação usadas
+pelo ScheduleForm e pelo ConsultaEscalaDialog.
+"""
+import os
+import re
+import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+
+from diagnostics import span
+
+# Colunas da planilha (além de SEQ), na ordem exibida nas telas.
+LABELS = [
+    'DIA DA SEMANA', 'LOCALIZAÇÃO', 'UNIDADE', 'TÉCNICO', 'ESCALA', 'TURNO',
+    'DATA/HORA INICIO', 'DATA/HORA FIM', 'JUSTIFICATIVA', 'CARD'
+]
+DATE_COLUMNS = ['DATA/HORA INICIO', 'DATA/HORA FIM']
+
+# Formato das datas na tabela/planilha (texto) e no Excel (number_format).
+TEXT_DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
+EXCEL_DATE_FORMAT = 'dd/mm/yyyy hh:mm:ss'
+
+
+# --------------------------------------------------
+#                  DATAS
+#   (uma conversão só para DATA/HORA INICIO / FIM)
+# --------------------------------------------------
+# Formatos de texto aceitos, na ordem em que são tentados: o da tela e
+# da planilha, variações digitadas à mão e o do banco (ISO)
+DATE_FORMATS = (TEXT_DATE_FORMAT, '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S')
+DATETIME_DTYPE = 'datetime64[ns]'
+
+
+def parse_text_datetime(value):
+    """Converte texto num dos DATE_FORMATS em datetime (None se vazio/inválido)."""
+    if isinstance(value, datetime.datetime):
+        return value
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_cell_datetime(value):
+    """Data de uma célula: datetime do Excel ou texto (DATE_FORMATS, ou dia primeiro)."""
+    if isinstance(value, datetime.datetime):
+        return None if pd.isna(value) else value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time(0, 0))
+    if not isinstance(value, str) or not value.strip():
+        return None
+    parsed = parse_text_datetime(value.strip())
+    if parsed is None:
+        parsed = pd.to_datetime(value, dayfirst=True, errors='coerce')
+        parsed = None if pd.isna(parsed) else parsed.to_pydatetime()
+    return parsed
+
+
+def parse_datetime_series(values, formats=DATE_FORMATS):
+    """
+    Converte uma coluna de datas para datetime64[ns], de uma vez:
+      - coluna já datetime64: só ajusta a resolução, sem reconverter;
+      - datetime/date (células de data do Excel) passam direto;
+      - texto: cada valor distinto é convertido uma vez, de forma
+        vetorizada, pelos `formats` em ordem; o que não casar com nenhum
+        é interpretado com o dia primeiro.
+    Vazios, números e textos inválidos viram NaT. O índice é preservado.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series.astype(DATETIME_DTYPE)
+
+    raw = series.to_numpy(dtype=object)
+    parsed = np.full(len(raw), np.datetime64('NaT'), dtype=DATETIME_DTYPE)
+    native = np.fromiter((isinstance(v, (datetime.date, np.datetime64)) for v in raw), dtype=bool, count=len(raw))
+    if native.any():
+        parsed[native] = pd.to_datetime(
+            pd.Series(raw[native], dtype=object), errors='coerce'
+        ).to_numpy(dtype=DATETIME_DTYPE)
+
+    texts = np.fromiter((isinstance(v, str) and bool(v.strip()) for v in raw), dtype=bool, count=len(raw))
+    if texts.any():
+        codes, uniques = pd.factorize(pd.Series(raw[texts], dtype=object).str.strip())
+        unique_parsed = np.full(len(uniques), np.datetime64('NaT'), dtype=DATETIME_DTYPE)
+        pending = np.arange(len(uniques))
+        for fmt in formats:
+            if not len(pending):
+                break
+            attempt = pd.to_datetime(
+                pd.Series(uniques[pending], dtype=object), format=fmt, errors='coerce'
+            ).to_numpy(dtype=DATETIME_DTYPE)
+            matched = ~np.isnat(attempt)
+            unique_parsed[pending[matched]] = attempt[matched]
+            pending = pending[~matched]
+        for index in pending:
+            # Fora dos formatos conhecidos: inferência, valor a valor (raro)
+            unique_parsed[index] = pd.to_datetime(uniques[index], dayfirst=True, errors='coerce').to_datetime64()
+        parsed[texts] = unique_parsed[codes]
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+
+def date_values(df, col):
+    """Coluna de datas de `df` como array datetime64[ns] (sem custo se já está tipada)."""
+    return parse_datetime_series(df[col]).to_numpy(dtype=DATETIME_DTYPE)
+
+
+def ensure_typed_dates(df, columns=DATE_COLUMNS):
+    """
+    Converte, no próprio `df`, as colunas de data ainda não tipadas. Os
+    DataFrames carregados (cache, banco, planilha) já saem tipados daqui,
+    então quem os usa depois não converte de novo. Retorna `df`.
+    """
+    for col in columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            df[col] = parse_datetime_series(df[col])
+    return df
+
+
+def display_texts(series):
+    """
+    Coluna inteira como texto de exibição (array object): datas em
+    dd/mm/aaaa hh:mm:ss, '' para vazios. Único formatador das tabelas,
+    da linha de comando e das exportações em texto.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        texts = series.dt.strftime(TEXT_DATE_FORMAT)
+    else:
+        texts = series.astype(object).map(str)
+    return texts.where(series.notna(), '').to_numpy(dtype=object)
+
+
+def frame_to_display_rows(df, labels=LABELS):
+    """Linhas de texto como exibidas nas tabelas (ver display_texts)."""
+    columns = [display_texts(df[col]).tolist() for col in labels]
+    return [list(row) for row in zip(*columns)]
+
+
+def frame_to_workbook_rows(df, columns):
+    """Linhas de `df` para write_schedule_workbook (vazios/NaT como None, datas como datetime)."""
+    values = df[list(columns)].astype(object)
+    values = values.where(df[list(columns)].notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def write_schedule_workbook(planilha_path, header, rows, sheet_title='Sheet1'):
+    """
+    Grava uma planilha nova com `header` e `rows` em modo write-only.
+
+    Valores datetime recebem o formato de data na própria célula, então
+    não é preciso reabrir o arquivo para formatar. A gravação vai para um
+    arquivo temporário e só substitui o original no final.
+    """
+    with span('gravar_planilha', modo='regravar') as s:
+        wb, ws = _write_only_workbook(header, sheet_title)
+        count = 0
+        for fields in rows:
+            ws.append(_write_only_cells(ws, fields))
+            count += 1
+        _save_replacing(wb, planilha_path)
+        s.set(rows=count, bytes=os.path.getsize(planilha_path))
+
+
+def _write_only_workbook(header, sheet_title):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+    ws.append(list(header))
+    return wb, ws
+
+
+def _write_only_cells(ws, fields):
+    """Valores de uma linha; datetime vira célula já com o formato de data."""
+    cells = []
+    for value in fields:
+        if isinstance(value, datetime.datetime):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.number_format = EXCEL_DATE_FORMAT
+            cells.append(cell)
+        else:
+            cells.append(value)
+    return cells
+
+
+def _save_replacing(wb, planilha_path):
+    # Grava num temporário e só então substitui o arquivo (nunca fica pela metade)
+    tmp_path = f"{planilha_path}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, planilha_path)
+
+
+# --------------------------------------------------
+#      GRAVAÇÃO SEPARADA (uma planilha por valor)
+# --------------------------------------------------
+SPLIT_PROGRESS_ROWS = 1000
+
+
+def safe_file_stem(text, default='sem_nome'):
+    """Texto utilizável como nome de arquivo (letras, números, espaço, - e _)."""
+    return re.sub(r'[^\w\- ]', '_', str(text)).strip() or default
+
+
+def write_split_workbooks(directory, header, rows, by, prefix='escalas', sheet_title='Sheet1', progress=None):
+    """
+    Numa única passada por `rows` (valores na ordem de `header`), grava
+    cada linha na planilha do seu valor da coluna `by`: um arquivo
+    <prefix>_<valor>.xlsx por técnico, unidade etc. em `directory`.
+
+    Todas as planilhas são write-only, com o formato de data aplicado na
+    própria célula (não é preciso reabrir nada para formatar), e cada uma
+    só substitui o arquivo anterior no final. `progress(linhas)` é chamado
+    a cada SPLIT_PROGRESS_ROWS linhas. Retorna [(valor, caminho, linhas)]
+    na ordem em que os valores apareceram.
+    """
+    key_pos = list(header).index(by)
+    empty_stem = 'sem_' + safe_file_stem(by.lower())
+    os.makedirs(directory, exist_ok=True)
+    outputs = {}
+    used_stems = set()
+    count = 0
+    with span('gravar_planilhas_separadas', por=by) as s:
+        for fields in rows:
+            value = fields[key_pos]
+            key = '' if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value).strip()
+            output = outputs.get(key)
+            if output is None:
+                stem = f"{prefix}_{safe_file_stem(key, empty_stem)}"
+                # Valores diferentes com o mesmo nome de arquivo (ex.: 'A/B' e 'A_B',
+                # ou só maiúsculas no Windows) ganham um número
+                candidate, suffix = stem, 2
+                while candidate.casefold() in used_stems:
+                    candidate, suffix = f"{stem} ({suffix})", suffix + 1
+                used_stems.add(candidate.casefold())
+                wb, ws = _write_only_workbook(header, sheet_title)
+                output = outputs[key] = [wb, ws, os.path.join(directory, candidate + '.xlsx'), 0]
+            ws = output[1]
+            ws.append(_write_only_cells(ws, fields))
+            output[3] += 1
+            count += 1
+            if progress and count % SPLIT_PROGRESS_ROWS == 0:
+                progress(count)
+
+        for wb, _, path, _ in outputs.values():
+            _save_replacing(wb, path)
+        s.set(rows=count, arquivos=len(outputs),
+              bytes=sum(os.path.getsize(path) for _, _, path, _ in outputs.values()))
+    return [(key, path, rows_written) for key, (_, _, path, rows_written) in outputs.items()]
+
+
+# --------------------------------------------------
+#          LEITURA EM PARTES (read-only)
+# --------------------------------------------------
+READ_CHUNK_ROWS = 5000
+
+
+def _cell_seq(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)) and value == value:
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def read_header(planilha_path):
+    """Nomes do cabeçalho da planilha, como estão escritos (só a primeira linha é lida)."""
+    wb = load_workbook(planilha_path, read_only=True)
+    try:
+        header = next(wb.active.iter_rows(max_row=1, values_only=True), None) or ()
+    finally:
+        wb.close()
+    return [str(name).strip() for name in header if name is not None]
+
+
+def extra_columns(header):
+    """Colunas do cabeçalho que não são SEQ nem LABELS (acrescentadas pelo usuário)."""
+    known = {col.upper() for col in ['SEQ'] + LABELS}
+    return [name for name in header if name.upper() not in known]
+
+
+def iter_schedule_rows(planilha_path, chunk_rows=READ_CHUNK_ROWS, start=None, end=None, tecnicos=None,
+                       extras=False):
+    """
+    Lê a planilha em modo read-only (linha a linha, sem carregar a folha
+    inteira) e devolve listas de até `chunk_rows` linhas na ordem
+    ['SEQ'] + LABELS, com datas como datetime e SEQ como int (None se a
+    célula não tem número; sem coluna SEQ, a numeração segue as linhas).
+    Com `extras`, cada linha termina com a lista de valores das
+    extra_columns do cabeçalho, na mesma ordem.
+
+    `start`/`end` (DATA/HORA INICIO, inclusive) e `tecnicos` (nomes exatos)
+    são testados durante a leitura: as outras colunas das linhas
+    descartadas nem são convertidas.
+    """
+    wb = load_workbook(planilha_path, read_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        position = {str(name).strip().upper(): idx for idx, name in enumerate(header) if name is not None}
+        extra_pos = [position[name.upper()] for name in extra_columns(
+            [str(name).strip() for name in header if name is not None]
+        )] if extras else None
+        seq_pos = position.get('SEQ')
+        label_pos = [position.get(col.upper()) for col in LABELS]
+        start_pos = position.get('DATA/HORA INICIO')
+        tecnico_pos = position.get('TÉCNICO')
+        date_labels = {LABELS.index(col) for col in DATE_COLUMNS}
+        tecnicos = set(tecnicos) if tecnicos else None
+
+        def cell(values, pos):
+            return values[pos] if pos is not None and pos < len(values) else None
+
+        chunk = []
+        line = 0
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            line += 1
+            if tecnicos is not None and cell(values, tecnico_pos) not in tecnicos:
+                continue
+            if start is not None or end is not None:
+                inicio = parse_cell_datetime(cell(values, start_pos))
+                if inicio is None or (start is not None and inicio < start) or (end is not None and inicio > end):
+                    continue
+            record = [_cell_seq(cell(values, seq_pos)) if seq_pos is not None else line]
+            for index, pos in enumerate(label_pos):
+                value = cell(values, pos)
+                record.append(parse_cell_datetime(value) if index in date_labels else value)
+            if extra_pos is not None:
+                record.append([cell(values, pos) for pos in extra_pos])
+            chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        wb.close()
+
+
+def read_schedule_frame(planilha_path, start=None, end=None, tecnicos=None):
+    """DataFrame (SEQ + LABELS) só com as linhas pedidas, lido em partes por iter_schedule_rows."""
+    columns = ['SEQ'] + list(LABELS)
+    with span('leitura_planilha', modo='somente_leitura') as s:
+        frames = [
+            pd.DataFrame(chunk, columns=columns)
+            for chunk in iter_schedule_rows(planilha_path, start=start, end=end, tecnicos=tecnicos)
+        ]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        s.set(rows=len(df))
+    with span('conversao_datas', rows=len(df)):
+        ensure_typed_dates(df)
+    return df
@@ -0,0 +1,269 @@
+"""
+E-mails e relatórios por técnico / por unidade, em vários processos.
+
+  - render_mail_payloads: HTML/texto da escala de cada técnico e do aviso
+    de cada (UNIDADE, dia) para os gestores; schedule_mail transforma o
+    resultado em OutgoingMail para a fila.
+  - export_technician_reports: grava, por técnico, escala_<nome>.html,
+    .xlsx e/ou .pdf numa pasta.
+
+O DataFrame filtrado vai uma vez para cada processo (initializer do
+ProcessPoolExecutor) e lá fica só para leitura; cada tarefa leva apenas a
+chave do grupo e as posições das linhas dele. O pool usa todas as CPUs.
+Quando o tempo estimado das tarefas (custos medidos por grupo e por
+linha) não paga a subida dos processos, ou com uma CPU, tudo roda no
+próprio processo. PDFs pedidos de uma thread de fundo vão sempre para o
+pool: o Qt só imprime na thread principal.
+"""
+import os
+import html
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from diagnostics import span
+from email_templates import render_escala_tecnico, render_tabela_html, render_visita_gestor
+from planilha_io import LABELS, frame_to_workbook_rows, safe_file_stem, write_schedule_workbook
+
+# Custos medidos (ms, 1 CPU, benchmarks/bench_hot_paths.py synthetic_frame
+# com 1.000 e 10.000 linhas): subir o pool (spawn, imports, DataFrame no
+# initializer, Qt offscreen) e renderizar cada grupo, fixo + por linha
+POOL_STARTUP_MS = 800
+TASK_COST_MS = {
+    # tipo: (por grupo, por linha)
+    'tecnico': (4.0, 0.016),
+    'gestor': (0.5, 0.0),
+    'html': (3.0, 0.017),
+    'xlsx': (14.0, 0.32),
+    'pdf': (0.0, 4.3),
+}
+REPORT_FORMATS = ('html', 'xlsx', 'pdf')
+
+# tecnicos = [(técnico, html, texto)]; gestores = [(unidade, data, assunto, html, texto)]
+MailPayloads = namedtuple('MailPayloads', ['tecnicos', 'gestores'])
+
+_REPORT_HTML = """<!DOCTYPE html>
+<html>
+    <head>
+        <meta charset="utf-8">
+        <title>Escala - %(tecnico)s</title>
+    </head>
+    <body>
+        <h2>Escala - %(tecnico)s</h2>
+        <p>%(periodo)s</p>
+%(tabela)s    </body>
+</html>
+"""
+
+# Em cada processo do pool: o DataFrame compartilhado (só leitura)
+_frame = None
+# QGuiApplication criada para o PDF em processos sem interface
+_qt_app = None
+
+
+def _init_worker(frame):
+    global _frame
+    _frame = frame
+
+
+# --------------------------------------------------
+#          TAREFAS (rodam nos processos do pool)
+# --------------------------------------------------
+def _render_technician(frame, tecnico, positions):
+    html_body, text_body = render_escala_tecnico(tecnico, frame.iloc[positions])
+    return tecnico, html_body, text_body
+
+
+def _render_manager(frame, unidade, data_visita, positions, modelo):
+    group = frame.iloc[positions]
+    horario_visita = group['DATA/HORA INICIO'].iloc[0].strftime('%H:%M')
+    assunto, html_body, text_body = render_visita_gestor(
+        modelo, group['TÉCNICO'].unique(), unidade, data_visita, horario_visita
+    )
+    return unidade, data_visita, assunto, html_body, text_body
+
+
+def _file_stem(tecnico):
+    return 'escala_' + safe_file_stem(tecnico)
+
+
+def _periodo(group):
+    inicio = group['DATA/HORA INICIO'].dropna()
+    if inicio.empty:
+        return ''
+    return f"Período: {inicio.min().strftime('%d/%m/%Y')} a {inicio.max().strftime('%d/%m/%Y')}"
+
+
+def _write_pdf(document_html, path):
+    """HTML -> PDF pelo QTextDocument/QPrinter do Qt (sem programas externos)."""
+    global _qt_app
+    if threading.current_thread() is not threading.main_thread():
+        # QTextDocument/QPrinter só na thread principal do processo (ver _run)
+        raise RuntimeError("PDF só pode ser gerado na thread principal do processo")
+    from PyQt5.QtGui import QGuiApplication, QTextDocument
+    from PyQt5.QtPrintSupport import QPrinter
+    if QGuiApplication.instance() is None:
+        # Processo do pool ou linha de comando: Qt sem janela
+        _qt_app = QGuiApplication(['relatorios', '-platform', 'offscreen'])
+    document = QTextDocument()
+    document.setHtml(document_html)
+    printer = QPrinter(QPrinter.HighResolution)
+    printer.setOutputFormat(QPrinter.PdfFormat)
+    printer.setOutputFileName(path)
+    document.print_(printer)
+
+
+def _export_technician(frame, tecnico, positions, directory, formats):
+    group = frame.iloc[positions]
+    stem = os.path.join(directory, _file_stem(tecnico))
+    paths = []
+    if 'html' in formats or 'pdf' in formats:
+        document_html = _REPORT_HTML % {
+            'tecnico': html.escape(str(tecnico)), 'periodo': _periodo(group), 'tabela': render_tabela_html(group)
+        }
+        if 'html' in formats:
+            with open(stem + '.html', 'w', encoding='utf-8') as f:
+                f.write(document_html)
+            paths.append(stem + '.html')
+        if 'pdf' in formats:
+            _write_pdf(document_html, stem + '.pdf')
+            paths.append(stem + '.pdf')
+    if 'xlsx' in formats:
+        columns = [col for col in ['SEQ'] + LABELS if col in group.columns]
+        write_schedule_workbook(stem + '.xlsx', columns, frame_to_workbook_rows(group, columns))
+        paths.append(stem + '.xlsx')
+    return paths
+
+
+_TASKS = {
+    'tecnico': _render_technician,
+    'gestor': _render_manager,
+    'exportar': _export_technician,
+}
+
+
+def _run_task(task):
+    kind, args = task
+    return kind, _TASKS[kind](_frame, *args)
+
+
+# --------------------------------------------------
+#                  EXECUÇÃO
+# --------------------------------------------------
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _task_positions(kind, args):
+    return args[2] if kind == 'gestor' else args[1]
+
+
+def _estimated_ms(tasks):
+    """Tempo estimado (TASK_COST_MS) das tarefas rodando num só processo."""
+    total = 0.0
+    for kind, args in tasks:
+        rows = len(_task_positions(kind, args))
+        for cost in (args[-1] if kind == 'exportar' else (kind,)):
+            per_group, per_row = TASK_COST_MS[cost]
+            total += per_group + per_row * rows
+    return total
+
+
+def _renders_pdf(tasks):
+    return any(kind == 'exportar' and 'pdf' in args[-1] for kind, args in tasks)
+
+
+def _run(frame, tasks, workers=None, progress=None):
+    """
+    Executa `tasks` ([(tipo, args)]) sobre `frame`; devolve [(tipo, resultado)]
+    na ordem das tarefas. `progress(feitas, total)` a cada resultado.
+    """
+    workers = min(workers or default_workers(), len(tasks))
+    # Com N processos o trabalho cai para 1/N, mas paga a subida do pool
+    parallel = workers > 1 and _estimated_ms(tasks) * (1 - 1 / workers) > POOL_STARTUP_MS
+    if not parallel and _renders_pdf(tasks) and threading.current_thread() is not threading.main_thread():
+        # Numa thread de fundo (tarefa das telas) o Qt não pode imprimir:
+        # o PDF vai para um processo à parte, mesmo com poucos grupos
+        parallel = True
+    results = []
+    with span('relatorios', rows=len(frame), grupos=len(tasks), processos=workers if parallel else 1):
+        if not parallel:
+            for kind, args in tasks:
+                results.append((kind, _TASKS[kind](frame, *args)))
+                if progress:
+                    progress(len(results), len(tasks))
+            return results
+
+        # spawn em todas as plataformas: fork de um processo com Qt e threads não é seguro
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(frame,)
+        ) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            try:
+                for result in pool.map(_run_task, tasks, chunksize=chunksize):
+                    results.append(result)
+                    if progress:
+                        progress(len(results), len(tasks))
+            except BaseException:
+                # Cancelado (ou erro): não espera o resto das tarefas
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    return results
+
+
+def _shared_frame(df):
+    """Só as colunas usadas, com posições 0..n-1 (as tarefas usam iloc)."""
+    columns = [col for col in ['SEQ'] + LABELS if col in df.columns]
+    return df[columns].reset_index(drop=True)
+
+
+def _technician_groups(frame, tecnicos=None):
+    indices = frame.groupby('TÉCNICO', sort=True).indices
+    return [(tecnico, indices[tecnico]) for tecnico in sorted(indices)
+            if tecnicos is None or tecnico in tecnicos]
+
+
+def render_mail_payloads(df, modelo_gestor=None, tecnicos=None, unidades=None, workers=None, progress=None):
+    """
+    Renderiza os e-mails dos técnicos (só os de `tecnicos`, se informado)
+    e, com `modelo_gestor`, os avisos de visita por (UNIDADE, dia) das
+    `unidades` informadas. Retorna MailPayloads, em ordem de técnico /
+    (unidade, dia).
+    """
+    frame = _shared_frame(df)
+    tasks = [('tecnico', (tecnico, positions)) for tecnico, positions in _technician_groups(frame, tecnicos)]
+    if modelo_gestor is not None:
+        dias = frame.assign(DATA=frame['DATA/HORA INICIO'].dt.date).groupby(['UNIDADE', 'DATA'], sort=True).indices
+        tasks.extend(
+            ('gestor', (unidade, data_visita, dias[(unidade, data_visita)], modelo_gestor))
+            for unidade, data_visita in sorted(dias)
+            if unidades is None or unidade in unidades
+        )
+    if not tasks:
+        return MailPayloads([], [])
+    results = _run(frame, tasks, workers, progress)
+    return MailPayloads(
+        [result for kind, result in results if kind == 'tecnico'],
+        [result for kind, result in results if kind == 'gestor'],
+    )
+
+
+def export_technician_reports(df, directory, formats=REPORT_FORMATS, workers=None, progress=None):
+    """
+    Grava os relatórios de cada técnico de `df` em `directory` nos
+    `formats` pedidos (html, xlsx, pdf). Retorna os caminhos gravados.
+    """
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Formato de relatório desconhecido: {', '.join(sorted(unknown))}")
+    os.makedirs(directory, exist_ok=True)
+    frame = _shared_frame(df)
+    tasks = [
+        ('exportar', (tecnico, positions, directory, tuple(formats)))
+        for tecnico, positions in _technician_groups(frame)
+    ]
+    if not tasks:
+        return []
+    return [path for _, paths in _run(frame, tasks, workers, progress) for path in paths]
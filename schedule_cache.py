@@ -0,0 +1,156 @@
+"""
+Cache em memória das escalas, compartilhado por todas as telas do processo.
+
+Guarda, por planilha, o DataFrame já tipado (SEQ + LABELS, datas como
+datetime64) junto com o mtime/tamanho do arquivo em que foi lido. Enquanto
+a planilha não muda, consultas e envios de e-mail usam o DataFrame da
+memória; se alguém altera o arquivo por fora, a próxima leitura recarrega.
+As gravações feitas pelo próprio sistema atualizam o cache na hora
+(record_appended / record_saved), sem reler nada.
+
+O DataFrame devolvido por load_frame é compartilhado: quem for alterá-lo
+deve trabalhar numa cópia.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import span
+from planilha_io import LABELS, ensure_typed_dates
+from schedule_store import COLUMNS, open_store
+
+_entries = {}
+_lock = threading.RLock()
+
+
+class _Entry:
+    __slots__ = ('frame', 'stat')
+
+    def __init__(self, frame, stat):
+        self.frame = frame
+        self.stat = stat
+
+
+def planilha_stat(planilha_path):
+    """(mtime_ns, tamanho) da planilha, ou None se ela não existe."""
+    try:
+        st = os.stat(planilha_path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_frame(planilha_path):
+    """Todas as escalas da planilha (tipadas); relê só se o arquivo mudou."""
+    key = os.path.abspath(planilha_path)
+    with _lock:
+        entry = _entries.get(key)
+        stat = planilha_stat(planilha_path)
+        if entry is not None and stat is not None and entry.stat == stat:
+            return entry.frame
+        with span('carregar_escalas') as s:
+            frame = open_store(planilha_path).load_all()
+            s.set(rows=len(frame))
+        _entries[key] = _Entry(frame, planilha_stat(planilha_path))
+        return frame
+
+
+def query(planilha_path, start=None, end=None, tecnicos=None, tecnico_contains=None, unidade_contains=None):
+    """
+    Mesmos filtros de ScheduleStore.query, aplicados ao DataFrame em memória.
+    Se a planilha ainda não está no cache (ou mudou), a consulta vai direto
+    ao banco, que lê só as linhas pedidas em vez de carregar tudo.
+    Retorna um DataFrame novo (pode ser alterado pelo chamador).
+    """
+    with _lock:
+        entry = _entries.get(os.path.abspath(planilha_path))
+        cached = entry is not None and entry.stat == planilha_stat(planilha_path)
+    if not cached:
+        return open_store(planilha_path).query(
+            start=start, end=end, tecnicos=tecnicos,
+            tecnico_contains=tecnico_contains, unidade_contains=unidade_contains
+        )
+    df = load_frame(planilha_path)
+    mask = np.ones(len(df), dtype=bool)
+    inicio = df['DATA/HORA INICIO']
+    if start is not None:
+        mask &= (inicio >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (inicio <= pd.Timestamp(end)).to_numpy()
+    if tecnicos:
+        mask &= df['TÉCNICO'].isin(tecnicos).to_numpy()
+    for column, text in (('TÉCNICO', tecnico_contains), ('UNIDADE', unidade_contains)):
+        if text:
+            values = df[column].fillna('').astype(str).str.casefold()
+            mask &= values.str.contains(text.casefold(), regex=False).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+def invalidate(planilha_path):
+    with _lock:
+        _entries.pop(os.path.abspath(planilha_path), None)
+
+
+def _update(planilha_path, stat_before, apply):
+    """
+    Aplica `apply(frame) -> frame` à entrada em cache, se ela ainda
+    corresponde à planilha de antes da gravação; senão descarta a entrada
+    (a planilha foi alterada por fora e a próxima leitura recarrega).
+    """
+    key = os.path.abspath(planilha_path)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return
+        if entry.stat != stat_before:
+            del _entries[key]
+            return
+        entry.frame = apply(entry.frame)
+        entry.stat = planilha_stat(planilha_path)
+
+
+def _typed_rows(rows, labels, seqs):
+    """Linhas do ScheduleForm (datas em texto ou datetime) -> DataFrame no formato do cache."""
+    df = pd.DataFrame([list(fields) for fields in rows], columns=list(labels))
+    for col in LABELS:
+        if col not in df.columns:
+            df[col] = None
+    ensure_typed_dates(df)
+    df.insert(0, 'SEQ', np.asarray(seqs, dtype='int64'))
+    return df[COLUMNS]
+
+
+def record_appended(planilha_path, stat_before, rows, labels, seqs):
+    """Acrescenta ao cache as linhas gravadas por ScheduleStore.append_rows."""
+    def apply(frame):
+        new_rows = _typed_rows(rows, labels, seqs)
+        if frame.empty:
+            return new_rows
+        return pd.concat([frame, new_rows], ignore_index=True)
+    _update(planilha_path, stat_before, apply)
+
+
+def record_exported(planilha_path, stat_before):
+    """A planilha foi regravada a partir do banco: o conteúdo em cache continua valendo."""
+    _update(planilha_path, stat_before, lambda frame: frame)
+
+
+def record_saved(planilha_path, stat_before, df_saved, deleted_seqs):
+    """Reflete no cache as exclusões e o upsert (por SEQ) da tela de consulta."""
+    def apply(frame):
+        if deleted_seqs:
+            frame = frame[~frame['SEQ'].isin([int(s) for s in deleted_seqs])]
+        saved = df_saved.reindex(columns=COLUMNS)
+        saved = saved.astype({'SEQ': 'int64'})
+        saved = saved.drop_duplicates('SEQ', keep='last').set_index('SEQ')
+
+        updated = frame.set_index('SEQ')
+        existing = saved.index.intersection(updated.index)
+        updated.loc[existing, LABELS] = saved.loc[existing, LABELS]
+        added = saved.loc[saved.index.difference(updated.index, sort=False)]
+        if len(added):
+            updated = pd.concat([updated, added[LABELS]])
+        return updated.reset_index()[COLUMNS]
+    _update(planilha_path, stat_before, apply)
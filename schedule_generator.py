@@ -0,0 +1,120 @@
+"""
+Geração da escala pré-preenchida (5X2 / 12X36) sem interface gráfica.
+
+As regras são as mesmas do ScheduleForm: dias de trabalho por técnico,
+horários de escalas_tecnicos.json (incluindo os de sobreaviso) e turno
+pela hora de início. Toda a escala do período sai de uma vez como
+DataFrame, com uma máscara de datas por técnico.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from planilha_io import LABELS
+
+TECHNICIAN_SCHEDULES_PATH = 'escalas_tecnicos.json'
+
+DIAS_SEMANA = [
+    "Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+    "Sexta-feira", "Sábado", "Domingo"
+]
+
+
+def load_technician_schedules(path=TECHNICIAN_SCHEDULES_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def does_on_call(tecnico_info):
+    """Verifica se técnico faz sobreaviso."""
+    if not tecnico_info:
+        return False
+    return tecnico_info.get('sobreaviso', {}).get('faz_sobreaviso', False)
+
+
+def horarios_tecnico(tecnico_info, localizacao='', com_unidade=False):
+    """
+    Retorna (início, fim) em 'HH:MM' para o técnico.
+    Em sobreaviso usa os horários com/sem unidade, se configurados.
+    """
+    horario_inicio = tecnico_info.get('horario_inicio', '00:00')
+    horario_fim = tecnico_info.get('horario_fim', '00:00')
+    if localizacao == 'Sobreaviso' and does_on_call(tecnico_info):
+        chave = 'horario_com_unidade' if com_unidade else 'horario_sem_unidade'
+        horarios = tecnico_info.get('sobreaviso', {}).get(chave, {})
+        horario_inicio = horarios.get('inicio', horario_inicio)
+        horario_fim = horarios.get('fim', horario_fim)
+    return horario_inicio, horario_fim
+
+
+def turno_para_hora(hora):
+    return "Diurno" if 6 <= hora < 18 else "Noturno"
+
+
+def work_mask(tecnico_info, dates, dias_12x36=None):
+    """
+    Máscara booleana (vetorizada) dos dias em `dates` (DatetimeIndex) em que o
+    técnico trabalha. `dias_12x36` é 'pares' ou 'impares' para 12X36.
+    """
+    if not tecnico_info:
+        return np.zeros(len(dates), dtype=bool)
+    escala = tecnico_info.get('escala')
+    if escala == '5X2':
+        # dayofweek: 0=Seg ... 6=Dom; o JSON usa 1=Seg ... 7=Dom
+        return np.isin(dates.dayofweek + 1, tecnico_info.get('dias_trabalho', []))
+    if escala == '12X36':
+        if dias_12x36 == 'pares':
+            return np.asarray(dates.day % 2 == 0)
+        if dias_12x36 == 'impares':
+            return np.asarray(dates.day % 2 != 0)
+    return np.zeros(len(dates), dtype=bool)
+
+
+def should_work(tecnico_info, date, dias_12x36=None):
+    """Verifica se técnico deve trabalhar numa data (5x2 ou 12x36)."""
+    return bool(work_mask(tecnico_info, pd.DatetimeIndex([date]), dias_12x36)[0])
+
+
+def horario_offset(horario):
+    """'HH:MM' -> Timedelta desde a meia-noite."""
+    horas, minutos = horario.split(':')[:2]
+    return pd.Timedelta(hours=int(horas), minutes=int(minutos))
+
+
+def generate_schedule(technician_schedules, periodo_inicio, periodo_fim, selected_tecnicos,
+                      localizacao='', unidade=''):
+    """
+    Gera as linhas (colunas LABELS) de todos os técnicos selecionados no período.
+
+    `selected_tecnicos` é {técnico: 'pares' | 'impares' | None} como em
+    TechnicianSelectionDialog. As datas saem como datetime64; a ordem é
+    técnico a técnico, dia a dia.
+    """
+    dates = pd.date_range(pd.Timestamp(periodo_inicio), pd.Timestamp(periodo_fim), freq='D')
+    frames = []
+    for tecnico, dias_12x36 in selected_tecnicos.items():
+        tecnico_info = technician_schedules.get(tecnico, {})
+        work_dates = dates[work_mask(tecnico_info, dates, dias_12x36)]
+        if len(work_dates) == 0:
+            continue
+        horario_inicio, horario_fim = horarios_tecnico(tecnico_info, localizacao, bool(unidade))
+        inicio = work_dates + horario_offset(horario_inicio)
+        fim = work_dates + horario_offset(horario_fim)
+        fim = fim.where(fim > inicio, fim + pd.Timedelta(days=1))
+        frames.append(pd.DataFrame({
+            'DIA DA SEMANA': np.asarray(DIAS_SEMANA, dtype=object)[inicio.dayofweek],
+            'LOCALIZAÇÃO': localizacao,
+            'UNIDADE': unidade,
+            'TÉCNICO': tecnico,
+            'ESCALA': tecnico_info.get('escala', '-'),
+            'TURNO': turno_para_hora(int(horario_inicio.split(':')[0])),
+            'DATA/HORA INICIO': inicio,
+            'DATA/HORA FIM': fim,
+            'JUSTIFICATIVA': '',
+            'CARD': '',
+        }))
+    if not frames:
+        return pd.DataFrame(columns=LABELS)
+    return pd.concat(frames, ignore_index=True)[LABELS]
+
@@ -0,0 +1,89 @@
+"""
+Montagem dos e-mails de escala a partir das linhas consultadas.
+
+Usado pelas telas (ConsultaEscalaDialog / ScheduleForm) e pela linha de
+comando: recebe o DataFrame do período e devolve as OutgoingMail prontas
+para a fila, junto com os nomes sem e-mail cadastrado.
+"""
+import datetime
+
+from email_dispatch import OutgoingMail
+from email_templates import GESTOR_MODELOS
+
+# --------------------------------------------------
+#                DICIONÁRIOS DE E-MAIL
+# --------------------------------------------------
+unit_manager_emails = {
+    "HM Benedicto": "gessica.neves@libertyti.com.br",
+    "HM Campo Limpo": "eduardo.lima@libertyti.com.br",
+    "HM Tatuape": "vinicius.santos@libertyti.com.br",
+    "HM Tide": "natalia.lima@libertyti.com.br",
+    # ... (se houver mais unidades, pode acrescentar aqui)
+}
+
+technician_emails = {
+    "Allef Barbosa": "vinicius.santos@libertyti.com.br",
+    "Eduardo Lima": "vinicius.santos@libertyti.com.br",
+    "Kaue Rodrigues": "kaue.rodrigues@libertyti.com.br",
+    "Geovanna Oliveira": "vinicius.santos@libertyti.com.br",
+    "Gustavo Silva": "gustavo.silva@libertyti.com.br",
+    "Vitor Martins": "vitor.martins@libertyti.com.br",
+    "Mateus Marinho": "vinicius.santos@libertyti.com.br",
+    "Joao Marinho": "vinicius.santos@libertyti.com.br",
+    "Andre Assis": "vinicius.santos@libertyti.com.br",
+    "Valdemir Araujo": "vinicius.santos@libertyti.com.br"
+}
+
+
+def periodo_texto(periodo_inicio, periodo_fim):
+    """Identificação do período usada na fila de envio ('dd/mm/aaaa-dd/mm/aaaa')."""
+    return f"{periodo_inicio.strftime('%d/%m/%Y')}-{periodo_fim.strftime('%d/%m/%Y')}"
+
+
+def _technician_mails(payloads, periodo):
+    return [
+        OutgoingMail(technician_emails[tecnico], "Escala Semanal", html_body, text_body=text_body, period=periodo)
+        for tecnico, html_body, text_body in payloads
+    ]
+
+
+def _manager_mails(payloads, modelo_gestor):
+    hora_envio = GESTOR_MODELOS[modelo_gestor]['hora_envio']
+    return [
+        OutgoingMail(
+            unit_manager_emails[unidade], assunto, html_body, text_body=text_body,
+            send_time=datetime.datetime.combine(data_visita, datetime.time(hora_envio, 0)),
+            period=data_visita.strftime('%d/%m/%Y')
+        )
+        for unidade, data_visita, assunto, html_body, text_body in payloads
+    ]
+
+
+def _missing_technicians(df):
+    return [tecnico for tecnico in sorted(df['TÉCNICO'].dropna().unique()) if not technician_emails.get(tecnico)]
+
+
+def _missing_managers(df):
+    """Uma entrada por (unidade, dia) sem e-mail de gestor, como os avisos que não serão enviados."""
+    dias = df.assign(DATA=df['DATA/HORA INICIO'].dt.date).groupby(['UNIDADE', 'DATA']).size().index
+    return [unidade for unidade, _ in dias if not unit_manager_emails.get(unidade)]
+
+
+def build_schedule_mails(df, periodo, modelo_gestor=None, progress=None):
+    """
+    Mensagens dos técnicos e (com `modelo_gestor`) dos gestores, renderizadas
+    numa rodada só do report_pipeline (em vários processos se forem muitas).
+    Retorna (mails dos técnicos, técnicos sem e-mail, mails dos gestores,
+    unidades sem e-mail de gestor).
+    """
+    from report_pipeline import render_mail_payloads
+    payloads = render_mail_payloads(
+        df, modelo_gestor,
+        tecnicos={tecnico for tecnico, email in technician_emails.items() if email},
+        unidades={unidade for unidade, email in unit_manager_emails.items() if email},
+        progress=progress
+    )
+    manager_mails = _manager_mails(payloads.gestores, modelo_gestor) if modelo_gestor else []
+    missing_managers = _missing_managers(df) if modelo_gestor else []
+    return _technician_mails(payloads.tecnicos, periodo), _missing_technicians(df), manager_mails, missing_managers
+
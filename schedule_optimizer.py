@@ -0,0 +1,251 @@
+"""
+Escala otimizada: distribui unidades e sobreavisos entre os técnicos.
+
+Entrada:
+  - técnicos selecionados e suas regras (5X2 / 12X36) de escalas_tecnicos.json;
+  - demandas por unidade (demandas_unidades.json), no formato
+        {
+          "unidades": {"HM Tide": {"dias": [1, 3, 5], "tecnicos": 1}, ...},
+          "sobreaviso": {"dias": [6, 7], "tecnicos": 1}
+        }
+    com os dias da semana como em dias_trabalho (1=Seg ... 7=Dom).
+
+Solução em duas etapas, determinística:
+  1. sobreavisos, dia a dia, para quem faz sobreaviso e tem menos
+     plantões até ali; sobreaviso de domingo gera Folga na segunda
+     (mesma regra do add_entry), e o técnico fica fora da segunda;
+  2. unidades, dia a dia, para o técnico disponível com menor carga
+     proporcional aos dias trabalhados, seguido de busca local (trocar o
+     técnico de uma visita por um livre no dia, ou trocar as unidades de
+     dois técnicos no mesmo dia) enquanto a distribuição melhorar.
+O custo é a soma dos quadrados dos desvios de carga de cada técnico mais
+uma penalidade por repetir a mesma unidade, para variar as visitas.
+"""
+import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from planilha_io import LABELS
+from schedule_generator import (
+    DIAS_SEMANA, does_on_call, horario_offset, horarios_tecnico, turno_para_hora, work_mask
+)
+
+UNIT_DEMANDS_PATH = 'demandas_unidades.json'
+
+# Peso da repetição de unidade frente ao desequilíbrio de carga
+REPEAT_WEIGHT = 0.25
+MAX_SEARCH_PASSES = 50
+
+# Linhas geradas e o resumo: faltas = [(data, unidade ou 'Sobreaviso', quantos faltaram)],
+# carga = {técnico: (visitas a unidades, sobreavisos)}
+OptimizedSchedule = namedtuple('OptimizedSchedule', ['frame', 'faltas', 'carga'])
+
+
+def load_unit_demands(path=UNIT_DEMANDS_PATH):
+    """Lê e valida o arquivo de demandas. ValueError com a mensagem se estiver inválido."""
+    with open(path, 'r', encoding='utf-8') as f:
+        demands = json.load(f)
+
+    def check(nome, item):
+        dias = item.get('dias', [])
+        if not all(isinstance(d, int) and 1 <= d <= 7 for d in dias):
+            raise ValueError(f"{nome}: 'dias' deve ter números de 1 (segunda) a 7 (domingo).")
+        if not isinstance(item.get('tecnicos', 1), int) or item.get('tecnicos', 1) < 0:
+            raise ValueError(f"{nome}: 'tecnicos' deve ser um número inteiro.")
+
+    for unidade, item in demands.get('unidades', {}).items():
+        check(unidade, item)
+    check('sobreaviso', demands.get('sobreaviso', {}))
+    return demands
+
+
+def _demand_on(item, dates):
+    """Quantos técnicos a demanda pede em cada data (array)."""
+    dias = np.isin(dates.dayofweek + 1, item.get('dias', []))
+    return np.where(dias, item.get('tecnicos', 1), 0)
+
+
+class _Solver:
+    def __init__(self, technician_schedules, dates, selected_tecnicos, demands):
+        self.dates = dates
+        self.tecnicos = list(selected_tecnicos)
+        self.infos = [technician_schedules.get(t, {}) for t in self.tecnicos]
+        self.units = list(demands.get('unidades', {}))
+        n_tec, n_days = len(self.tecnicos), len(dates)
+
+        self.available = np.array(
+            [work_mask(info, dates, selected_tecnicos[t]) for t, info in zip(self.tecnicos, self.infos)],
+            dtype=bool
+        ).reshape(n_tec, n_days)
+        self.can_on_call = np.array([does_on_call(info) for info in self.infos], dtype=bool)
+        self.unit_demand = np.array(
+            [_demand_on(demands['unidades'][u], dates) for u in self.units], dtype=np.int64
+        ).reshape(len(self.units), n_days)
+        self.on_call_demand = _demand_on(demands['sobreaviso'], dates) if 'sobreaviso' in demands \
+            else np.zeros(n_days, dtype=np.int64)
+
+        self.on_call = np.zeros((n_tec, n_days), dtype=bool)
+        self.folga = np.zeros((n_tec, n_days), dtype=bool)
+        self.folga_after_period = []      # técnicos com Folga no dia seguinte ao período
+        self.unit_of = np.full((n_tec, n_days), -1, dtype=np.int64)
+        self.faltas = []
+
+    # ---- 1. SOBREAVISO ----
+    def assign_on_call(self):
+        count = np.zeros(len(self.tecnicos), dtype=np.int64)
+        last = np.full(len(self.tecnicos), -1, dtype=np.int64)
+        for day, needed in enumerate(self.on_call_demand):
+            if not needed:
+                continue
+            candidates = [t for t in np.flatnonzero(self.can_on_call) if not self.folga[t, day]]
+            # Menos plantões primeiro; empate: quem está há mais tempo sem plantão
+            candidates.sort(key=lambda t: (count[t], last[t], self.tecnicos[t]))
+            for t in candidates[:needed]:
+                self.on_call[t, day] = True
+                count[t] += 1
+                last[t] = day
+                if self.dates[day].dayofweek == 6:
+                    if day + 1 < len(self.dates):
+                        self.folga[t, day + 1] = True
+                    else:
+                        self.folga_after_period.append(t)
+            if len(candidates) < needed:
+                self.faltas.append((self.dates[day].date(), 'Sobreaviso', int(needed - len(candidates))))
+
+    # ---- 2. UNIDADES ----
+    def _targets(self, free):
+        days = free.sum(axis=1).astype(float)
+        total = float((self.unit_of >= 0).sum())
+        return total * days / days.sum() if days.sum() else np.zeros(len(self.tecnicos))
+
+    def assign_units(self):
+        free = self.available & ~self.folga
+        days = np.maximum(free.sum(axis=1), 1)
+        load = np.zeros(len(self.tecnicos), dtype=np.int64)
+        visits = np.zeros((len(self.tecnicos), len(self.units)), dtype=np.int64)
+        for day in range(len(self.dates)):
+            for u in range(len(self.units)):
+                for _ in range(self.unit_demand[u, day]):
+                    candidates = np.flatnonzero(free[:, day] & (self.unit_of[:, day] < 0))
+                    if not len(candidates):
+                        self.faltas.append((self.dates[day].date(), self.units[u], 1))
+                        continue
+                    t = min(candidates, key=lambda c: (load[c] / days[c], visits[c, u], self.tecnicos[c]))
+                    self.unit_of[t, day] = u
+                    load[t] += 1
+                    visits[t, u] += 1
+        self._merge_faltas()
+        self.local_search(free, load, visits)
+
+    def _merge_faltas(self):
+        merged = {}
+        for data, unidade, n in self.faltas:
+            merged[(data, unidade)] = merged.get((data, unidade), 0) + n
+        self.faltas = [(data, unidade, n) for (data, unidade), n in sorted(merged.items())]
+
+    def local_search(self, free, load, visits):
+        target = self._targets(free)
+        w = REPEAT_WEIGHT
+        for _ in range(MAX_SEARCH_PASSES):
+            improved = False
+            for day in range(len(self.dates)):
+                assigned = np.flatnonzero(self.unit_of[:, day] >= 0)
+                idle = np.flatnonzero(free[:, day] & (self.unit_of[:, day] < 0))
+                for a in assigned:
+                    u = self.unit_of[a, day]
+                    if u < 0:
+                        # Já passou a visita para outro técnico nesta rodada
+                        continue
+                    # Passa a visita de `a` para um técnico livre no dia
+                    for b in idle:
+                        delta = (2 * (load[b] - target[b]) - 2 * (load[a] - target[a]) + 2
+                                 + w * (2 * visits[b, u] - 2 * visits[a, u] + 2))
+                        if delta < -1e-9:
+                            self.unit_of[a, day], self.unit_of[b, day] = -1, u
+                            load[a] -= 1
+                            load[b] += 1
+                            visits[a, u] -= 1
+                            visits[b, u] += 1
+                            idle = np.flatnonzero(free[:, day] & (self.unit_of[:, day] < 0))
+                            improved = True
+                            break
+                    else:
+                        # Troca as unidades de dois técnicos no mesmo dia
+                        for b in assigned:
+                            v = self.unit_of[b, day]
+                            if b == a or v == u or v < 0:
+                                continue
+                            delta = w * 2 * (visits[a, v] + visits[b, u] - visits[a, u] - visits[b, v] + 2)
+                            if delta < -1e-9:
+                                self.unit_of[a, day], self.unit_of[b, day] = v, u
+                                visits[a, u] -= 1
+                                visits[a, v] += 1
+                                visits[b, v] -= 1
+                                visits[b, u] += 1
+                                improved = True
+                                break
+            if not improved:
+                break
+
+    # ---- SAÍDA ----
+    def _row(self, t, date, localizacao, unidade, justificativa='', com_unidade=False):
+        info = self.infos[t]
+        horario_inicio, horario_fim = horarios_tecnico(info, localizacao, com_unidade)
+        inicio = pd.Timestamp(date) + horario_offset(horario_inicio)
+        fim = pd.Timestamp(date) + horario_offset(horario_fim)
+        if fim <= inicio:
+            fim += pd.Timedelta(days=1)
+        return {
+            'DIA DA SEMANA': DIAS_SEMANA[inicio.dayofweek],
+            'LOCALIZAÇÃO': localizacao,
+            'UNIDADE': unidade,
+            'TÉCNICO': self.tecnicos[t],
+            'ESCALA': info.get('escala', '-'),
+            'TURNO': turno_para_hora(inicio.hour),
+            'DATA/HORA INICIO': inicio,
+            'DATA/HORA FIM': fim,
+            'JUSTIFICATIVA': justificativa,
+            'CARD': '',
+        }
+
+    def rows(self):
+        rows = []
+        for t in range(len(self.tecnicos)):
+            for day, date in enumerate(self.dates):
+                u = self.unit_of[t, day]
+                unidade = self.units[u] if u >= 0 else ''
+                if self.folga[t, day]:
+                    rows.append(self._row(t, date, 'Folga', '', 'Folga após sobreaviso'))
+                elif self.on_call[t, day]:
+                    rows.append(self._row(t, date, 'Sobreaviso', unidade, com_unidade=bool(unidade)))
+                elif unidade:
+                    rows.append(self._row(t, date, 'Unidade', unidade))
+                elif self.available[t, day]:
+                    rows.append(self._row(t, date, '', ''))
+            if t in self.folga_after_period:
+                rows.append(self._row(t, self.dates[-1] + pd.Timedelta(days=1), 'Folga', '', 'Folga após sobreaviso'))
+        if not rows:
+            return pd.DataFrame(columns=LABELS)
+        return pd.DataFrame(rows, columns=LABELS)
+
+    def carga(self):
+        visitas = (self.unit_of >= 0).sum(axis=1)
+        plantoes = self.on_call.sum(axis=1)
+        return {t: (int(visitas[i]), int(plantoes[i])) for i, t in enumerate(self.tecnicos)}
+
+
+def optimize_schedule(technician_schedules, periodo_inicio, periodo_fim, selected_tecnicos, demands):
+    """
+    Escala do período com unidades e sobreavisos distribuídos.
+
+    `selected_tecnicos` é {técnico: 'pares' | 'impares' | None} como em
+    generate_schedule; `demands` vem de load_unit_demands. Retorna
+    OptimizedSchedule (DataFrame com as colunas LABELS, faltas, carga).
+    """
+    dates = pd.date_range(pd.Timestamp(periodo_inicio).normalize(), pd.Timestamp(periodo_fim).normalize(), freq='D')
+    solver = _Solver(technician_schedules, dates, selected_tecnicos, demands)
+    solver.assign_on_call()
+    solver.assign_units()
+    return OptimizedSchedule(solver.rows(), solver.faltas, solver.carga())
@@ -0,0 +1,481 @@
+"""
+Armazenamento local das escalas em SQLite.
+
+O banco fica ao lado da planilha (<planilha>.escalas.sqlite) e é a fonte
+das consultas e gravações. A planilha .xlsx passa a ser só formato de
+troca: é importada quando alguém a altera por fora e regravada só quando
+pedido (export_excel / export_pending: ao fechar o programa, pelo menu
+Relatórios da consulta ou no fim de um comando da linha de comando). As
+gravações do dia a dia mexem só no banco e marcam a exportação como
+pendente; enquanto houver exportação pendente, alterações feitas por fora
+na planilha não são importadas (o banco prevalece e a próxima exportação
+as sobrescreve).
+
+Números (ex.: CARD) são guardados como números: as colunas das escalas
+não têm tipo declarado, então o SQLite guarda o valor como veio.
+
+Colunas que o usuário acrescentou à planilha (fora de SEQ + LABELS) não
+entram nas consultas, mas são guardadas na importação (cabeçalho na tabela
+meta, valores de cada linha em EXTRAS) e voltam, na mesma posição, quando
+a planilha é regravada.
+"""
+import os
+import json
+import sqlite3
+import datetime
+import functools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import span
+from planilha_io import (
+    LABELS, DATE_COLUMNS, iter_schedule_rows, ensure_typed_dates, extra_columns, parse_cell_datetime,
+    parse_datetime_series, read_header, write_schedule_workbook
+)
+
+DB_SUFFIX = '.escalas.sqlite'
+SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+COLUMNS = ['SEQ'] + LABELS
+# Valores das colunas extras da planilha de cada linha (JSON), ver _encode_extras
+EXTRAS_COLUMN = 'EXTRAS'
+# 2: colunas sem tipo declarado (números continuam números) e coluna EXTRAS
+SCHEMA_VERSION = '2'
+
+# Colunas indexadas (além de SEQ).
+INDEXED_COLUMNS = {
+    'idx_escalas_tecnico': 'TÉCNICO',
+    'idx_escalas_unidade': 'UNIDADE',
+    'idx_escalas_inicio': 'DATA/HORA INICIO',
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _contains(value, text):
+    """Função SQL: substring sem diferenciar maiúsculas (inclui acentos)."""
+    if value is None or text is None:
+        return 0
+    return 1 if text.casefold() in str(value).casefold() else 0
+
+
+def _to_sql_value(column, value):
+    if value is None or value is pd.NaT:
+        return None
+    if not isinstance(value, str) and pd.isna(value):
+        return None
+    if column in DATE_COLUMNS:
+        if isinstance(value, str):
+            value = parse_cell_datetime(value)
+            if value is None:
+                return None
+        return value.strftime(SQL_DATE_FORMAT)
+    if column == 'SEQ':
+        return int(value)
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return str(value)
+
+
+def _json_default(value):
+    # Datas/horas das colunas extras: guardadas em ISO e restauradas como tal
+    for kind in (datetime.datetime, datetime.date, datetime.time):
+        if isinstance(value, kind):
+            return {'$tipo': kind.__name__, 'valor': value.isoformat()}
+    return str(value)
+
+
+def _json_object(obj):
+    kinds = {'datetime': datetime.datetime, 'date': datetime.date, 'time': datetime.time}
+    if set(obj) == {'$tipo', 'valor'} and obj['$tipo'] in kinds:
+        return kinds[obj['$tipo']].fromisoformat(obj['valor'])
+    return obj
+
+
+def _encode_extras(values):
+    if not values or all(value is None for value in values):
+        return None
+    return json.dumps(values, default=_json_default, ensure_ascii=False)
+
+
+def _decode_extras(text, count):
+    values = json.loads(text, object_hook=_json_object) if text else []
+    return (values + [None] * count)[:count]
+
+
+def _locked(method):
+    """Serializa o acesso à conexão (o store é usado pela thread de I/O e pela interface)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def store_path(planilha_path):
+    """Caminho do banco da planilha (<planilha>.escalas.sqlite)."""
+    return os.path.splitext(planilha_path)[0] + DB_SUFFIX
+
+
+def open_store(planilha_path):
+    """Retorna o ScheduleStore da planilha (um por caminho no processo)."""
+    key = os.path.abspath(planilha_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ScheduleStore(planilha_path)
+            _stores[key] = store
+    return store
+
+
+class ScheduleStore:
+    """Tabela de escalas indexada por SEQ, TÉCNICO, UNIDADE e DATA/HORA INICIO."""
+
+    def __init__(self, planilha_path, db_path=None):
+        self.planilha_path = planilha_path
+        self.db_path = db_path or store_path(planilha_path)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.create_function('contains_ci', 2, _contains, deterministic=True)
+        self._create_schema()
+
+    def _create_schema(self):
+        # Sem tipo declarado nas colunas das escalas: com TEXT o SQLite
+        # converteria os números (CARD etc.) em texto
+        types = {'SEQ': ' INTEGER', EXTRAS_COLUMN: ' TEXT'}
+        columns_sql = ', '.join(f"{_quote(col)}{types.get(col, '')}" for col in COLUMNS + [EXTRAS_COLUMN])
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            if self._meta('versao_esquema') != SCHEMA_VERSION:
+                # Banco de uma versão anterior (sempre igual à planilha, que
+                # era regravada a cada gravação): recria e reimporta
+                self.conn.execute("DROP TABLE IF EXISTS escalas")
+                self.conn.execute("DELETE FROM meta")
+                self._set_meta('versao_esquema', SCHEMA_VERSION)
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS escalas ({columns_sql})")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_escalas_seq ON escalas (SEQ)")
+            for index_name, column in INDEXED_COLUMNS.items():
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON escalas ({_quote(column)})"
+                )
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT valor FROM meta WHERE chave = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        if value is None:
+            self.conn.execute("DELETE FROM meta WHERE chave = ?", (key,))
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (key, value))
+
+    # --------------------------------------------------
+    #        SINCRONIZAÇÃO COM A PLANILHA (.xlsx)
+    # --------------------------------------------------
+    def _planilha_stat(self):
+        try:
+            st = os.stat(self.planilha_path)
+        except FileNotFoundError:
+            return None
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _remember_planilha_stat(self):
+        with self.conn:
+            self._set_meta('planilha_stat', self._planilha_stat())
+            self._set_meta('exportacao_pendente', None)
+
+    def _mark_export_pending(self):
+        # Chamado dentro da transação da gravação
+        self._set_meta('exportacao_pendente', '1')
+
+    @_locked
+    def is_synced(self):
+        return self._meta('planilha_stat') == self._planilha_stat()
+
+    @_locked
+    def has_pending_export(self):
+        """True se o banco tem gravações que ainda não foram para a planilha."""
+        return self._meta('exportacao_pendente') is not None
+
+    @_locked
+    def sync_from_excel(self, force=False):
+        """
+        Reimporta a planilha se ela mudou desde a última importação/exportação.
+        Com exportação pendente o banco prevalece (só `force` reimporta).
+        """
+        if not os.path.exists(self.planilha_path):
+            return False
+        if not force and (self.is_synced() or self.has_pending_export()):
+            return False
+        self.import_excel()
+        return True
+
+    @_locked
+    def import_excel(self):
+        """
+        Substitui o banco pelo conteúdo da planilha, lida em partes
+        (planilha_io.iter_schedule_rows): a folha inteira nunca fica na
+        memória. Linhas sem SEQ numérico recebem SEQ depois do maior lido.
+        O cabeçalho e os valores das colunas extras são guardados para
+        export_excel.
+        """
+        insert_sql = self._insert_sql(COLUMNS + [EXTRAS_COLUMN])
+        header = read_header(self.planilha_path)
+        max_seq = 0
+        with self.conn, span('leitura_planilha', modo='importar') as s:
+            self.conn.execute("DELETE FROM escalas")
+            self._set_meta('planilha_cabecalho', json.dumps(header, ensure_ascii=False))
+            count = 0
+            for chunk in iter_schedule_rows(self.planilha_path, extras=True):
+                seqs = [record[0] for record in chunk if record[0] is not None]
+                if seqs:
+                    max_seq = max(max_seq, max(seqs))
+                self.conn.executemany(insert_sql, (
+                    tuple(_to_sql_value(col, value) for col, value in zip(COLUMNS, record))
+                    + (_encode_extras(record[-1]),)
+                    for record in chunk
+                ))
+                count += len(chunk)
+            s.set(rows=count)
+            missing = [rowid for (rowid,) in self.conn.execute(
+                "SELECT rowid FROM escalas WHERE SEQ IS NULL ORDER BY rowid"
+            )]
+            self.conn.executemany(
+                "UPDATE escalas SET SEQ = ? WHERE rowid = ?",
+                ((max_seq + offset, rowid) for offset, rowid in enumerate(missing, start=1))
+            )
+        self._remember_planilha_stat()
+
+    def _insert_sql(self, columns):
+        return (
+            f"INSERT INTO escalas ({', '.join(_quote(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+
+    def _export_header(self):
+        """
+        Cabeçalho da planilha importada (colunas extras na posição original);
+        SEQ que faltar vai para o início e os LABELS que faltarem, para o fim.
+        """
+        stored = self._meta('planilha_cabecalho')
+        header = json.loads(stored) if stored else []
+        present = {name.upper() for name in header}
+        if 'SEQ' not in present:
+            header.insert(0, 'SEQ')
+        header.extend(col for col in LABELS if col.upper() not in present)
+        return header
+
+    @_locked
+    def export_pending(self):
+        """
+        Regrava a planilha se há gravações ainda não exportadas (ou se ela
+        não existe). Retorna True se regravou.
+        """
+        if os.path.exists(self.planilha_path) and not self.has_pending_export():
+            return False
+        self.export_excel()
+        return True
+
+    @_locked
+    def export_excel(self, planilha_path=None):
+        """
+        Regrava a planilha inteira a partir do banco (write-only, datas
+        formatadas), com as colunas extras da última importação. Custa
+        O(linhas): por isso só roda quando pedido, não a cada gravação.
+        """
+        target = planilha_path or self.planilha_path
+        header = self._export_header()
+        extras = extra_columns(header)
+        known = {col.upper(): pos for pos, col in enumerate(COLUMNS)}
+        # Para cada coluna do cabeçalho: ('base', posição em COLUMNS) ou ('extra', posição em extras)
+        sources = [
+            ('base', known[name.upper()]) if name.upper() in known else ('extra', extras.index(name))
+            for name in header
+        ]
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(_quote(c) for c in COLUMNS + [EXTRAS_COLUMN])} FROM escalas ORDER BY rowid"
+        )
+        date_positions = [COLUMNS.index(col) for col in DATE_COLUMNS]
+
+        def rows():
+            for record in cursor:
+                record = list(record)
+                for pos in date_positions:
+                    if record[pos]:
+                        record[pos] = datetime.datetime.strptime(record[pos], SQL_DATE_FORMAT)
+                values = {'base': record, 'extra': _decode_extras(record[-1], len(extras))}
+                yield [values[kind][pos] for kind, pos in sources]
+
+        write_schedule_workbook(target, header, rows())
+        if target == self.planilha_path:
+            self._remember_planilha_stat()
+
+    # --------------------------------------------------
+    #                    CONSULTAS
+    # --------------------------------------------------
+    @_locked
+    def query(self, start=None, end=None, tecnicos=None, tecnico_contains=None, unidade_contains=None):
+        """
+        Retorna um DataFrame (SEQ + LABELS) só com as linhas pedidas.
+        `start`/`end` filtram DATA/HORA INICIO (inclusive); `tecnicos` é
+        uma lista de nomes exatos; os `*_contains` são substrings.
+        """
+        self.sync_from_excel()
+        where, params = [], []
+        if start is not None:
+            where.append(f"{_quote('DATA/HORA INICIO')} >= ?")
+            params.append(start.strftime(SQL_DATE_FORMAT))
+        if end is not None:
+            where.append(f"{_quote('DATA/HORA INICIO')} <= ?")
+            params.append(end.strftime(SQL_DATE_FORMAT))
+        if tecnicos:
+            where.append(f"{_quote('TÉCNICO')} IN ({', '.join('?' for _ in tecnicos)})")
+            params.extend(tecnicos)
+        if tecnico_contains:
+            where.append(f"contains_ci({_quote('TÉCNICO')}, ?)")
+            params.append(tecnico_contains)
+        if unidade_contains:
+            where.append(f"contains_ci({_quote('UNIDADE')}, ?)")
+            params.append(unidade_contains)
+
+        sql = f"SELECT {', '.join(_quote(c) for c in COLUMNS)} FROM escalas"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowid"
+
+        with span('consulta_banco') as s:
+            df = pd.read_sql_query(sql, self.conn, params=params)
+            s.set(rows=len(df))
+        with span('conversao_datas', rows=len(df)):
+            for col in DATE_COLUMNS:
+                df[col] = parse_datetime_series(df[col], formats=(SQL_DATE_FORMAT,))
+        return df
+
+    def load_all(self):
+        return self.query()
+
+    @_locked
+    def max_seq(self):
+        value = self.conn.execute("SELECT MAX(SEQ) FROM escalas").fetchone()[0]
+        return int(value) if value is not None else 0
+
+    # --------------------------------------------------
+    #                    GRAVAÇÕES
+    # --------------------------------------------------
+    @_locked
+    def append_rows(self, rows, labels=LABELS):
+        """
+        Insere linhas (listas na ordem de `labels`, datas como datetime ou
+        texto dd/mm/aaaa hh:mm:ss) com SEQ sequencial. Só o banco é gravado
+        (a planilha fica para export_pending), exceto se a planilha ainda não
+        existe: aí ela é criada já com as linhas. Retorna os SEQ gerados.
+        """
+        rows = list(rows)
+        self.sync_from_excel()
+        first_seq = self.max_seq() + 1
+        seqs = list(range(first_seq, first_seq + len(rows)))
+        records = []
+        for seq, fields in zip(seqs, rows):
+            values = dict(zip(labels, fields))
+            values['SEQ'] = seq
+            records.append(tuple(_to_sql_value(col, values.get(col)) for col in COLUMNS))
+
+        with self.conn, span('gravar_banco', rows=len(records), modo='acrescentar'):
+            self.conn.executemany(self._insert_sql(COLUMNS), records)
+            self._mark_export_pending()
+        if not os.path.exists(self.planilha_path):
+            self.export_excel()
+        return seqs
+
+    @_locked
+    def upsert_frame(self, df):
+        """
+        Atualiza as linhas de `df` pelo SEQ; linhas sem SEQ (ou com SEQ
+        inexistente) são inseridas. Retorna `df` com os SEQ preenchidos.
+        As atualizações vão num único executemany.
+        """
+        df = df.copy()
+        columns = [col for col in COLUMNS if col in df.columns and col != 'SEQ']
+        # Datas convertidas uma vez por coluna, não célula a célula em _to_sql_value
+        ensure_typed_dates(df)
+        set_sql = ', '.join(f"{_quote(col)} = ?" for col in columns)
+        insert_sql = self._insert_sql(['SEQ'] + columns)
+        if 'SEQ' not in df.columns:
+            df['SEQ'] = None
+        seqs = pd.to_numeric(df['SEQ'], errors='coerce')
+        existing = self._existing_seqs(int(seq) for seq in seqs.dropna())
+
+        updates, inserts = [], []
+        next_seq = self.max_seq()
+        for idx, seq in zip(df.index, seqs):
+            values = [_to_sql_value(col, df.at[idx, col]) for col in columns]
+            if pd.notna(seq) and int(seq) in existing:
+                updates.append(values + [int(seq)])
+                continue
+            if pd.isna(seq):
+                next_seq += 1
+                seq = next_seq
+                df.at[idx, 'SEQ'] = seq
+            next_seq = max(next_seq, int(seq))
+            inserts.append([int(seq)] + values)
+
+        with self.conn:
+            if updates:
+                self.conn.executemany(f"UPDATE escalas SET {set_sql} WHERE SEQ = ?", updates)
+            if inserts:
+                self.conn.executemany(insert_sql, inserts)
+            if updates or inserts:
+                self._mark_export_pending()
+        return df
+
+    @_locked
+    def update_cells(self, df, changed):
+        """
+        Grava só as células alteradas das linhas de `df` (pelo SEQ):
+        `changed[i]` são as colunas alteradas da i-ésima linha. Só essas
+        células passam por _to_sql_value, e as linhas com o mesmo conjunto
+        de colunas vão num único executemany (UPDATE ... SET <essas colunas>).
+        """
+        groups = {}
+        seqs = df['SEQ'].to_numpy()
+        for row, columns in enumerate(changed):
+            columns = tuple(col for col in COLUMNS if col in columns and col != 'SEQ')
+            if not columns:
+                continue
+            values = [_to_sql_value(col, df[col].iat[row]) for col in columns]
+            groups.setdefault(columns, []).append(values + [int(seqs[row])])
+        if not groups:
+            return
+        with self.conn, span('gravar_banco', rows=len(df), grupos=len(groups), modo='celulas'):
+            for columns, params in groups.items():
+                set_sql = ', '.join(f"{_quote(col)} = ?" for col in columns)
+                self.conn.executemany(f"UPDATE escalas SET {set_sql} WHERE SEQ = ?", params)
+            self._mark_export_pending()
+
+    def _existing_seqs(self, seqs):
+        seqs = list(seqs)
+        found = set()
+        for start in range(0, len(seqs), 500):
+            chunk = seqs[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT SEQ FROM escalas WHERE SEQ IN ({', '.join('?' for _ in chunk)})", chunk
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    @_locked
+    def delete_seqs(self, seqs):
+        seqs = [int(s) for s in seqs]
+        if not seqs:
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM escalas WHERE SEQ = ?", [(s,) for s in seqs])
+            self._mark_export_pending()
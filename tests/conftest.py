@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam soltos na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True, scope='session')
+def log_dir(tmp_path_factory):
+    """Os logs dos testes vão para uma pasta temporária, não para a do projeto."""
+    path = tmp_path_factory.mktemp('logs')
+    previous = os.environ.get('ESCALAS_LOG_DIR')
+    os.environ['ESCALAS_LOG_DIR'] = str(path)
+    yield path
+    if previous is None:
+        os.environ.pop('ESCALAS_LOG_DIR', None)
+    else:
+        os.environ['ESCALAS_LOG_DIR'] = previous
@@ -0,0 +1,74 @@
+import datetime
+
+import pandas as pd
+
+from conflict_index import Conflict, ConflictIndex, check_frame, conflict_reason, find_conflicts
+
+
+def schedule(*rows):
+    """Linhas (técnico, localização, início, fim) com datas 'dd hh:mm' de março/2025."""
+    def when(text):
+        day, hour = text.split()
+        return pd.Timestamp(f"2025-03-{int(day):02d} {hour}")
+    return pd.DataFrame(
+        [(tecnico, localizacao, when(inicio), when(fim)) for tecnico, localizacao, inicio, fim in rows],
+        columns=['TÉCNICO', 'LOCALIZAÇÃO', 'DATA/HORA INICIO', 'DATA/HORA FIM'],
+    )
+
+
+def test_on_call_during_day_off_or_vacation_conflicts():
+    assert conflict_reason('Sobreaviso', 'Folga') == "Sobreaviso durante Folga"
+    assert conflict_reason('Férias', 'Sobreaviso') == "Sobreaviso durante Férias"
+
+
+def test_allowed_combinations():
+    assert conflict_reason('Sobreaviso', 'Unidade') is None
+    assert conflict_reason('Folga', 'Férias') is None
+    assert conflict_reason('Unidade', 'Home') == "Horários sobrepostos"
+
+
+def test_find_conflicts_pairs_on_call_with_day_off():
+    df = schedule(
+        ('Ana', 'Folga', '09 00:00', '09 23:59'),
+        ('Ana', 'Sobreaviso', '09 18:00', '10 07:00'),
+        ('Ana', 'Unidade', '10 08:00', '10 17:00'),
+        ('Bruno', 'Sobreaviso', '09 18:00', '10 07:00'),
+    )
+    found = {(min(c.position, c.other), max(c.position, c.other), c.motivo) for c in find_conflicts(df)}
+    assert found == {(0, 1, "Sobreaviso durante Folga")}
+
+
+def test_touching_periods_do_not_conflict():
+    df = schedule(
+        ('Ana', 'Unidade', '03 08:00', '03 12:00'),
+        ('Ana', 'Home', '03 12:00', '03 17:00'),
+    )
+    assert find_conflicts(df) == []
+
+
+def test_index_check_matches_full_scan():
+    df = schedule(
+        ('Ana', 'Férias', '03 00:00', '07 23:59'),
+        ('Ana', 'Unidade', '10 08:00', '10 17:00'),
+        ('Bruno', 'Unidade', '05 08:00', '05 17:00'),
+    )
+    index = ConflictIndex(df)
+    inicio, fim = datetime.datetime(2025, 3, 5, 18), datetime.datetime(2025, 3, 6, 7)
+    assert index.check('Ana', 'Sobreaviso', inicio, fim) == [(0, "Sobreaviso durante Férias")]
+    assert index.check('Bruno', 'Sobreaviso', inicio, fim) == []
+    assert index.check('Ana', 'Sobreaviso', inicio, fim, ignore={0}) == []
+
+
+def test_check_frame_reports_batch_positions():
+    existing = schedule(
+        ('Ana', 'Unidade', '10 08:00', '10 17:00'),
+        ('Bruno', 'Unidade', '10 08:00', '10 17:00'),
+    )
+    # Sobreaviso de domingo com a Folga automática de segunda
+    batch = schedule(
+        ('Ana', 'Sobreaviso', '09 08:00', '09 18:00'),
+        ('Ana', 'Folga', '10 08:00', '10 17:00'),
+        ('Bruno', 'Folga', '11 08:00', '11 17:00'),
+    )
+    assert check_frame(ConflictIndex(existing), batch) == [Conflict(1, 0, "Unidade durante Folga")]
+    assert find_conflicts(batch) == []
@@ -0,0 +1,65 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from filter_engine import FilterIndex, IncrementalFilter, is_narrower
+
+
+def criteria(tecnicos=(), tecnico_contains='', unidade_contains='', start=None, end=None):
+    return {
+        'tecnicos': list(tecnicos), 'tecnico_contains': tecnico_contains,
+        'unidade_contains': unidade_contains, 'start': start, 'end': end,
+    }
+
+
+def frame():
+    return pd.DataFrame({
+        'TÉCNICO': ['Ana Souza', 'Bruno Lima', 'Ana Paula', None],
+        'UNIDADE': ['UPA Norte', 'HM Sul', 'UPA Sul', 'UPA Norte'],
+        'LOCALIZAÇÃO': ['Unidade', 'Home', 'Unidade', 'Folga'],
+        'DATA/HORA INICIO': pd.to_datetime(['2025-03-03 08:00', '2025-03-04 08:00', '2025-03-10 08:00', None]),
+    })
+
+
+def test_more_letters_narrow_the_search():
+    assert is_narrower(criteria(tecnico_contains='ana'), criteria(tecnico_contains='an'))
+    assert is_narrower(criteria(tecnico_contains='Ana S'), criteria(tecnico_contains='ana'))
+    assert is_narrower(criteria(tecnico_contains='ana'), criteria())
+
+
+def test_deleting_letters_or_changing_text_is_not_narrower():
+    assert not is_narrower(criteria(tecnico_contains='an'), criteria(tecnico_contains='ana'))
+    assert not is_narrower(criteria(tecnico_contains='bru'), criteria(tecnico_contains='ana'))
+    assert not is_narrower(criteria(), criteria(unidade_contains='upa'))
+
+
+def test_technician_subset_narrows_and_superset_does_not():
+    old = criteria(tecnicos=['Ana Souza', 'Bruno Lima'])
+    assert is_narrower(criteria(tecnicos=['Ana Souza']), old)
+    assert not is_narrower(criteria(tecnicos=['Ana Souza', 'Ana Paula']), old)
+    # Sem lista de técnicos = todos: mais amplo que qualquer lista
+    assert not is_narrower(criteria(), old)
+
+
+def test_period_must_stay_inside_the_previous_one():
+    inicio, fim = datetime.datetime(2025, 3, 1), datetime.datetime(2025, 3, 31)
+    old = criteria(start=inicio, end=fim)
+    assert is_narrower(criteria(start=inicio + datetime.timedelta(days=1), end=fim), old)
+    assert not is_narrower(criteria(start=inicio - datetime.timedelta(days=1), end=fim), old)
+    assert not is_narrower(criteria(start=inicio, end=None), old)
+    assert is_narrower(criteria(start=inicio, end=fim), criteria())
+
+
+def test_incremental_filter_matches_full_scan():
+    index = FilterIndex(frame())
+    live = IncrementalFilter(index)
+    for typed in ['a', 'an', 'ana', 'ana p', 'an', '']:
+        expected = index.filter(tecnico_contains=typed)
+        np.testing.assert_array_equal(live.filter(tecnico_contains=typed), expected)
+
+
+def test_filter_by_period_skips_missing_dates():
+    index = FilterIndex(frame())
+    rows = index.filter(start=datetime.datetime(2025, 3, 3), end=datetime.datetime(2025, 3, 4, 23, 59))
+    assert rows.tolist() == [0, 1]
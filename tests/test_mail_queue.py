@@ -0,0 +1,133 @@
+import datetime
+
+import pytest
+
+import mail_queue
+from email_dispatch import MailDispatcher, OutgoingMail
+from mail_queue import (
+    MAX_ATTEMPTS, STATUS_FAILED, STATUS_PENDING, STATUS_SENDING, STATUS_SENT, MailQueue, idempotency_key,
+    retry_delay
+)
+
+
+class FakeTransport:
+    """Transporte em memória; `failures` = destinatários que sempre falham."""
+    supports_deferred = True
+    max_workers = 1
+
+    def __init__(self, failures=(), close_error=None):
+        self.sent = []
+        self.failures = set(failures)
+        self.close_error = close_error
+
+    def open(self):
+        pass
+
+    def close(self):
+        if self.close_error:
+            raise RuntimeError(self.close_error)
+
+    def send(self, mail):
+        if mail.to in self.failures:
+            raise RuntimeError("caixa cheia")
+        self.sent.append(mail.to)
+
+
+def mail(to='ana@x.com', body='<p>escala</p>', period='03/03/2025-09/03/2025'):
+    return OutgoingMail(to, "Escala Semanal", body, text_body="escala", period=period)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return MailQueue(str(tmp_path / "fila.sqlite"))
+
+
+def status(queue, to):
+    return queue.conn.execute("SELECT status, tentativas FROM mensagens WHERE destinatario = ?", (to,)).fetchone()
+
+
+def test_key_depends_on_recipient_period_and_content():
+    assert idempotency_key(mail()) == idempotency_key(mail(to=' ANA@x.com '))
+    assert idempotency_key(mail()) != idempotency_key(mail(body='<p>outra</p>'))
+    assert idempotency_key(mail()) != idempotency_key(mail(period='10/03/2025-16/03/2025'))
+
+
+def test_same_mail_is_sent_once(queue):
+    transport = FakeTransport()
+    first = queue.send([mail(), mail('bruno@x.com')], MailDispatcher(transport))
+    second = queue.send([mail(), mail('bruno@x.com')], MailDispatcher(transport))
+    assert first['enviados'] == 2 and first['repetidos'] == 0
+    assert second['enviados'] == 0 and second['repetidos'] == 2
+    assert sorted(transport.sent) == ['ana@x.com', 'bruno@x.com']
+
+
+def test_retry_delay_doubles_up_to_one_hour():
+    assert [retry_delay(n).total_seconds() for n in range(1, 9)] == [60, 120, 240, 480, 960, 1920, 3600, 3600]
+
+
+def test_failure_is_rescheduled_then_given_up(queue, monkeypatch):
+    transport = FakeTransport(failures={'ana@x.com'})
+    now = datetime.datetime(2025, 3, 3, 8, 0)
+    monkeypatch.setattr(mail_queue, '_now', lambda: now)
+    queue.enqueue([mail()])
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        monkeypatch.setattr(mail_queue, '_now', lambda: now)
+        summary = queue.drain(MailDispatcher(transport))
+        expected = STATUS_FAILED if attempt == MAX_ATTEMPTS else STATUS_PENDING
+        assert status(queue, 'ana@x.com') == (expected, attempt)
+        assert summary['desistidos' if expected == STATUS_FAILED else 'reagendados'] == 1
+        # Antes da espera vencer, nada é tentado de novo
+        monkeypatch.setattr(mail_queue, '_now', lambda: now + retry_delay(attempt) - datetime.timedelta(seconds=1))
+        assert queue.due() == []
+        now += retry_delay(attempt)
+    assert transport.sent == []
+
+
+def test_claimed_mail_is_not_sent_by_another_queue(tmp_path):
+    path = str(tmp_path / "fila.sqlite")
+    gui, cli = MailQueue(path), MailQueue(path)
+    gui.enqueue([mail()])
+    key = idempotency_key(mail())
+    assert gui.claim([key], 'tela') == {key}
+    assert cli.claim([key], 'linha de comando') == set()
+
+    transport = FakeTransport()
+    assert cli.drain(MailDispatcher(transport))['enviados'] == 0
+    assert transport.sent == []
+    assert status(gui, 'ana@x.com')[0] == STATUS_SENDING
+
+
+def test_expired_claim_is_sent_again(queue, monkeypatch):
+    queue.enqueue([mail()])
+    queue.claim([idempotency_key(mail())], 'processo que caiu')
+    later = mail_queue._now() + datetime.timedelta(seconds=mail_queue.LEASE_SECONDS + 1)
+    monkeypatch.setattr(mail_queue, '_now', lambda: later)
+    transport = FakeTransport()
+    assert queue.drain(MailDispatcher(transport))['enviados'] == 1
+    assert transport.sent == ['ana@x.com']
+
+
+def test_close_failure_keeps_what_was_already_sent(queue):
+    # O Outlook só faz o SendAndReceive no close(): se ele falhar, o que já
+    # saiu não pode voltar para a fila
+    transport = FakeTransport(failures={'bruno@x.com'}, close_error="SendAndReceive falhou")
+    queue.enqueue([mail(), mail('bruno@x.com')])
+    with pytest.raises(RuntimeError):
+        queue.drain(MailDispatcher(transport))
+    assert status(queue, 'ana@x.com') == (STATUS_SENT, 1)
+    assert status(queue, 'bruno@x.com') == (STATUS_PENDING, 1)
+
+    transport = FakeTransport()
+    assert queue.drain(MailDispatcher(transport))['enviados'] == 0
+    assert transport.sent == []
+
+
+def test_open_failure_returns_the_claims(queue):
+    class ClosedTransport(FakeTransport):
+        def open(self):
+            raise RuntimeError("Outlook fechado")
+
+    queue.enqueue([mail()])
+    with pytest.raises(RuntimeError):
+        queue.drain(MailDispatcher(ClosedTransport()))
+    assert status(queue, 'ana@x.com') == (STATUS_PENDING, 0)
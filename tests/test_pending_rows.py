@@ -0,0 +1,51 @@
+import datetime
+
+import numpy as np
+
+from pending_rows import PendingSchedule, Vocabulary
+from planilha_io import LABELS
+
+
+def test_vocabulary_round_trip():
+    vocabulary = Vocabulary(['', 'Folga'])
+    codes = vocabulary.encode(['Folga', 'Home', '', 'Home'])
+    assert codes.tolist() == [1, 2, 0, 2]
+    assert vocabulary.decode(codes).tolist() == ['Folga', 'Home', '', 'Home']
+
+
+def test_vocabulary_promotes_dtype_when_one_call_overflows_int8():
+    vocabulary = Vocabulary([''])
+    values = [f"texto {i}" for i in range(300)]
+    codes = vocabulary.encode(values)
+    assert codes.dtype == np.int32
+    assert codes.max() == 300
+    assert vocabulary.decode(codes).tolist() == values
+
+
+def row(tecnico, localizacao, inicio, fim):
+    fields = dict.fromkeys(LABELS, '')
+    fields.update({'TÉCNICO': tecnico, 'LOCALIZAÇÃO': localizacao,
+                   'DATA/HORA INICIO': inicio, 'DATA/HORA FIM': fim})
+    return [fields[col] for col in LABELS]
+
+
+def test_pending_schedule_keeps_typed_columns():
+    pending = PendingSchedule()
+    pending.append_rows([
+        row('Ana', 'Unidade', '03/03/2025 08:00:00', '03/03/2025 17:00:00'),
+        row('Bruno', 'Texto livre', '', ''),
+    ])
+    frame = pending.to_frame()
+    assert frame['DATA/HORA INICIO'].dtype.kind == 'M'
+    assert pending.typed_row(0)[LABELS.index('DATA/HORA INICIO')] == datetime.datetime(2025, 3, 3, 8)
+    assert pending.typed_row(1)[LABELS.index('DATA/HORA FIM')] is None
+    assert pending.column('LOCALIZAÇÃO').tolist() == ['Unidade', 'Texto livre']
+
+
+def test_drop_head_and_replace_row():
+    pending = PendingSchedule()
+    pending.append_rows([row(name, 'Home', '', '') for name in ('Ana', 'Bruno', 'Caio')])
+    pending.replace_row(2, row('Caio', 'Folga', '', ''))
+    pending.drop_head(1)
+    assert pending.column('TÉCNICO').tolist() == ['Bruno', 'Caio']
+    assert pending.column('LOCALIZAÇÃO').tolist() == ['Home', 'Folga']
@@ -0,0 +1,44 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from planilha_io import display_texts, parse_datetime_series
+
+
+def test_each_known_format_is_parsed():
+    parsed = parse_datetime_series([
+        '03/03/2025 08:00:00', '03/03/2025 08:00', '03/03/2025', '2025-03-03 08:00:00',
+    ])
+    assert parsed.tolist() == [
+        pd.Timestamp('2025-03-03 08:00'), pd.Timestamp('2025-03-03 08:00'),
+        pd.Timestamp('2025-03-03 00:00'), pd.Timestamp('2025-03-03 08:00'),
+    ]
+
+
+def test_unknown_text_falls_back_to_day_first():
+    # Com '-' não casa com nenhum DATE_FORMATS: lido com o dia primeiro, não o mês
+    parsed = parse_datetime_series(['04-03-2025 08:30'])
+    assert parsed.iloc[0] == pd.Timestamp('2025-03-04 08:30')
+
+
+def test_excel_cells_pass_through_and_invalid_values_become_nat():
+    parsed = parse_datetime_series([
+        datetime.datetime(2025, 3, 3, 8), datetime.date(2025, 3, 4), None, '', 'sem data', 45000,
+    ])
+    assert parsed.iloc[0] == pd.Timestamp('2025-03-03 08:00')
+    assert parsed.iloc[1] == pd.Timestamp('2025-03-04')
+    assert parsed.iloc[2:].isna().all()
+
+
+def test_typed_column_is_kept_and_index_preserved():
+    series = pd.Series(pd.to_datetime(['2025-03-03 08:00', None]), index=[10, 20], name='DATA/HORA INICIO')
+    parsed = parse_datetime_series(series)
+    assert parsed.dtype == np.dtype('datetime64[ns]')
+    assert parsed.index.tolist() == [10, 20] and parsed.name == 'DATA/HORA INICIO'
+
+
+def test_display_texts_formats_dates_and_blanks():
+    dates = pd.Series(pd.to_datetime(['2025-03-03 08:00', None]))
+    assert display_texts(dates).tolist() == ['03/03/2025 08:00:00', '']
+    assert display_texts(pd.Series(['Ana', None, 7], dtype=object)).tolist() == ['Ana', '', '7']
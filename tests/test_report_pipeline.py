@@ -0,0 +1,80 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import report_pipeline
+from report_pipeline import POOL_STARTUP_MS
+
+FRAME = pd.DataFrame({'TÉCNICO': []})
+
+
+class FakePool:
+    """No lugar do ProcessPoolExecutor: registra o uso e não renderiza nada."""
+    used = []
+
+    def __init__(self, max_workers, **kwargs):
+        FakePool.used.append(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, fn, tasks, chunksize=1):
+        return [(kind, ['feito']) for kind, _ in tasks]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakePool.used = []
+    monkeypatch.setattr(report_pipeline, 'ProcessPoolExecutor', FakePool)
+    monkeypatch.setattr(report_pipeline, '_TASKS', {'exportar': lambda frame, *args: ['no processo']})
+    return FakePool.used
+
+
+def export_tasks(groups, rows, formats):
+    return [('exportar', (f"T{n}", np.arange(rows), 'pasta', formats)) for n in range(groups)]
+
+
+def test_pool_only_when_estimate_pays_the_startup(pool):
+    # 10 técnicos com 100 linhas em HTML: ~50 ms, bem abaixo da subida do pool
+    small = export_tasks(10, 100, ('html',))
+    assert report_pipeline._estimated_ms(small) < POOL_STARTUP_MS
+    report_pipeline._run(FRAME, small, workers=4)
+    assert pool == []
+
+    # Os mesmos grupos em PDF: segundos de trabalho, vale repartir
+    report_pipeline._run(FRAME, export_tasks(10, 100, ('pdf',)), workers=4)
+    assert pool == [4]
+
+
+def test_pdf_from_background_thread_goes_to_a_process(pool):
+    tasks = export_tasks(1, 5, ('pdf',))
+    results = []
+    worker = threading.Thread(target=lambda: results.extend(report_pipeline._run(FRAME, tasks, workers=1)))
+    worker.start()
+    worker.join()
+    assert pool == [1]
+    assert results == [('exportar', ['feito'])]
+
+    # Na thread principal (linha de comando) o PDF pequeno fica no processo
+    assert report_pipeline._run(FRAME, tasks, workers=1) == [('exportar', ['no processo'])]
+    assert pool == [1]
+
+
+def test_write_pdf_refuses_background_thread(tmp_path):
+    errors = []
+
+    def write():
+        try:
+            report_pipeline._write_pdf("<p>escala</p>", str(tmp_path / "x.pdf"))
+        except RuntimeError as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=write)
+    worker.start()
+    worker.join()
+    assert len(errors) == 1
@@ -0,0 +1,127 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import schedule_optimizer
+from schedule_generator import work_mask
+from schedule_optimizer import REPEAT_WEIGHT, optimize_schedule
+
+ON_CALL = {'faz_sobreaviso': True, 'horario_sem_unidade': {'inicio': '08:00', 'fim': '18:00'}}
+
+
+def technician(dias, sobreaviso=False, escala='5X2'):
+    info = {'escala': escala, 'horario_inicio': '08:00', 'horario_fim': '17:00', 'dias_trabalho': dias}
+    if sobreaviso:
+        info['sobreaviso'] = ON_CALL
+    return info
+
+
+TECHNICIANS = {
+    'Ana': technician([1, 2, 3, 4, 5], sobreaviso=True),
+    'Bruno': technician([1, 2, 3, 4, 5], sobreaviso=True),
+    'Caio': technician([1, 2, 3, 4, 5, 6, 7]),
+    'Duda': technician([1, 2, 3, 4, 5]),
+    'Eva': technician([1, 2, 3, 4, 5]),
+    'Fabio': technician([], escala='12X36'),
+}
+SELECTED = {name: ('pares' if name == 'Fabio' else None) for name in TECHNICIANS}
+
+DEMANDS = {
+    'unidades': {
+        'HM Benedicto': {'dias': [1, 2, 3, 4, 5], 'tecnicos': 1},
+        'HM Tatuape': {'dias': [1, 3, 5], 'tecnicos': 1},
+        'HM Tide': {'dias': [2, 4], 'tecnicos': 1},
+        'UPA Santo Amaro': {'dias': [1, 2, 3, 4, 5, 6, 7], 'tecnicos': 1},
+    },
+    'sobreaviso': {'dias': [6, 7], 'tecnicos': 1},
+}
+
+# Duas semanas, de segunda (03/03/2025) a domingo (16/03/2025)
+INICIO, FIM = datetime.date(2025, 3, 3), datetime.date(2025, 3, 16)
+
+
+def optimize(technicians=TECHNICIANS, selected=SELECTED, demands=DEMANDS):
+    return optimize_schedule(technicians, INICIO, FIM, selected, demands)
+
+
+def rows_on(frame, date, localizacao):
+    day = frame['DATA/HORA INICIO'].dt.normalize() == pd.Timestamp(date)
+    return frame[day & (frame['LOCALIZAÇÃO'] == localizacao)]
+
+
+def test_every_required_slot_is_covered():
+    result = optimize()
+    assert result.faltas == []
+    for date in pd.date_range(INICIO, FIM):
+        weekday = date.dayofweek + 1
+        visits = pd.concat([rows_on(result.frame, date, 'Unidade'), rows_on(result.frame, date, 'Sobreaviso')])
+        for unidade, item in DEMANDS['unidades'].items():
+            expected = item['tecnicos'] if weekday in item['dias'] else 0
+            assert (visits['UNIDADE'] == unidade).sum() == expected, (date, unidade)
+        expected = DEMANDS['sobreaviso']['tecnicos'] if weekday in DEMANDS['sobreaviso']['dias'] else 0
+        assert len(rows_on(result.frame, date, 'Sobreaviso')) == expected, date
+
+
+def test_sunday_on_call_gives_monday_off():
+    frame = optimize().frame
+    sundays = frame[(frame['LOCALIZAÇÃO'] == 'Sobreaviso') & (frame['DATA/HORA INICIO'].dt.dayofweek == 6)]
+    assert len(sundays) == 2
+    for _, sunday in sundays.iterrows():
+        monday = sunday['DATA/HORA INICIO'].normalize() + pd.Timedelta(days=1)
+        same_day = frame[(frame['TÉCNICO'] == sunday['TÉCNICO'])
+                         & (frame['DATA/HORA INICIO'].dt.normalize() == monday)]
+        # Também no último domingo: a Folga cai no dia seguinte ao período
+        assert same_day['LOCALIZAÇÃO'].tolist() == ['Folga']
+        assert same_day['JUSTIFICATIVA'].tolist() == ['Folga após sobreaviso']
+
+
+def test_unavailable_technicians_are_never_assigned():
+    frame = optimize().frame
+    folgas = set(zip(frame.loc[frame['LOCALIZAÇÃO'] == 'Folga', 'TÉCNICO'],
+                     frame.loc[frame['LOCALIZAÇÃO'] == 'Folga', 'DATA/HORA INICIO'].dt.normalize()))
+    units = frame[frame['LOCALIZAÇÃO'] == 'Unidade']
+    for _, row in units.iterrows():
+        date = row['DATA/HORA INICIO'].normalize()
+        works = work_mask(TECHNICIANS[row['TÉCNICO']], pd.DatetimeIndex([date]), SELECTED[row['TÉCNICO']])[0]
+        assert works and (row['TÉCNICO'], date) not in folgas, (row['TÉCNICO'], date)
+
+
+def test_shortage_is_reported_instead_of_double_booking():
+    selected = {'Ana': None, 'Caio': None}
+    result = optimize(selected=selected)
+    days = result.frame.assign(DIA=result.frame['DATA/HORA INICIO'].dt.normalize())
+    # Ninguém aparece duas vezes no mesmo dia
+    assert not days.duplicated(['TÉCNICO', 'DIA']).any()
+    # Quarta-feira pede 3 unidades e só há 2 técnicos
+    assert (datetime.date(2025, 3, 5), 'UPA Santo Amaro', 1) in result.faltas
+    demanded = sum(
+        item['tecnicos'] * sum(d.dayofweek + 1 in item['dias'] for d in pd.date_range(INICIO, FIM))
+        for item in DEMANDS['unidades'].values()
+    )
+    filled = sum(visitas for visitas, _ in result.carga.values())
+    assert filled + sum(n for _, unidade, n in result.faltas if unidade != 'Sobreaviso') == demanded
+
+
+def objective(solver, free):
+    load = (solver.unit_of >= 0).sum(axis=1)
+    visits = np.array([[(solver.unit_of[t] == u).sum() for u in range(len(solver.units))]
+                       for t in range(len(solver.tecnicos))])
+    return float(((load - solver._targets(free)) ** 2).sum() + REPEAT_WEIGHT * (visits ** 2).sum())
+
+
+@pytest.mark.parametrize('selected', [SELECTED, {'Ana': None, 'Caio': None, 'Duda': None}])
+def test_local_search_never_worsens_the_objective(monkeypatch, selected):
+    costs = []
+    original = schedule_optimizer._Solver.local_search
+
+    def measured(solver, free, load, visits):
+        costs.append(objective(solver, free))
+        original(solver, free, load, visits)
+        costs.append(objective(solver, free))
+
+    monkeypatch.setattr(schedule_optimizer._Solver, 'local_search', measured)
+    optimize(selected=selected)
+    before, after = costs
+    assert after <= before + 1e-9
@@ -0,0 +1,123 @@
+import os
+import datetime
+
+from openpyxl import Workbook, load_workbook
+
+from planilha_io import LABELS
+from schedule_store import ScheduleStore
+
+
+def write_planilha(path, header, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for values in rows:
+        ws.append([values.get(name) for name in header])
+    wb.save(path)
+
+
+def test_export_keeps_user_added_columns(tmp_path):
+    path = str(tmp_path / "escalas.xlsx")
+    header = ['SEQ', 'OBS'] + LABELS[:6] + ['CRIADO EM'] + LABELS[6:]
+    write_planilha(path, header, [
+        {'SEQ': 1, 'OBS': 'ligar antes', 'CRIADO EM': datetime.datetime(2025, 1, 2, 10), 'TÉCNICO': 'Ana',
+         'DATA/HORA INICIO': datetime.datetime(2025, 3, 3, 8), 'DATA/HORA FIM': datetime.datetime(2025, 3, 3, 17)},
+        {'SEQ': 2, 'TÉCNICO': 'Bruno',
+         'DATA/HORA INICIO': datetime.datetime(2025, 3, 4, 8), 'DATA/HORA FIM': datetime.datetime(2025, 3, 4, 17)},
+    ])
+    store = ScheduleStore(path)
+    try:
+        changed = store.query().iloc[[0]].copy()
+        changed['TÉCNICO'] = 'Ana Souza'
+        store.upsert_frame(changed)
+        store.export_excel()
+    finally:
+        store.conn.close()
+
+    rows = list(load_workbook(path).active.iter_rows(values_only=True))
+    assert list(rows[0]) == header
+    first = dict(zip(header, rows[1]))
+    assert first['TÉCNICO'] == 'Ana Souza'
+    assert first['OBS'] == 'ligar antes'
+    assert first['CRIADO EM'] == datetime.datetime(2025, 1, 2, 10)
+    assert dict(zip(header, rows[2]))['OBS'] is None
+
+
+def simple_planilha(tmp_path, **values):
+    path = str(tmp_path / "escalas.xlsx")
+    row = {'SEQ': 1, 'TÉCNICO': 'Ana', 'DATA/HORA INICIO': datetime.datetime(2025, 3, 3, 8),
+           'DATA/HORA FIM': datetime.datetime(2025, 3, 3, 17)}
+    row.update(values)
+    write_planilha(path, ['SEQ'] + LABELS, [row])
+    return path
+
+
+def test_numbers_survive_the_round_trip(tmp_path):
+    path = simple_planilha(tmp_path, CARD=4521, JUSTIFICATIVA='007')
+    store = ScheduleStore(path)
+    try:
+        df = store.query()
+        assert df.at[0, 'CARD'] == 4521
+        assert df.at[0, 'JUSTIFICATIVA'] == '007'
+        store.export_excel()
+    finally:
+        store.conn.close()
+    header, row = list(load_workbook(path).active.iter_rows(values_only=True))
+    row = dict(zip(header, row))
+    assert row['CARD'] == 4521 and row['JUSTIFICATIVA'] == '007'
+
+
+def test_saves_touch_only_the_database_until_exported(tmp_path):
+    path = simple_planilha(tmp_path)
+    store = ScheduleStore(path)
+    try:
+        store.sync_from_excel()
+        before = os.stat(path).st_mtime_ns
+        store.append_rows([['Segunda-Feira', 'Home', '', 'Bruno', '5X2', 'Diurno',
+                            '04/03/2025 08:00:00', '04/03/2025 17:00:00', '', 1234]])
+        changed = store.query().iloc[[0]].copy()
+        changed['TÉCNICO'] = 'Ana Souza'
+        store.upsert_frame(changed)
+        assert os.stat(path).st_mtime_ns == before
+        assert store.has_pending_export()
+        assert store.query()['TÉCNICO'].tolist() == ['Ana Souza', 'Bruno']
+
+        assert store.export_pending()
+        assert not store.has_pending_export()
+        assert not store.export_pending()
+    finally:
+        store.conn.close()
+    rows = list(load_workbook(path).active.iter_rows(values_only=True))
+    assert [row[LABELS.index('TÉCNICO') + 1] for row in rows[1:]] == ['Ana Souza', 'Bruno']
+    assert rows[2][-1] == 1234
+
+
+def test_pending_database_wins_over_external_edit(tmp_path):
+    path = simple_planilha(tmp_path)
+    store = ScheduleStore(path)
+    try:
+        store.sync_from_excel()
+        store.delete_seqs([1])
+        write_planilha(path, ['SEQ'] + LABELS, [{'SEQ': 1, 'TÉCNICO': 'Caio'}, {'SEQ': 2, 'TÉCNICO': 'Duda'}])
+        assert not store.sync_from_excel()
+        assert store.query().empty
+    finally:
+        store.conn.close()
+
+
+def test_update_cells_writes_only_the_changed_columns(tmp_path):
+    path = simple_planilha(tmp_path, JUSTIFICATIVA='antes', CARD=10)
+    store = ScheduleStore(path)
+    try:
+        df = store.query()
+        df.loc[0, ['JUSTIFICATIVA', 'CARD', 'TÉCNICO']] = ['depois', 11, 'não gravado']
+        statements = []
+        store.conn.set_trace_callback(statements.append)
+        store.update_cells(df, [{'JUSTIFICATIVA', 'CARD'}])
+        store.conn.set_trace_callback(None)
+        row = store.query().iloc[0]
+    finally:
+        store.conn.close()
+    assert (row['JUSTIFICATIVA'], row['CARD'], row['TÉCNICO']) == ('depois', 11, 'Ana')
+    updates = [sql for sql in statements if sql.startswith('UPDATE escalas')]
+    assert updates == ['UPDATE escalas SET "JUSTIFICATIVA" = \'depois\', "CARD" = 11 WHERE SEQ = 1']
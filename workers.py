@@ -0,0 +1,142 @@
+"""
+Execução de leituras e gravações da planilha fora da thread da interface.
+
+Cada tarefa é um Job (QRunnable) que recebe o próprio job como primeiro
+argumento, para informar progresso (job.report) e checar cancelamento.
+As tarefas de planilha/banco rodam em um pool de uma thread só, então
+gravação e recarga seguintes acontecem sempre na ordem em que foram
+pedidas.
+"""
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QProgressDialog
+
+_serial_pools = {}
+_running = set()
+
+
+class JobCancelled(Exception):
+    """Levantada por Job.report quando o usuário cancelou a tarefa."""
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, str)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Job(QRunnable):
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def is_cancelled(self):
+        return self._cancel_requested
+
+    def report(self, percent, message='', check_cancel=True):
+        """
+        Emite progresso; interrompe a tarefa se ela foi cancelada.
+        Use check_cancel=False depois de gravar algo que não pode ser desfeito.
+        """
+        if check_cancel and self._cancel_requested:
+            raise JobCancelled()
+        self.signals.progress.emit(percent, message)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+def serial_pool(name):
+    """Pool de uma thread só: tarefas com o mesmo nome rodam uma de cada vez, em ordem."""
+    pool = _serial_pools.get(name)
+    if pool is None:
+        pool = QThreadPool()
+        pool.setMaxThreadCount(1)
+        _serial_pools[name] = pool
+    return pool
+
+
+def io_pool():
+    """Pool para as tarefas que leem/gravam a planilha e o banco."""
+    return serial_pool('io')
+
+
+def mail_pool():
+    """Pool para envio de e-mails e esvaziamento da fila (nunca em paralelo)."""
+    return serial_pool('mail')
+
+
+def start_job(fn, *args, on_result=None, on_error=None, on_progress=None,
+              on_cancelled=None, on_finished=None, pool=None, **kwargs):
+    """Agenda `fn(job, *args, **kwargs)` e conecta os callbacks (executados na thread da interface)."""
+    job = Job(fn, *args, **kwargs)
+    for signal, slot in (
+        (job.signals.result, on_result),
+        (job.signals.error, on_error),
+        (job.signals.progress, on_progress),
+        (job.signals.cancelled, on_cancelled),
+        (job.signals.finished, on_finished),
+    ):
+        if slot is not None:
+            signal.connect(slot)
+    # Mantém referência Python enquanto a tarefa roda
+    _running.add(job)
+    job.signals.finished.connect(lambda: _running.discard(job))
+    (pool or io_pool()).start(job)
+    return job
+
+
+def run_with_progress(parent, title, fn, *args, on_result=None, on_error=None,
+                      on_cancelled=None, on_finished=None, cancellable=True, **kwargs):
+    """
+    Como start_job, exibindo um QProgressDialog não-modal (a janela continua
+    utilizável) com botão de cancelar ligado a job.cancel().
+    """
+    progress = QProgressDialog(title, "Cancelar" if cancellable else None, 0, 100, parent)
+    progress.setWindowTitle(title)
+    progress.setWindowModality(Qt.NonModal)
+    progress.setMinimumDuration(300)
+    progress.setAutoClose(False)
+    progress.setAutoReset(False)
+    progress.setValue(0)
+
+    def update_progress(percent, message):
+        progress.setValue(percent)
+        if message:
+            progress.setLabelText(message)
+
+    def finish():
+        progress.close()
+        progress.deleteLater()
+        if on_finished is not None:
+            on_finished()
+
+    job = start_job(
+        fn, *args,
+        on_result=on_result, on_error=on_error, on_progress=update_progress,
+        on_cancelled=on_cancelled, on_finished=finish, **kwargs
+    )
+    if cancellable:
+        progress.canceled.connect(job.cancel)
+    return job